@@ -1,627 +1,5031 @@
 import os
+import sys
 import subprocess
 import glob
+import gzip
 import re
+import json
+import time
+import queue
+import uuid
+import shutil
+import fnmatch
+import hashlib
+import hmac
+import secrets
+import mmap
+import zlib
+import heapq
+import statistics
+import cProfile
+import functools
+import tracemalloc
+import argparse
+import tempfile
+import urllib.error
+import urllib.parse
+import urllib.request
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import Counter, OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox, scrolledtext
 import threading
 
+try:
+    import numpy as np
+except ImportError:
+    # ゴールデン波形の比較は純Pythonの実装で行う
+    np = None
 
-class VerilogRunner:
+
+# Verilog予約語リスト
+VERILOG_RESERVED_WORDS = {
+    'module', 'endmodule', 'initial', 'always', 'assign', 'wire', 'reg', 
+    'integer', 'input', 'output', 'inout', 'parameter', 'localparam',
+    'begin', 'end', 'if', 'else', 'case', 'casex', 'casez', 'default',
+    'for', 'while', 'repeat', 'forever', 'task', 'function', 'and', 'or',
+    'not', 'nand', 'nor', 'xor', 'xnor', 'buf', 'bufif0', 'bufif1',
+    'notif0', 'notif1', 'posedge', 'negedge'
+}
+
+# モジュールインスタンス化のパターン: モジュール名 インスタンス名 (
+MODULE_INSTANCE_PATTERN = re.compile(r'^\s*(\w+)\s+(\w+)\s*\(', re.MULTILINE)
+
+# `include やメモリ初期化ファイル ($readmemh/$readmemb) の参照
+SOURCE_REFERENCE_PATTERN = re.compile(r'(?:`include|\$readmem[hb])\s*\(?\s*"([^"]+)"')
+
+# シミュレーション出力中の失敗メッセージ（$error / $fatal やテストベンチのFAIL表示）
+SIMULATION_FAILURE_PATTERN = re.compile(r'^\s*(ERROR|FATAL|FAIL(ED)?)\b', re.MULTILINE | re.IGNORECASE)
+
+WAVEFORM_EXTENSIONS = ('.vcd', '.fst', '.lxt', '.lxt2')
+
+DEFAULT_WORKER_PORT = 8765
+# ワーカーとコーディネーターで共有する認証トークン（環境変数・ヘッダー名）
+WORKER_TOKEN_ENV = 'VERILOG_RUNNER_TOKEN'
+WORKER_TOKEN_HEADER = 'X-Runner-Token'
+# ワーカーが保持する受信済みソースの合計サイズ上限と、1ジョブの実行時間の上限（秒）
+DEFAULT_BLOB_CACHE = 2 * 1024**3
+DEFAULT_JOB_TIMEOUT = 2 * 3600
+BLOB_DIGEST_PATTERN = re.compile(r'^[0-9a-f]{64}$')
+
+
+# テストベンチ内の波形ダンプ制御タスク（ダンプ範囲を制限する際に無効化する）
+DUMP_TASK_PATTERN = re.compile(r'\$dump(?:file|vars|on|off|all)\b\s*(?:\([^;]*?\))?\s*;', re.DOTALL)
+DUMPFILE_PATTERN = re.compile(r'\$dumpfile\s*\(\s*"([^"]+)"')
+MODULE_DECLARATION_PATTERN = re.compile(r'^\s*module\s+(\w+)', re.MULTILINE)
+
+# 統合実行で書き換えるタスク（$finish は完了通知に、表示系は %m の階層名付きに）
+FINISH_TASK_PATTERN = re.compile(r'\$finish\b\s*(?:\([^;]*?\))?\s*;', re.DOTALL)
+DISPLAY_TASK_PATTERN = re.compile(r'(\$(?:display|strobe|write)[bho]?)\b(?:(\s*\(\s*\))|(\s*\())?')
+# シミュレーション全体に作用するため統合実行できないタスク
+GLOBAL_TASK_PATTERN = re.compile(r'\$(?:monitor|stop)\b')
+TIMESCALE_PATTERN = re.compile(r'`timescale\s+(\d+\s*\w+\s*/\s*\d+\s*\w+)')
+
+# 時間指定の単位（fs換算）
+TIME_UNITS_FS = {'s': 10**15, 'ms': 10**12, 'us': 10**9, 'ns': 10**6, 'ps': 10**3, 'fs': 1}
+
+STATE_DIR = os.path.join(os.path.expanduser('~'), '.verilog_hdl_runner')
+
+# 実行記録のないテストベンチの見積もり時間（秒）と、見積もりに使う直近の実行回数
+DEFAULT_TESTBENCH_ESTIMATE = 5.0
+DURATION_HISTORY_LENGTH = 5
+
+
+def parse_sim_time(text, unit='ps'):
+    """'100ns' や '2.5us' 形式の時間を unit 単位の整数に変換（単位省略時はns、unit未満は切り捨て）"""
+    match = re.fullmatch(r'\s*([\d.]+)\s*([a-z]*)\s*', text.lower())
+    if not match or match.group(2) not in TIME_UNITS_FS and match.group(2):
+        raise ValueError(f"時間指定が不正です: {text}")
+    try:
+        time_fs = round(float(match.group(1)) * TIME_UNITS_FS[match.group(2) or 'ns'])
+    except ValueError:
+        raise ValueError(f"時間指定が不正です: {text}") from None
+    return time_fs // TIME_UNITS_FS[unit]
+
+
+def format_sim_time(time, unit='ps'):
+    """unit 単位の時刻を割り切れる最大の単位で表示"""
+    time_fs = time * TIME_UNITS_FS[unit]
+    for name, scale in TIME_UNITS_FS.items():
+        if time_fs and time_fs % scale == 0:
+            return f"{time_fs // scale}{name}"
+    return f"{time}{unit}"
+
+
+def simulation_passed(returncode, output):
+    """シミュレーションの成否（終了コードが0で、出力に失敗メッセージの行がない）"""
+    return returncode == 0 and not SIMULATION_FAILURE_PATTERN.search(output)
+
+
+def format_size(size):
+    """バイト数を読みやすい単位に変換"""
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if size < 1024 or unit == 'GB':
+            return f"{size:.1f} {unit}" if unit != 'B' else f"{size} B"
+        size /= 1024
+
+
+def parse_size(text):
+    """'500MB' や '10GB' 形式のサイズをバイト数に変換（単位省略時はバイト）"""
+    match = re.fullmatch(r'\s*([\d.]+)\s*([kmgt]?)i?b?\s*', text.lower())
+    if not match:
+        raise ValueError(f"サイズ指定が不正です: {text}")
+    return int(float(match.group(1)) * 1024 ** ' kmgt'.index(match.group(2) or ' '))
+
+
+def format_duration(seconds):
+    """秒数を読みやすい形式に変換"""
+    if seconds < 10:
+        return f"{seconds:.1f}s"
+    seconds = int(round(seconds))
+    if seconds < 60:
+        return f"{seconds}s"
+    if seconds < 3600:
+        return f"{seconds // 60}m{seconds % 60:02d}s"
+    return f"{seconds // 3600}h{seconds % 3600 // 60:02d}m"
+
+
+class RunHistory:
+    """テストベンチごとの実行記録（~/.verilog_hdl_runner/history.json）"""
+    
+    def __init__(self, path=None, root=None):
+        self.path = path or os.path.join(STATE_DIR, 'history.json')
+        # 指定されていればこのディレクトリからの相対パスで記録（マシン間で共有する場合）
+        self.root = os.path.abspath(root) if root else None
+        self.lock = threading.Lock()
+        self.records = {}
+        self.mtime = None
+        self._reload()
+    
+    def _reload(self):
+        """ファイルが他のプロセス・インスタンスに更新されていれば読み直す"""
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except OSError:
+            return
+        if mtime == self.mtime:
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self.records = json.load(f)
+            self.mtime = mtime
+        except (OSError, ValueError):
+            pass
+    
+    def key(self, tb_path):
+        """記録のキー（絶対パス、共有時はルートからの相対パス）"""
+        path = os.path.abspath(tb_path)
+        if self.root:
+            relative = os.path.relpath(path, self.root)
+            if is_safe_relative_path(relative):
+                return relative.replace(os.sep, '/')
+        return path
+    
+    def get(self, tb_path):
+        """記録を返す（なければ空の辞書）"""
+        with self.lock:
+            self._reload()
+            return dict(self.records.get(self.key(tb_path), {}))
+    
+    def update(self, tb_path, **fields):
+        """記録を更新して保存"""
+        with self.lock:
+            self._reload()
+            self.records.setdefault(self.key(tb_path), {}).update(fields)
+            try:
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                tmp_path = f"{self.path}.tmp"
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(self.records, f, ensure_ascii=False, indent=1)
+                os.replace(tmp_path, self.path)
+                self.mtime = os.stat(self.path).st_mtime_ns
+            except OSError:
+                pass
+
+
+class ArtifactStore:
+    """実行で生成された波形・ログの記録と、容量上限・件数上限による整理（~/.verilog_hdl_runner/artifacts.json）"""
+    
+    # 圧縮対象の波形
+    COMPRESSIBLE_EXTENSIONS = ('.vcd',)
+    # quota: 合計サイズ上限（バイト）、keep_last: テストベンチごとに成果物を保持する実行回数、
+    # compress_after: この秒数アクセスのない波形をgzip圧縮（いずれもNoneで無効）
+    DEFAULT_SETTINGS = {'quota': None, 'keep_last': None, 'compress_after': None}
+    
+    def __init__(self, path=None, log_output=None):
+        self.path = path or os.path.join(STATE_DIR, 'artifacts.json')
+        self.log_output = log_output or (lambda text, tag=None: None)
+        self.lock = threading.Lock()
+        self.settings = dict(self.DEFAULT_SETTINGS)
+        self.artifacts = {}
+        self.stamp = None
+        self._reload()
+        self._compress_thread = None
+    
+    def _reload(self):
+        """GUI・CLIなど他のプロセスが更新していれば読み直す（書き込む前に呼び、他の記録を失わないようにする）"""
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return
+        if (stat.st_mtime_ns, stat.st_size) == self.stamp:
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        self.settings = dict(self.DEFAULT_SETTINGS, **data.get('settings', {}))
+        self.artifacts = data.get('artifacts', {})
+        self.stamp = (stat.st_mtime_ns, stat.st_size)
+    
+    def _save(self):
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp_path = f"{self.path}.{uuid.uuid4().hex}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'settings': self.settings, 'artifacts': self.artifacts}, f, ensure_ascii=False, indent=1)
+            os.replace(tmp_path, self.path)
+            stat = os.stat(self.path)
+            self.stamp = (stat.st_mtime_ns, stat.st_size)
+        except OSError:
+            pass
+    
+    def configure(self, **settings):
+        """設定を更新して保存"""
+        with self.lock:
+            self._reload()
+            self.settings.update(settings)
+            self._save()
+    
+    def record(self, tb_path, paths):
+        """テストベンチの1回の実行で生成された成果物を記録し、{生成されたパス: 記録したパス} を返す
+        
+        保持する実行回数の指定があれば、次の実行で上書きされないよう実行ごとのファイル名
+        （add.vcd → add.<実行ID>.vcd）に変更して記録する
+        """
+        now = time.time()
+        run_id = f"{time.strftime('%Y%m%d-%H%M%S', time.localtime(now))}-{uuid.uuid4().hex[:6]}"
+        recorded = {}
+        with self.lock:
+            self._reload()
+            per_run = bool(self.settings.get('keep_last'))
+            for path in paths:
+                source = os.path.abspath(path)
+                if not os.path.isfile(source):
+                    continue
+                target = source
+                if per_run:
+                    stem, ext = os.path.splitext(source)
+                    target = f"{stem}.{run_id}{ext}"
+                    try:
+                        os.replace(source, target)
+                    except OSError as e:
+                        self.log_output(f"⚠️  成果物の名前を変更できません: {e}\n", 'warning')
+                        target = source
+                if target == source:
+                    # 同じ波形の古い圧縮版は上書きされたものとして削除
+                    stale = f"{source}.gz"
+                    if stale in self.artifacts:
+                        self._remove(stale)
+                self.artifacts[target] = {'testbench': os.path.abspath(tb_path), 'run': run_id, 'source': source,
+                                          'size': os.path.getsize(target), 'created': now, 'accessed': now}
+                recorded[path] = target
+            self._save()
+        return recorded
+    
+    def latest(self, path):
+        """生成時のパスに対応する最新の成果物（実行ごとのファイル名・圧縮版を含む、なければNone）"""
+        source = os.path.abspath(path)
+        with self.lock:
+            self._reload()
+            runs = [(entry['created'], recorded) for recorded, entry in self.artifacts.items()
+                    if entry.get('source', recorded) == source and os.path.exists(recorded)]
+        if runs:
+            return max(runs)[1]
+        for candidate in (source, f"{source}.gz"):
+            if os.path.exists(candidate):
+                return candidate
+        return None
+    
+    def touch(self, path):
+        """成果物の最終アクセス時刻を更新"""
+        with self.lock:
+            self._reload()
+            entry = self.artifacts.get(os.path.abspath(path))
+            if entry:
+                entry['accessed'] = time.time()
+                self._save()
+    
+    def _remove(self, path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            self.log_output(f"ファイル削除エラー: {e}\n", 'error')
+            return False
+        self.artifacts.pop(path, None)
+        return True
+    
+    def enforce(self, protect=()):
+        """保持する実行回数を超えた古い実行の成果物と、容量上限を超えた分を最終アクセスの古い順に削除"""
+        protect = {os.path.abspath(path) for path in protect}
+        evicted = []
+        with self.lock:
+            self._reload()
+            for path in [path for path in self.artifacts if not os.path.exists(path)]:
+                del self.artifacts[path]
+            
+            lru = sorted(self.artifacts, key=lambda path: self.artifacts[path]['accessed'])
+            keep_last = self.settings.get('keep_last')
+            if keep_last:
+                # テストベンチごとに実行単位でまとめ、新しい順に keep_last 回分を残す（実行IDのない古い記録は1件を1回とみなす）
+                runs = {}
+                for path, entry in self.artifacts.items():
+                    testbench_runs = runs.setdefault(entry['testbench'], {})
+                    run = entry.get('run', path)
+                    testbench_runs[run] = max(testbench_runs.get(run, 0), entry['created'])
+                expired = set()
+                for testbench, testbench_runs in runs.items():
+                    newest_first = sorted(testbench_runs, key=testbench_runs.get, reverse=True)
+                    expired.update((testbench, run) for run in newest_first[keep_last:])
+                for path in lru:
+                    entry = self.artifacts[path]
+                    if ((entry['testbench'], entry.get('run', path)) in expired and path not in protect and
+                            self._remove(path)):
+                        evicted.append(path)
+            
+            quota = self.settings.get('quota')
+            if quota:
+                total = sum(entry['size'] for entry in self.artifacts.values())
+                for path in lru:
+                    if total <= quota:
+                        break
+                    if path in self.artifacts and path not in protect:
+                        size = self.artifacts[path]['size']
+                        if self._remove(path):
+                            evicted.append(path)
+                            total -= size
+            self._save()
+        
+        for path in evicted:
+            self.log_output(f"🧹 古い成果物を削除: {path}\n", 'info')
+        return evicted
+    
+    def compress_stale(self):
+        """一定時間アクセスのない波形をgzip圧縮（GTKWaveは .vcd.gz をそのまま開ける）"""
+        compress_after = self.settings.get('compress_after')
+        if not compress_after:
+            return []
+        cutoff = time.time() - compress_after
+        with self.lock:
+            self._reload()
+            targets = [path for path, entry in self.artifacts.items()
+                       if path.endswith(self.COMPRESSIBLE_EXTENSIONS) and entry['accessed'] < cutoff]
+        
+        compressed = []
+        for path in targets:
+            gz_path = f"{path}.gz"
+            tmp_path = f"{gz_path}.{uuid.uuid4().hex}.tmp"
+            try:
+                with open(path, 'rb') as src, gzip.open(tmp_path, 'wb', compresslevel=6) as dest:
+                    shutil.copyfileobj(src, dest, 1024 * 1024)
+                os.replace(tmp_path, gz_path)
+            except OSError:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                continue
+            with self.lock:
+                self._reload()
+                entry = self.artifacts.pop(path, None)
+                if entry is None or entry['accessed'] >= cutoff:
+                    # 圧縮中に再生成・アクセスされた
+                    if entry is not None:
+                        self.artifacts[path] = entry
+                    os.remove(gz_path)
+                    continue
+                os.remove(path)
+                entry['size'] = os.path.getsize(gz_path)
+                self.artifacts[gz_path] = entry
+                self._save()
+            compressed.append(gz_path)
+            self.log_output(f"🗜️  波形を圧縮: {gz_path} ({format_size(entry['size'])})\n", 'info')
+        return compressed
+    
+    def compress_in_background(self):
+        """古い波形の圧縮をバックグラウンドで開始（実行中なら何もしない）"""
+        with self.lock:
+            if self._compress_thread is None or not self._compress_thread.is_alive():
+                self._compress_thread = threading.Thread(target=self.compress_stale, daemon=True)
+                self._compress_thread.start()
+    
+    def wait(self):
+        """バックグラウンドの圧縮の完了を待つ"""
+        thread = self._compress_thread
+        if thread is not None:
+            thread.join()
+    
+    def usage(self):
+        """(合計サイズ, 件数, テストベンチ数) を返す"""
+        with self.lock:
+            self._reload()
+            entries = list(self.artifacts.values())
+        return (sum(entry['size'] for entry in entries), len(entries),
+                len({entry['testbench'] for entry in entries}))
+    
+    def describe_usage(self):
+        """使用量の表示用文字列"""
+        total, count, testbenches = self.usage()
+        quota = self.settings.get('quota')
+        limit = f" / {format_size(quota)}" if quota else ''
+        return f"💾 成果物: {format_size(total)}{limit} ({count} 件, {testbenches} テストベンチ)"
+
+
+class DumpControl:
+    """波形ダンプの範囲（スコープ・深さ・時間窓）指定"""
+    
+    HELPER_MODULE = '__vhr_dump_control'
+    
+    def __init__(self, scopes=None, depth=0, start=None, stop=None):
+        self.scopes = [s for s in (scopes or []) if s]
+        self.depth = depth
+        self.start = start
+        self.stop = stop
+    
+    @classmethod
+    def from_options(cls, scope_text='', depth=0, start_text='', stop_text=''):
+        """GUI・CLIの入力文字列から作成（範囲が不正ならValueError）"""
+        depth = int(depth or 0)
+        start = parse_sim_time(start_text) if start_text else None
+        stop = parse_sim_time(stop_text) if stop_text else None
+        if depth < 0:
+            raise ValueError(f"ダンプする階層の深さは0以上を指定してください: {depth}")
+        if start is not None and stop is not None and stop <= start:
+            raise ValueError(f"ダンプ終了時刻 ({stop_text}) は開始時刻 ({start_text}) より後にしてください")
+        return cls(
+            scopes=[s.strip() for s in re.split(r'[,\s]+', scope_text or '') if s.strip()],
+            depth=depth,
+            start=start,
+            stop=stop,
+        )
+    
+    def to_dict(self):
+        return {'scopes': self.scopes, 'depth': self.depth, 'start': self.start, 'stop': self.stop}
+    
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**data) if data else None
+    
+    def describe(self):
+        """ログ表示用の説明"""
+        window = f"{self.start or 0}ps〜{f'{self.stop}ps' if self.stop is not None else '終了'}"
+        return f"スコープ {', '.join(self.scopes) or '(トップ)'} / 深さ {self.depth or '全階層'} / 時間 {window}"
+    
+    def prepare(self, name, tb_file, directory, build_dir):
+        """ダンプ指定を無効化したテストベンチのコピーと制御モジュールを生成"""
+        with open(os.path.join(directory, tb_file), 'r', encoding='utf-8', errors='ignore') as f:
+            content = f.read()
+        
+        dump_match = DUMPFILE_PATTERN.search(content)
+        dump_file = dump_match.group(1) if dump_match else f"{name}.vcd"
+        scopes = self.scopes or MODULE_DECLARATION_PATTERN.findall(content)[:1]
+        
+        # 行番号を保ったままダンプ関連タスクを空文に置き換える
+        stripped = DUMP_TASK_PATTERN.sub(lambda m: ';' + '\n' * m.group(0).count('\n'), content)
+        tb_copy = os.path.join(build_dir, os.path.basename(tb_file))
+        with open(tb_copy, 'w', encoding='utf-8') as f:
+            f.write(f'`line 1 "{tb_file}" 0\n{stripped}')
+        
+        lines = [
+            '// Verilog HDL Runner が生成した波形ダンプ制御モジュール',
+            '`timescale 1ps/1ps',
+            f'module {self.HELPER_MODULE};',
+            '  initial begin',
+            f'    $dumpfile("{dump_file}");',
+        ]
+        lines += [f'    $dumpvars({self.depth}, {scope});' for scope in scopes]
+        if self.start:
+            lines += ['    $dumpoff;', f'    #{self.start} $dumpon;']
+        if self.stop is not None:
+            lines.append(f'    #{self.stop - (self.start or 0)} $dumpoff;')
+        lines += ['  end', 'endmodule', '']
+        
+        helper = os.path.join(build_dir, f"{self.HELPER_MODULE}.v")
+        with open(helper, 'w', encoding='utf-8') as f:
+            f.write('\n'.join(lines))
+        return tb_copy, helper, dump_file
+
+
+class SimulatorBackend:
+    """シミュレーターのバックエンド（コンパイル・実行・波形パス・バージョン）"""
+    
+    name = None
+    label = None
+    
+    def version(self):
+        """バージョン文字列（未インストールならNone）"""
+        raise NotImplementedError
+    
+    def compile(self, pipeline, name, tb_file, dep_files, directory):
+        raise NotImplementedError
+    
+    def simulate(self, pipeline, name, directory):
+        raise NotImplementedError
+    
+    def cleanup(self, pipeline, name, directory):
+        """実行後の後始末"""
+    
+    def waveform_path(self, name, tb_file, directory):
+        """テストベンチの $dumpfile から波形ファイルのパスを返す"""
+        with open(os.path.join(directory, tb_file), 'r', encoding='utf-8', errors='ignore') as f:
+            dump_match = DUMPFILE_PATTERN.search(f.read())
+        return os.path.join(directory, dump_match.group(1) if dump_match else f"{name}.vcd")
+    
+    def _command_version(self, cmd):
+        try:
+            result = subprocess.run(cmd, capture_output=True, text=True)
+        except OSError:
+            return None
+        lines = (result.stdout or result.stderr).strip().splitlines()
+        return lines[0] if lines else None
+
+
+class IcarusBackend(SimulatorBackend):
+    """Icarus Verilog (iverilog + vvp)"""
+    
+    name = 'icarus'
+    label = 'Icarus Verilog'
+    
+    def version(self):
+        return self._command_version(["iverilog", "-V"])
+    
+    def compile(self, pipeline, name, tb_file, dep_files, directory):
+        return pipeline.run_iverilog(name, tb_file, dep_files, directory)
+    
+    def simulate(self, pipeline, name, directory):
+        return pipeline.run_vvp(name, directory)
+    
+    def cleanup(self, pipeline, name, directory):
+        pipeline.cleanup_file(name, directory)
+
+
+class VerilatorBackend(SimulatorBackend):
+    """Verilator（--binary でビルドしたモデルを実行、オブジェクトはキャッシュして再利用）"""
+    
+    name = 'verilator'
+    label = 'Verilator'
+    
+    _build_locks = {}
+    _build_locks_lock = threading.Lock()
+    
+    def __init__(self, threads=None):
+        self.threads = threads
+        self.binary = None
+    
+    def version(self):
+        return self._command_version(["verilator", "--version"])
+    
+    def build_dir(self, name, sources, directory):
+        """テストベンチごとのビルドディレクトリ（ビルド間でオブジェクトを再利用）"""
+        # 別のフォルダーにある同名のテストベンチとは共有しない
+        key = hashlib.sha1('\0'.join([os.path.abspath(directory), name] + sorted(sources))
+                           .encode('utf-8')).hexdigest()[:12]
+        return os.path.join(STATE_DIR, 'verilator', f"{name}_{key}")
+    
+    def _build_lock(self, build_dir):
+        with self._build_locks_lock:
+            return self._build_locks.setdefault(build_dir, threading.Lock())
+    
+    def compile(self, pipeline, name, tb_file, dep_files, directory):
+        with open(os.path.join(directory, tb_file), 'r', encoding='utf-8', errors='ignore') as f:
+            modules = MODULE_DECLARATION_PATTERN.findall(f.read())
+        if pipeline.dump_control:
+            pipeline.log_output("⚠️  Verilatorではダンプ範囲の制限は未対応のため無視します。\n", 'warning')
+        
+        build_dir = self.build_dir(name, [tb_file] + dep_files, directory)
+        cmd = ["verilator", "--binary", "--trace", "-Wno-fatal", "-j", "0",
+               "--Mdir", build_dir, "-o", name]
+        if modules:
+            cmd += ["--top-module", modules[0]]
+        if self.threads:
+            cmd += ["--threads", str(self.threads)]
+        cmd += [tb_file] + dep_files
+        
+        env = dict(os.environ)
+        if shutil.which("ccache"):
+            # 変更のないC++ファイルはccacheから再利用
+            env.setdefault("OBJCACHE", "ccache")
+        pipeline.log_output(f"🔨 実行中: {' '.join(cmd)}\n", 'info')
+        
+        try:
+            with self._build_lock(build_dir):
+                os.makedirs(build_dir, exist_ok=True)
+                result = subprocess.run(cmd, capture_output=True, text=True, cwd=directory, env=env)
+        except FileNotFoundError:
+            pipeline.log_output("❌ エラー: verilatorが見つかりません。Verilatorがインストールされているか確認してください。\n", 'error')
+            return False
+        
+        if result.returncode != 0:
+            pipeline.log_output(f"❌ コンパイルエラー:\n{result.stderr}\n", 'error')
+            return False
+        pipeline.log_output(f"✓ コンパイル成功 (キャッシュ: {build_dir})\n", 'success')
+        self.binary = os.path.join(build_dir, name)
+        return True
+    
+    def simulate(self, pipeline, name, directory):
+        cmd = [self.binary]
+        pipeline.log_output(f"⚡ 実行中: {' '.join(cmd)}\n", 'info')
+        
+        try:
+            start = time.time()
+            result = subprocess.run(cmd, capture_output=True, text=True, cwd=directory)
+            pipeline.last_simulation_time = time.time() - start
+        except OSError as e:
+            pipeline.log_output(f"❌ エラー: シミュレーションを実行できません: {e}\n", 'error')
+            return False
+        pipeline.log_output(f"📊 シミュレーション結果 ({pipeline.last_simulation_time:.2f}s):\n", 'header')
+        pipeline.log_output(f"{result.stdout}\n")
+        if result.stderr:
+            pipeline.log_output(f"⚠️  警告:\n{result.stderr}\n", 'warning')
+        return pipeline.check_simulation_result(result)
+
+
+SIMULATOR_BACKENDS = {backend.name: backend for backend in (IcarusBackend, VerilatorBackend)}
+DEFAULT_BACKEND = 'icarus'
+
+
+def create_backend(name=None, threads=None):
+    """名前からバックエンドを作成（ジョブごとに作成する）"""
+    backend_class = SIMULATOR_BACKENDS[name or DEFAULT_BACKEND]
+    return backend_class(threads) if backend_class is VerilatorBackend else backend_class()
+
+
+def testbench_backend(tb_path, override=None, history=None):
+    """テストベンチに使うバックエンド名（指定 > 実行記録 > 既定）"""
+    name = override or (history.get(tb_path).get('backend') if history is not None else None)
+    return name if name in SIMULATOR_BACKENDS else DEFAULT_BACKEND
+
+
+class VerilogPipeline:
+    """コンパイル・シミュレーション処理の共通部分（GUI・ヘッドレス共用）"""
+    
+    # 波形ダンプ範囲の指定（Noneならテストベンチの記述どおり）
+    dump_control = None
+    last_simulation_time = None
+    # 成果物の記録・整理（Noneなら記録しない）
+    artifact_store = None
+    # ゴールデン波形との比較（Noneなら比較しない）
+    golden = None
+    # 列形式エクスポートの出力先（テストベンチのディレクトリからの相対パス、Noneならエクスポートしない）
+    column_export_dir = None
+    # 所要時間・バックエンド・波形サイズの実行記録（Noneなら記録しない）
+    history = None
+    
+    def log_output(self, text, tag=None):
+        """出力を標準出力に書き出す"""
+        sys.stdout.write(text)
+        sys.stdout.flush()
+    
+    def find_dependencies(self, tb_file, directory):
+        """テストベンチファイルから依存ファイルを検出して返す"""
+        tb_path = os.path.join(directory, tb_file)
+        dependencies = set()
+        
+        # モジュールインスタンス化を検索
+        dependencies.update(self.module_references(tb_path, directory))
+        
+        # メインモジュールファイルを追加（テストベンチと同じ名前から_tbを除いたもの）
+        main_module = self.main_module_file(tb_file, directory)
+        if main_module:
+            dependencies.add(main_module)
+        
+        # 依存ファイルの依存関係を再帰的に検出
+        self.detect_nested_dependencies(dependencies, directory)
+        return dependencies
+    
+    def referenced_modules(self, content, directory):
+        """ソース中でインスタンス化されているモジュールのうち、同じディレクトリにあるファイル"""
+        modules = []
+        for match in MODULE_INSTANCE_PATTERN.finditer(content):
+            module_name = match.group(1)
+            # 予約語を除外
+            if module_name.lower() not in VERILOG_RESERVED_WORDS:
+                module_file = f"{module_name}.v"
+                if os.path.exists(os.path.join(directory, module_file)) and module_file not in modules:
+                    modules.append(module_file)
+        return modules
+    
+    def module_references(self, file_path, directory):
+        """ファイルを読み、インスタンス化しているモジュールのファイルを返す"""
+        with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
+            content = f.read()
+        return self.referenced_modules(content, directory)
+    
+    def main_module_file(self, tb_file, directory):
+        """テストベンチと同じ名前から_tbを除いたメインモジュールファイル（なければNone）"""
+        main_module = tb_file.replace('_tb.v', '.v')
+        return main_module if os.path.exists(os.path.join(directory, main_module)) else None
+    
+    def detect_nested_dependencies(self, dependencies, directory):
+        """依存ファイルの中からさらに依存ファイルを再帰的に検出"""
+        files_to_check = list(dependencies)
+        checked_files = set()
+        
+        while files_to_check:
+            current_file = files_to_check.pop(0)
+            if current_file in checked_files:
+                continue
+            checked_files.add(current_file)
+            
+            file_path = os.path.join(directory, current_file)
+            if not os.path.exists(file_path):
+                continue
+            
+            try:
+                # モジュールインスタンス化を検索
+                for module_file in self.module_references(file_path, directory):
+                    if module_file not in dependencies:
+                        dependencies.add(module_file)
+                        files_to_check.append(module_file)
+            except Exception:
+                pass
+    
+    def run_iverilog(self, name, tb_file, dep_files, directory):
+        """iverilogコマンドを実行（複数ファイル対応）"""
+        cmd = ["iverilog", "-Wall", "-o", name, tb_file] + dep_files
+        build_dir = None
+        if self.dump_control:
+            # ダンプ指定を外したテストベンチのコピーと制御モジュールを一緒にコンパイル
+            build_dir = tempfile.mkdtemp(prefix=f"{name}_dump_")
+            tb_copy, helper, dump_file = self.dump_control.prepare(name, tb_file, directory, build_dir)
+            cmd = ["iverilog", "-Wall", "-I", ".", "-o", name, tb_copy] + dep_files + [helper]
+            self.log_output(f"📉 ダンプ範囲を制限: {self.dump_control.describe()} → {dump_file}\n", 'info')
+        self.log_output(f"🔨 実行中: {' '.join(cmd)}\n", 'info')
+        
+        try:
+            result = subprocess.run(cmd, capture_output=True, text=True, cwd=directory)
+            if result.returncode != 0:
+                self.log_output(f"❌ コンパイルエラー:\n{result.stderr}\n", 'error')
+                return False
+            
+            self.log_output(f"✓ コンパイル成功\n", 'success')
+            if result.stdout:
+                self.log_output(f"{result.stdout}\n")
+            return True
+            
+        except FileNotFoundError:
+            self.log_output("❌ エラー: iverilogが見つかりません。Icarus Verilogがインストールされているか確認してください。\n", 'error')
+            return False
+        finally:
+            if build_dir:
+                shutil.rmtree(build_dir, ignore_errors=True)
+    
+    def run_vvp(self, name, directory):
+        """vvpコマンドを実行"""
+        cmd = ["vvp", name]
+        self.log_output(f"⚡ 実行中: {' '.join(cmd)}\n", 'info')
+        
+        try:
+            start = time.time()
+            result = subprocess.run(cmd, capture_output=True, text=True, cwd=directory)
+            self.last_simulation_time = time.time() - start
+            self.log_output(f"📊 シミュレーション結果 ({self.last_simulation_time:.2f}s):\n", 'header')
+            self.log_output(f"{result.stdout}\n")
+            if result.stderr:
+                self.log_output(f"⚠️  警告:\n{result.stderr}\n", 'warning')
+            return self.check_simulation_result(result)
+        except FileNotFoundError:
+            self.log_output("❌ エラー: vvpが見つかりません。\n", 'error')
+            return False
+    
+    def check_simulation_result(self, result):
+        """終了コードと失敗メッセージから成否を判定（失敗メッセージによる失敗はログに表示）"""
+        passed = simulation_passed(result.returncode, result.stdout + result.stderr)
+        if not passed and result.returncode == 0:
+            self.log_output("❌ 出力に失敗メッセージ (ERROR / FATAL / FAIL) があります\n", 'error')
+        return passed
+    
+    def report_dump_stats(self, name, tb_file, directory):
+        """波形サイズとシミュレーション時間を記録し、制限あり/なしを比較表示"""
+        with open(os.path.join(directory, tb_file), 'r', encoding='utf-8', errors='ignore') as f:
+            dump_match = DUMPFILE_PATTERN.search(f.read())
+        dump_path = os.path.join(directory, dump_match.group(1) if dump_match else f"{name}.vcd")
+        if not os.path.exists(dump_path) or self.last_simulation_time is None:
+            return
+        
+        current = {'size': os.path.getsize(dump_path), 'time': self.last_simulation_time}
+        self.log_output(f"💾 波形: {format_size(current['size'])} / シミュレーション {current['time']:.2f}s\n", 'info')
+        if self.history is None:
+            return
+        key = 'dump_scoped' if self.dump_control else 'dump_full'
+        self.history.update(os.path.join(directory, tb_file), **{key: current})
+        
+        if self.dump_control:
+            full = self.history.get(os.path.join(directory, tb_file)).get('dump_full')
+            if full:
+                self.log_output(f"   制限なし（前回記録）: {format_size(full['size'])} / {full['time']:.2f}s\n", 'info')
+            else:
+                self.log_output("   制限なしの記録はまだありません\n", 'info')
+    
+    def compare_golden(self, name, tb_file, directory, backend=None):
+        """シミュレーション後の波形をゴールデン波形と比較（比較しない・一致ならTrue）"""
+        if self.golden is None:
+            return True
+        waveform_path = (backend or IcarusBackend()).waveform_path(name, tb_file, directory)
+        try:
+            return self.golden.run(self, waveform_path)
+        except (OSError, ValueError) as e:
+            self.log_output(f"❌ ゴールデン波形の比較エラー: {e}\n", 'error')
+            return False
+    
+    def export_columns(self, name, tb_file, directory, backend=None):
+        """シミュレーション後の波形を信号ごとの列形式に変換"""
+        if self.column_export_dir is None:
+            return None
+        waveform_path = (backend or IcarusBackend()).waveform_path(name, tb_file, directory)
+        out_dir = os.path.join(directory, self.column_export_dir,
+                               os.path.splitext(os.path.basename(waveform_path))[0])
+        return ColumnarExport().run(self, waveform_path, out_dir)
+    
+    def store_artifacts(self, tb_file, directory, paths):
+        """1回の実行で生成された波形・ログを記録し、保持ルールに従って古い成果物を整理
+        
+        {生成されたパス: 記録したパス（実行ごとのファイル名に変更されていればそのパス）} を返す
+        """
+        if self.artifact_store is None:
+            return {path: path for path in paths}
+        recorded = self.artifact_store.record(os.path.join(directory, tb_file), paths)
+        self.artifact_store.enforce(protect=recorded.values())
+        self.artifact_store.compress_in_background()
+        return recorded
+    
+    def cleanup_file(self, name, directory):
+        """生成された実行ファイルを削除"""
+        filepath = os.path.join(directory, name)
+        if os.path.exists(filepath):
+            try:
+                os.remove(filepath)
+                self.log_output(f"🗑️  実行ファイル '{name}' を削除しました。\n", 'info')
+            except OSError as e:
+                self.log_output(f"ファイル削除エラー: {e}\n", 'error')
+    
+    def run_job(self, job):
+        """ジョブをローカルでコンパイル・実行して結果を記録"""
+        start = time.time()
+        backend = create_backend(job.backend, job.threads)
+        self.log_output(f"🚀 {job.name} の実行を開始 ({job.directory}, {backend.label})\n", 'header')
+        passed = (backend.compile(self, job.name, job.tb_file, job.dep_files, job.directory) and
+                  backend.simulate(self, job.name, job.directory))
+        if passed:
+            self.report_dump_stats(job.name, job.tb_file, job.directory)
+            passed = self.compare_golden(job.name, job.tb_file, job.directory, backend)
+            self.export_columns(job.name, job.tb_file, job.directory, backend)
+        backend.cleanup(self, job.name, job.directory)
+        self.store_artifacts(job.tb_file, job.directory,
+                             [backend.waveform_path(job.name, job.tb_file, job.directory)])
+        job.attempts += 1
+        job.status = 'passed' if passed else 'failed'
+        job.elapsed = time.time() - start
+        return job
+    
+    def compare_backends(self, name, tb_file, dep_files, directory, threads=None):
+        """インストール済みの各バックエンドでコンパイル・実行時間を計測して比較"""
+        timings = {}
+        for backend_name in SIMULATOR_BACKENDS:
+            backend = create_backend(backend_name, threads)
+            version = backend.version()
+            if version is None:
+                self.log_output(f"⏭️  {backend.label} が見つからないためスキップします\n", 'warning')
+                continue
+            self.log_output(f"\n⚖️  {backend.label} ({version})\n", 'header')
+            start = time.time()
+            compiled = backend.compile(self, name, tb_file, dep_files, directory)
+            compile_time = time.time() - start
+            passed = compiled and backend.simulate(self, name, directory)
+            backend.cleanup(self, name, directory)
+            if not passed:
+                self.log_output(f"❌ {backend.label} での実行に失敗しました\n", 'error')
+                continue
+            timings[backend_name] = {'version': version, 'compile': compile_time,
+                                     'simulate': self.last_simulation_time}
+        
+        if not timings:
+            return timings
+        if self.history is not None:
+            self.history.update(os.path.join(directory, tb_file), backend_timing=timings)
+        
+        self.log_output(f"\n📊 バックエンド比較 ({name}):\n", 'header')
+        for backend_name, timing in timings.items():
+            self.log_output(f"   {SIMULATOR_BACKENDS[backend_name].label:16} コンパイル {timing['compile']:7.2f}s"
+                            f"  シミュレーション {timing['simulate']:7.2f}s\n", 'info')
+        if len(timings) >= 2:
+            # コンパイルが遅くシミュレーションが速い側が何回の実行で逆転するか
+            fast_compile = min(timings, key=lambda b: timings[b]['compile'])
+            fast_sim = min(timings, key=lambda b: timings[b]['simulate'])
+            extra = timings[fast_sim]['compile'] - timings[fast_compile]['compile']
+            saved = timings[fast_compile]['simulate'] - timings[fast_sim]['simulate']
+            if fast_compile == fast_sim or saved <= 0:
+                self.log_output(f"✓ {SIMULATOR_BACKENDS[fast_compile].label} が有利です\n", 'success')
+            else:
+                runs = max(1, int(-(-extra // saved)))
+                self.log_output(f"✓ 1回のコンパイルにつき {runs} 回以上シミュレーションするなら "
+                                f"{SIMULATOR_BACKENDS[fast_sim].label} が有利です\n", 'success')
+        return timings
+    
+    def run_fanout(self, name, tb_file, dep_files, directory, runs, jobs=None):
+        """一度だけコンパイルし、シード・plusargごとにvvpを並列実行"""
+        if not self.run_iverilog(name, tb_file, dep_files, directory):
+            self.cleanup_file(name, directory)
+            return None
+        
+        executable = os.path.abspath(os.path.join(directory, name))
+        # $readmemh などが相対パスで読むファイルを各実行ディレクトリへリンクする
+        data_files = collect_source_bundle(tb_file, dep_files, directory)
+        jobs = jobs or os.cpu_count() or 1
+        self.log_output(f"🎲 ファンアウト実行: {len(runs)} 件 (並列数 {jobs})\n", 'header')
+        
+        start = time.time()
+        results = []
+        with ThreadPoolExecutor(max_workers=jobs) as pool:
+            futures = [
+                pool.submit(self._run_fanout_case, executable, name, label, plusargs, directory, data_files)
+                for label, plusargs in runs
+            ]
+            for future in as_completed(futures):
+                result = future.result()
+                results.append(result)
+                status = '✓ PASS' if result.passed else '❌ FAIL'
+                self.log_output(f"{status} {result.label:16} {result.elapsed:7.2f}s  {' '.join(result.plusargs)}\n",
+                                'success' if result.passed else 'error')
+        
+        self.cleanup_file(name, directory)
+        recorded = self.store_artifacts(tb_file, directory, [path for result in results
+                                                             for path in (result.waveform, result.log_file) if path])
+        for result in results:
+            result.waveform = recorded.get(result.waveform, result.waveform)
+            result.log_file = recorded.get(result.log_file, result.log_file)
+        order = {label: index for index, (label, _) in enumerate(runs)}
+        results.sort(key=lambda r: order[r.label])
+        failed = [r for r in results if not r.passed]
+        self.log_output(f"📊 {len(results) - len(failed)}/{len(results)} 件成功 "
+                        f"(合計 {time.time() - start:.2f}s)\n", 'success' if not failed else 'error')
+        if failed:
+            self.log_output("❌ 失敗したシード（再現用コマンド）:\n", 'error')
+            for result in failed:
+                self.log_output(f"   {result.label}: vvp {name} {' '.join(result.plusargs)}  (ログ: {result.log_file})\n", 'error')
+        return results
+    
+    def run_merged(self, jobs):
+        """ディレクトリごとに小さなテストベンチを1つのイメージへまとめてコンパイルし、vvpを1回で実行"""
+        suites, fallback = plan_merged_suites(jobs)
+        for job, reason in fallback:
+            self.log_output(f"↩️  {job.name} は個別に実行します: {reason}\n", 'warning')
+        individual = [job for job, _ in fallback]
+
+        merged_total, individual_total, compared = 0.0, 0.0, 0
+        for number, suite in enumerate(suites, 1):
+            self.log_output(f"\n🧬 統合実行 {number}/{len(suites)}: {len(suite.jobs)} 件 ({suite.directory}、波形ダンプなし)\n"
+                            f"   {', '.join(job.name for job in suite.jobs)}\n", 'header')
+            start = time.time()
+            retry = self._run_merged_suite(suite, f"{MergedSuite.HELPER_MODULE}{number}", start)
+            elapsed = time.time() - start
+            if retry:
+                self.log_output(f"⚠️  個別に実行し直します: "
+                                f"{', '.join(job.name for job in retry)}\n", 'warning')
+                individual.extend(retry)
+                continue
+
+            # 個別実行の実績（コンパイル込み）と比べた短縮効果
+            if all(job.estimated_from == 'history' for job in suite.jobs):
+                separate = sum(job.estimate for job in suite.jobs)
+                merged_total += elapsed
+                individual_total += separate
+                compared += 1
+                self.log_output(f"⚡ 統合実行 {format_duration(elapsed)} / 個別実行の実績合計 {format_duration(separate)} "
+                                f"(×{separate / max(elapsed, 1e-6):.1f})\n", 'success')
+            else:
+                self.log_output(f"⚡ 統合実行 {format_duration(elapsed)} (個別実行の実績がないテストベンチがあるため比較できません)\n",
+                                'info')
+        if compared > 1:
+            self.log_output(f"⚡ 統合実行の合計 {format_duration(merged_total)} / 個別実行の実績合計 "
+                            f"{format_duration(individual_total)} (×{individual_total / merged_total:.1f})\n", 'success')
+
+        # 個別に実行するものだけ所要時間を記録する（統合実行の時間は実績に含めない）
+        progress = ScheduleProgress(individual, self.log_output, history=self.history)
+        for job in individual:
+            progress.start(job)
+            self.run_job(job)
+            progress.finish(job)
+        return jobs
+
+    def _run_merged_suite(self, suite, executable, start):
+        """統合イメージをコンパイル・実行して出力を振り分け、完了しなかったジョブを返す"""
+        build_dir = tempfile.mkdtemp(prefix=f"{executable}_")
+        try:
+            cmd = suite.prepare(executable, build_dir)
+            self.log_output(f"🔨 実行中: {' '.join(cmd)}\n", 'info')
+            result = subprocess.run(cmd, capture_output=True, text=True, cwd=suite.directory)
+        except FileNotFoundError:
+            self.log_output("❌ エラー: iverilogが見つかりません。Icarus Verilogがインストールされているか確認してください。\n", 'error')
+            return list(suite.jobs)
+        finally:
+            shutil.rmtree(build_dir, ignore_errors=True)
+        if result.returncode != 0:
+            self.log_output(f"❌ 統合コンパイルエラー:\n{result.stderr}\n", 'error')
+            self.cleanup_file(executable, suite.directory)
+            return list(suite.jobs)
+        self.log_output("✓ コンパイル成功\n", 'success')
+
+        self.log_output(f"⚡ 実行中: vvp {executable}\n", 'info')
+        try:
+            proc = subprocess.run(["vvp", executable], capture_output=True, text=True, cwd=suite.directory)
+        except FileNotFoundError:
+            self.log_output("❌ エラー: vvpが見つかりません。\n", 'error')
+            return list(suite.jobs)
+        finally:
+            self.cleanup_file(executable, suite.directory)
+
+        outputs, shared, done, late = suite.split_output(proc.stdout)
+        if shared:
+            self.log_output(f"📄 共通出力:\n{''.join(shared)}\n")
+        if proc.stderr:
+            self.log_output(f"⚠️  警告:\n{proc.stderr}\n", 'warning')
+        if not simulation_passed(proc.returncode, ''.join(shared) + proc.stderr):
+            # 終了コードと共通出力はイメージ全体のもので、どのテストベンチの失敗か特定できない
+            self.log_output(f"⚠️  統合実行の終了コード ({proc.returncode}) または共通出力が失敗を示しているため、"
+                            f"すべて個別に実行します\n", 'warning')
+            return list(suite.jobs)
+        retry = []
+        for index, job in enumerate(suite.jobs):
+            if index not in done:
+                # 完了通知の前にシミュレーションが終了した
+                retry.append(job)
+                continue
+            output = ''.join(outputs[suite.tops[index]])
+            log_file = os.path.join(job.directory, f"{job.name}.log")
+            with open(log_file, 'w', encoding='utf-8') as f:
+                f.write(output)
+            # 個別実行と同じ基準で判定（終了コードと共通出力は上で確認済み）
+            passed = simulation_passed(proc.returncode, output)
+            self.log_output(f"📊 {job.name} の結果:\n", 'header')
+            self.log_output(f"{output}\n")
+            if late[suite.tops[index]]:
+                self.log_output(f"   (完了後の出力 {late[suite.tops[index]]} 行は除外しました)\n", 'info')
+            log_file = self.store_artifacts(job.tb_file, job.directory, [log_file]).get(log_file, log_file)
+            self.log_output(f"{'✓ PASS' if passed else '❌ FAIL'} {job.name}  (ログ: {log_file})\n",
+                            'success' if passed else 'error')
+            job.attempts += 1
+            job.status = 'passed' if passed else 'failed'
+            job.elapsed = time.time() - start
+        return retry
+    
+    def _run_fanout_case(self, executable, name, label, plusargs, directory, data_files):
+        """専用ディレクトリでvvpを1回実行し、波形とログを個別の名前で保存"""
+        out_name = f"{name}_{label}"
+        run_dir = tempfile.mkdtemp(prefix=f"{out_name}_")
+        result = FanoutResult(label, plusargs)
+        try:
+            for rel_path, path in data_files.items():
+                dest = os.path.join(run_dir, rel_path)
+                os.makedirs(os.path.dirname(dest), exist_ok=True)
+                link_or_copy(path, dest)
+            
+            start = time.time()
+            try:
+                proc = subprocess.run(["vvp", executable] + plusargs, capture_output=True, text=True, cwd=run_dir)
+                result.returncode = proc.returncode
+                result.output = proc.stdout + proc.stderr
+            except FileNotFoundError:
+                result.output = "vvpが見つかりません。\n"
+            result.elapsed = time.time() - start
+            result.passed = simulation_passed(result.returncode, result.output)
+            
+            # $dumpfile がサブディレクトリを指していても拾う
+            waveforms = [
+                os.path.relpath(os.path.join(dirpath, filename), run_dir)
+                for dirpath, _, filenames in os.walk(run_dir) for filename in filenames
+                if filename.endswith(WAVEFORM_EXTENSIONS)]
+            waveforms = sorted((path for path in waveforms if path not in data_files),
+                               key=lambda path: (path.count(os.sep), path))
+            if waveforms:
+                result.waveform = os.path.join(directory, out_name + os.path.splitext(waveforms[0])[1])
+                shutil.move(os.path.join(run_dir, waveforms[0]), result.waveform)
+            
+            result.log_file = os.path.join(directory, f"{out_name}.log")
+            with open(result.log_file, 'w', encoding='utf-8') as f:
+                f.write(result.output)
+        finally:
+            shutil.rmtree(run_dir, ignore_errors=True)
+        return result
+
+
+class VerilogRunner(VerilogPipeline):
     def __init__(self, root):
         self.root = root
         self.root.title("🔧 Verilog HDL Runner")
         self.root.geometry("1200x750")
         
-        # モダンなスタイル設定
-        style = ttk.Style()
-        style.theme_use('default')
+        # モダンなスタイル設定
+        style = ttk.Style()
+        style.theme_use('default')
+        
+        # カスタムカラー
+        self.colors = {
+            'primary': '#2563eb',
+            'success': '#10b981',
+            'warning': '#f59e0b',
+            'danger': '#ef4444',
+            'bg_light': '#f8fafc',
+            'border': '#e2e8f0'
+        }
+        
+        # 現在のディレクトリ
+        self.current_dir = os.getcwd()
+        self.selected_directory = self.current_dir
+        
+        # テストベンチごとの実行記録（選択のたびに読み直さないよう共有）
+        self.history = RunHistory()
+        
+        # 診断モード（主要処理の計測。無効時は呼び出しをそのまま通す）
+        self.diagnostics = Diagnostics()
+        self.diagnostics.instrument(self, (
+            'refresh_files', 'detect_dependencies', 'update_dependency_list',
+            'log_output', 'run_verilog_thread'
+        ))
+        
+        # 波形ファイルごとのGTKWave
+        self.gtkwave_sessions = GtkwaveSessionManager(self.log_output)
+        # 波形・ログの記録と整理
+        self.artifact_store = ArtifactStore(log_output=self.log_output)
+        # 保存されたファイルをバックグラウンドで構文チェック
+        self.syntax_checker = SyntaxChecker(on_result=self.on_syntax_result)
+        self.dep_checkbuttons = {}
+        # フォルダー選択時に全テストベンチの依存ファイルを先に解決
+        self.dependency_cache = DependencyCache(self)
+        self.dependency_pool = ThreadPoolExecutor(max_workers=min(4, os.cpu_count() or 1))
+        
+        self._setup_ui()
+        self.refresh_files()
+        self.poll_viewers()
+        self.poll_syntax()
+        self.diagnostics.watch_mainloop(self.root)
+    
+    def _setup_ui(self):
+        """UIコンポーネントを設定"""
+        # メインフレーム
+        main_frame = ttk.Frame(self.root, padding="15")
+        main_frame.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
+        
+        self._setup_directory_frame(main_frame)
+        self._setup_file_frame(main_frame)
+        self._setup_button_frame(main_frame)
+        self._setup_option_frame(main_frame)
+        self._setup_output_frame(main_frame)
+        self._configure_grid_weights(main_frame)
+    
+    def _setup_directory_frame(self, parent):
+        """ディレクトリ選択フレームを設定"""
+        dir_frame = ttk.LabelFrame(parent, text="📂 作業ディレクトリ", padding="10")
+        dir_frame.grid(row=0, column=0, columnspan=2, sticky=(tk.W, tk.E), pady=(0, 10))
+        
+        self.dir_var = tk.StringVar(value=self.current_dir)
+        ttk.Label(dir_frame, text="ディレクトリ:", font=('', 10, 'bold')).grid(row=0, column=0, sticky=tk.W, padx=(0, 10))
+        self.dir_entry = ttk.Entry(dir_frame, textvariable=self.dir_var, width=70, font=('', 10))
+        self.dir_entry.grid(row=0, column=1, padx=(0, 5), sticky=(tk.W, tk.E))
+        ttk.Button(dir_frame, text="📁 参照", command=self.browse_directory).grid(row=0, column=2, padx=(0, 5))
+        ttk.Button(dir_frame, text="🔄 更新", command=self.refresh_files).grid(row=0, column=3)
+        
+        # ワークスペース全体のテストベンチ検索
+        ttk.Label(dir_frame, text="🔎 検索:", font=('', 10, 'bold')).grid(row=1, column=0, sticky=tk.W, padx=(0, 10), pady=(5, 0))
+        self.search_var = tk.StringVar()
+        self.search_entry = ttk.Entry(dir_frame, textvariable=self.search_var, font=('', 10))
+        self.search_entry.grid(row=1, column=1, padx=(0, 5), pady=(5, 0), sticky=(tk.W, tk.E))
+        self.search_status_var = tk.StringVar()
+        ttk.Label(dir_frame, textvariable=self.search_status_var).grid(row=1, column=2, columnspan=2, sticky=tk.W, pady=(5, 0))
+        
+        self.search_listbox = tk.Listbox(dir_frame, height=8, font=('', 10), relief=tk.FLAT,
+                                         borderwidth=1, highlightthickness=1, highlightcolor=self.colors['primary'])
+        self.search_listbox.grid(row=2, column=1, sticky=(tk.W, tk.E))
+        self.search_listbox.grid_remove()
+        
+        self.search_var.trace_add('write', lambda *args: self.on_search_changed())
+        self.search_entry.bind("<Down>", lambda e: self._focus_search_results())
+        self.search_entry.bind("<Return>", lambda e: self.jump_to_search_result(0))
+        self.search_entry.bind("<Escape>", lambda e: self.search_var.set(""))
+        self.search_listbox.bind("<Return>", lambda e: self.jump_to_search_result())
+        self.search_listbox.bind("<Double-Button-1>", lambda e: self.jump_to_search_result())
+        self.search_listbox.bind("<Escape>", lambda e: self.search_var.set(""))
+        
+        self.testbench_index = None
+        self.pending_testbench = None
+        
+        dir_frame.columnconfigure(1, weight=1)
+    
+    def _setup_file_frame(self, parent):
+        """ファイル選択フレームを設定"""
+        file_frame = ttk.LabelFrame(parent, text="📝 Verilogファイル選択", padding="10")
+        file_frame.grid(row=1, column=0, columnspan=2, sticky=(tk.W, tk.E, tk.N, tk.S), pady=(0, 10))
+        
+        # パネル分割器を作成
+        paned = ttk.PanedWindow(file_frame, orient=tk.HORIZONTAL)
+        paned.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
+        
+        # 左側: フォルダーツリー
+        tree_frame = ttk.Frame(paned)
+        paned.add(tree_frame, weight=1)
+        
+        ttk.Label(tree_frame, text="📁 フォルダー", font=('', 11, 'bold')).pack(anchor=tk.W, pady=(0, 5))
+        
+        tree_scroll_frame = ttk.Frame(tree_frame)
+        tree_scroll_frame.pack(fill=tk.BOTH, expand=True)
+        
+        self.folder_tree = ttk.Treeview(tree_scroll_frame, selectmode="browse")
+        tree_scrollbar = ttk.Scrollbar(tree_scroll_frame, orient="vertical", command=self.folder_tree.yview)
+        self.folder_tree.configure(yscrollcommand=tree_scrollbar.set)
+        
+        self.folder_tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        tree_scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.folder_tree.bind("<<TreeviewSelect>>", self.on_folder_select)
+        
+        # 中央: テストベンチファイルリスト
+        tb_list_frame = ttk.Frame(paned)
+        paned.add(tb_list_frame, weight=1)
+        
+        ttk.Label(tb_list_frame, text="🧪 テストベンチ (*_tb.v)", font=('', 11, 'bold')).pack(anchor=tk.W, pady=(0, 5))
+        
+        tb_scroll_frame = ttk.Frame(tb_list_frame)
+        tb_scroll_frame.pack(fill=tk.BOTH, expand=True)
+        
+        self.tb_listbox = tk.Listbox(tb_scroll_frame, height=10, selectmode=tk.SINGLE, 
+                                      bg='#f0f8ff', font=('', 10), relief=tk.FLAT, 
+                                      borderwidth=1, highlightthickness=1, highlightcolor=self.colors['primary'])
+        tb_scrollbar = ttk.Scrollbar(tb_scroll_frame, orient="vertical", command=self.tb_listbox.yview)
+        self.tb_listbox.configure(yscrollcommand=tb_scrollbar.set)
+        
+        self.tb_listbox.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        tb_scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.tb_listbox.bind("<<ListboxSelect>>", self.on_testbench_select)
+        
+        # 右側: 依存ファイルリスト
+        dep_list_frame = ttk.Frame(paned)
+        paned.add(dep_list_frame, weight=1)
+        
+        dep_header = ttk.Frame(dep_list_frame)
+        dep_header.pack(fill=tk.X, pady=(0, 5))
+        ttk.Label(dep_header, text="📄 依存ファイル", font=('', 11, 'bold')).pack(side=tk.LEFT)
+        ttk.Button(dep_header, text="すべて選択", command=self.select_all_deps, width=12).pack(side=tk.RIGHT, padx=(5, 0))
+        ttk.Button(dep_header, text="すべて解除", command=self.deselect_all_deps, width=12).pack(side=tk.RIGHT)
+        
+        # Checkbuttonを使ったリスト
+        dep_canvas_frame = ttk.Frame(dep_list_frame)
+        dep_canvas_frame.pack(fill=tk.BOTH, expand=True)
+        
+        self.dep_canvas = tk.Canvas(dep_canvas_frame, bg='white', highlightthickness=1, 
+                                    highlightbackground=self.colors['border'])
+        dep_scrollbar = ttk.Scrollbar(dep_canvas_frame, orient="vertical", command=self.dep_canvas.yview)
+        self.dep_checkbutton_frame = ttk.Frame(self.dep_canvas)
+        
+        self.dep_checkbutton_frame.bind(
+            "<Configure>",
+            lambda e: self.dep_canvas.configure(scrollregion=self.dep_canvas.bbox("all"))
+        )
+        
+        self.dep_canvas.create_window((0, 0), window=self.dep_checkbutton_frame, anchor="nw")
+        self.dep_canvas.configure(yscrollcommand=dep_scrollbar.set)
+        
+        self.dep_canvas.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        dep_scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        
+        self.dep_vars = []
+        self.dep_files = []
+        
+        file_frame.columnconfigure(0, weight=1)
+        file_frame.rowconfigure(0, weight=1)
+    
+    def _setup_button_frame(self, parent):
+        """ボタンフレームを設定"""
+        button_frame = ttk.Frame(parent)
+        button_frame.grid(row=2, column=0, columnspan=2, pady=(0, 10))
+        
+        # 左側のオプション
+        left_options = ttk.Frame(button_frame)
+        left_options.pack(side=tk.LEFT, fill=tk.X, expand=True)
+        
+        self.gtkwave_var = tk.BooleanVar(value=True)
+        self.gtkwave_checkbox = ttk.Checkbutton(
+            left_options, 
+            text="📊 GTKWaveで波形表示", 
+            variable=self.gtkwave_var
+        )
+        self.gtkwave_checkbox.pack(side=tk.LEFT, padx=(0, 20))
+        
+        self.auto_detect_var = tk.BooleanVar(value=True)
+        self.auto_detect_checkbox = ttk.Checkbutton(
+            left_options,
+            text="🔍 依存ファイル自動検出",
+            variable=self.auto_detect_var,
+            command=self.on_auto_detect_toggle
+        )
+        self.auto_detect_checkbox.pack(side=tk.LEFT, padx=(0, 20))
+        
+        # 分散実行先ワーカー（空欄ならローカル実行）
+        ttk.Label(left_options, text="🌐 ワーカー:").pack(side=tk.LEFT, padx=(0, 5))
+        self.workers_var = tk.StringVar()
+        ttk.Entry(left_options, textvariable=self.workers_var, width=24).pack(side=tk.LEFT, padx=(0, 20))
+        
+        # シードのファンアウト実行（空欄なら通常の1回実行）
+        ttk.Label(left_options, text="🎲 シード:").pack(side=tk.LEFT, padx=(0, 5))
+        self.seeds_var = tk.StringVar()
+        ttk.Entry(left_options, textvariable=self.seeds_var, width=12).pack(side=tk.LEFT)
+        
+        # 右側のボタン
+        right_buttons = ttk.Frame(button_frame)
+        right_buttons.pack(side=tk.RIGHT)
+        
+        self.run_button = ttk.Button(right_buttons, text="▶️ コンパイル & 実行", 
+                                      command=self.run_verilog)
+        self.run_button.pack(side=tk.LEFT, padx=(0, 10))
+        
+        self.preview_button = ttk.Button(right_buttons, text="👁️ 波形プレビュー", 
+                                          command=self.open_waveform_preview)
+        self.preview_button.pack(side=tk.LEFT, padx=(0, 10))
+        
+        ttk.Button(right_buttons, text="🩺 診断", 
+                   command=lambda: DiagnosticsPanel(self.root, self.diagnostics)).pack(side=tk.LEFT, padx=(0, 10))
+        
+        self.clear_button = ttk.Button(right_buttons, text="🗑️ ログクリア", 
+                                        command=self.clear_log)
+        self.clear_button.pack(side=tk.LEFT)
+    
+    def _setup_option_frame(self, parent):
+        """実行オプションフレームを設定"""
+        option_frame = ttk.LabelFrame(parent, text="⚙️ オプション", padding="10")
+        option_frame.grid(row=3, column=0, columnspan=2, sticky=(tk.W, tk.E), pady=(0, 10))
+        
+        # 波形ダンプ範囲（テストベンチを編集せずに制限する）
+        dump_row = ttk.Frame(option_frame)
+        dump_row.pack(fill=tk.X)
+        
+        self.dump_limit_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(dump_row, text="📉 ダンプ範囲を制限", variable=self.dump_limit_var).pack(side=tk.LEFT, padx=(0, 10))
+        
+        self.dump_scope_var = tk.StringVar()
+        self.dump_depth_var = tk.StringVar(value="0")
+        self.dump_start_var = tk.StringVar()
+        self.dump_stop_var = tk.StringVar()
+        for label, var, width in (("スコープ:", self.dump_scope_var, 24), ("深さ:", self.dump_depth_var, 4),
+                                  ("開始:", self.dump_start_var, 10), ("終了:", self.dump_stop_var, 10)):
+            ttk.Label(dump_row, text=label).pack(side=tk.LEFT, padx=(10, 5))
+            ttk.Entry(dump_row, textvariable=var, width=width).pack(side=tk.LEFT)
+        
+        self.viewer_status_var = tk.StringVar()
+        ttk.Label(dump_row, textvariable=self.viewer_status_var).pack(side=tk.RIGHT)
+        
+        # シミュレーターのバックエンド（テストベンチごとに記録）
+        backend_row = ttk.Frame(option_frame)
+        backend_row.pack(fill=tk.X, pady=(8, 0))
+        
+        ttk.Label(backend_row, text="🧰 シミュレーター:").pack(side=tk.LEFT, padx=(0, 5))
+        self.backend_var = tk.StringVar(value=DEFAULT_BACKEND)
+        backend_combo = ttk.Combobox(backend_row, textvariable=self.backend_var, width=12,
+                                     values=list(SIMULATOR_BACKENDS), state="readonly")
+        backend_combo.pack(side=tk.LEFT)
+        backend_combo.bind('<<ComboboxSelected>>', self.on_backend_select)
+        
+        ttk.Label(backend_row, text="スレッド:").pack(side=tk.LEFT, padx=(10, 5))
+        self.threads_var = tk.StringVar()
+        ttk.Entry(backend_row, textvariable=self.threads_var, width=4).pack(side=tk.LEFT)
+        
+        self.compare_button = ttk.Button(backend_row, text="⚖️ A/B比較", 
+                                         command=self.run_backend_comparison)
+        self.compare_button.pack(side=tk.LEFT, padx=(10, 0))
+        
+        # git ref 以降の変更の影響を受けるテストベンチだけを実行
+        ttk.Label(backend_row, text="🔀 変更基準 (git ref):").pack(side=tk.LEFT, padx=(20, 5))
+        self.changed_since_var = tk.StringVar(value="HEAD")
+        ttk.Entry(backend_row, textvariable=self.changed_since_var, width=14).pack(side=tk.LEFT)
+        self.changed_button = ttk.Button(backend_row, text="▶️ 変更分を実行", 
+                                         command=self.run_changed_testbenches)
+        self.changed_button.pack(side=tk.LEFT, padx=(10, 0))
+        
+        # 成果物の保持ルール（容量上限・テストベンチごとの保持数・古い波形の圧縮）
+        artifact_row = ttk.Frame(option_frame)
+        artifact_row.pack(fill=tk.X, pady=(8, 0))
+        
+        settings = self.artifact_store.settings
+        self.quota_var = tk.StringVar(value=format_size(settings['quota']).replace(' ', '') if settings['quota'] else '')
+        self.keep_last_var = tk.StringVar(value=str(settings['keep_last'] or ''))
+        self.compress_after_var = tk.StringVar(
+            value=f"{settings['compress_after'] / 3600:g}" if settings['compress_after'] else '')
+        for label, var, width in (("🗄️ 容量上限:", self.quota_var, 8), ("保持数:", self.keep_last_var, 4),
+                                  ("圧縮 (時間後):", self.compress_after_var, 5)):
+            ttk.Label(artifact_row, text=label).pack(side=tk.LEFT, padx=(0 if var is self.quota_var else 10, 5))
+            ttk.Entry(artifact_row, textvariable=var, width=width).pack(side=tk.LEFT)
+        ttk.Button(artifact_row, text="🧹 適用して整理", 
+                   command=self.apply_artifact_settings).pack(side=tk.LEFT, padx=(10, 0))
+        
+        self.artifact_usage_var = tk.StringVar(value=self.artifact_store.describe_usage())
+        ttk.Label(artifact_row, textvariable=self.artifact_usage_var).pack(side=tk.RIGHT)
+        
+        # ゴールデン波形との比較（テストベンチのディレクトリの golden/ に保存）
+        golden_row = ttk.Frame(option_frame)
+        golden_row.pack(fill=tk.X, pady=(8, 0))
+        
+        self.golden_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(golden_row, text="🏅 ゴールデン波形と比較", variable=self.golden_var).pack(side=tk.LEFT, padx=(0, 10))
+        
+        self.golden_tolerance_var = tk.StringVar()
+        self.golden_ignore_var = tk.StringVar()
+        self.golden_map_var = tk.StringVar()
+        for label, var, width in (("許容誤差:", self.golden_tolerance_var, 8), ("除外:", self.golden_ignore_var, 20),
+                                  ("信号名の対応:", self.golden_map_var, 24)):
+            ttk.Label(golden_row, text=label).pack(side=tk.LEFT, padx=(10, 5))
+            ttk.Entry(golden_row, textvariable=var, width=width).pack(side=tk.LEFT)
+        ttk.Button(golden_row, text="📌 ゴールデンに登録", 
+                   command=self.register_golden).pack(side=tk.LEFT, padx=(10, 0))
+    
+    def set_run_buttons_state(self, state):
+        """実行を開始するボタンをまとめて有効・無効にする（実行中の状態を共有するため同時実行させない）"""
+        for button in (self.run_button, self.compare_button, self.changed_button):
+            button.config(state=state)
+    
+    def get_golden(self, update=False):
+        """GUIの入力からゴールデン波形の比較設定を作成（無効ならNone）"""
+        if not self.golden_var.get() and not update:
+            return None
+        golden = WaveformComparison.from_options(mapping=[self.golden_map_var.get()],
+                                                 ignore=[self.golden_ignore_var.get()],
+                                                 tolerance=self.golden_tolerance_var.get().strip() or None)
+        golden.update = update
+        return golden
+    
+    def register_golden(self):
+        """選択中のテストベンチの現在の波形をゴールデン波形として保存"""
+        tb_file = self.get_selected_files()[0]
+        if not tb_file:
+            messagebox.showwarning("警告", "テストベンチファイルを選択してください。")
+            return
+        try:
+            golden = self.get_golden(update=True)
+        except ValueError as e:
+            messagebox.showwarning("警告", f"ゴールデン比較の指定が不正です: {e}")
+            return
+        name = tb_file.replace('_tb.v', '')
+        golden.run(self, IcarusBackend().waveform_path(name, tb_file, self.selected_directory))
+    
+    def get_dump_control(self):
+        """GUIの入力からダンプ範囲指定を作成（無効ならNone）"""
+        if not self.dump_limit_var.get():
+            return None
+        return DumpControl.from_options(self.dump_scope_var.get(), self.dump_depth_var.get() or 0,
+                                        self.dump_start_var.get().strip(), self.dump_stop_var.get().strip())
+    
+    def get_threads(self):
+        """GUIの入力からVerilatorのスレッド数を取得（空欄ならNone）"""
+        text = self.threads_var.get().strip()
+        if not text:
+            return None
+        threads = int(text)
+        if threads < 1:
+            raise ValueError(text)
+        return threads
+    
+    def on_backend_select(self, event=None):
+        """選択中のテストベンチにバックエンドの選択を記録"""
+        tb_file = self.get_selected_files()[0]
+        if tb_file:
+            self.history.update(os.path.join(self.selected_directory, tb_file), backend=self.backend_var.get())
+    
+    def run_backend_comparison(self):
+        """選択中のテストベンチを各バックエンドで実行して比較"""
+        file_info = self.get_selected_files()
+        if not file_info or not file_info[0]:
+            messagebox.showwarning("警告", "テストベンチファイルを選択してください。")
+            return
+        try:
+            threads = self.get_threads()
+        except ValueError:
+            messagebox.showwarning("警告", "スレッド数には1以上の整数を指定してください。")
+            return
+        
+        tb_file, dep_files, directory = file_info
+        name = tb_file.replace('_tb.v', '')
+        self.dump_control = None
+        self.golden = None
+        self.set_run_buttons_state("disabled")
+        
+        def compare():
+            try:
+                self.compare_backends(name, tb_file, dep_files, directory, threads)
+            except Exception as e:
+                self.log_output(f"❌ 予期しないエラー: {e}\n", 'error')
+            finally:
+                self.root.after(0, lambda: self.set_run_buttons_state("normal"))
+        
+        threading.Thread(target=compare, daemon=True).start()
+    
+    def apply_artifact_settings(self):
+        """成果物の保持ルールを保存し、すぐに整理を実行"""
+        try:
+            quota = parse_size(self.quota_var.get()) if self.quota_var.get().strip() else None
+            keep_last = int(self.keep_last_var.get()) if self.keep_last_var.get().strip() else None
+            hours = float(self.compress_after_var.get()) if self.compress_after_var.get().strip() else None
+        except ValueError as e:
+            messagebox.showwarning("警告", f"保持ルールの指定が不正です: {e}")
+            return
+        self.artifact_store.configure(quota=quota or None, keep_last=keep_last or None,
+                                      compress_after=hours * 3600 if hours else None)
+        evicted = self.artifact_store.enforce()
+        self.artifact_store.compress_in_background()
+        self.log_output(f"🧹 成果物を整理しました（削除 {len(evicted)} 件）\n", 'info')
+        self.artifact_usage_var.set(self.artifact_store.describe_usage())
+    
+    def run_changed_testbenches(self):
+        """変更の影響を受けるテストベンチをフォルダー以下から選んで順に実行"""
+        ref = self.changed_since_var.get().strip()
+        if not ref:
+            messagebox.showwarning("警告", "比較する git ref を入力してください。")
+            return
+        try:
+            dump_control = self.get_dump_control()
+            golden = self.get_golden()
+            threads = self.get_threads()
+        except ValueError as e:
+            messagebox.showwarning("警告", f"オプションの指定が不正です: {e}")
+            return
+        
+        directory = self.selected_directory
+        self.set_run_buttons_state("disabled")
+        
+        def run_changed():
+            try:
+                self.dump_control = dump_control
+                self.golden = golden
+                try:
+                    tb_paths = select_changed_testbenches(self, collect_testbenches([directory]), ref, directory)
+                except RuntimeError as e:
+                    self.log_output(f"❌ 変更ファイルを取得できません: {e}\n", 'error')
+                    return
+                jobs = []
+                for tb_path in tb_paths:
+                    tb_dir, tb_file = os.path.split(tb_path)
+                    job = SimulationJob(tb_file, sorted(self.find_dependencies(tb_file, tb_dir)), tb_dir)
+                    job.backend = testbench_backend(tb_path, history=self.history)
+                    job.threads = threads
+                    jobs.append(job)
+                if not jobs:
+                    self.log_output("変更の影響を受けるテストベンチはありません。\n", 'info')
+                    return
+                
+                jobs = estimate_job_durations(jobs, self.history)
+                progress = ScheduleProgress(jobs, self.log_output, history=self.history)
+                progress.report_plan()
+                for job in jobs:
+                    progress.start(job)
+                    self.run_job(job)
+                    progress.finish(job)
+                print_job_summary(jobs, self.log_output)
+            except Exception as e:
+                self.log_output(f"❌ 予期しないエラー: {e}\n", 'error')
+            finally:
+                self.root.after(0, lambda: self.set_run_buttons_state("normal"))
+        
+        threading.Thread(target=run_changed, daemon=True).start()
+    
+    def _setup_output_frame(self, parent):
+        """出力フレームを設定"""
+        output_frame = ttk.LabelFrame(parent, text="📋 実行結果", padding="10")
+        output_frame.grid(row=4, column=0, columnspan=2, sticky=(tk.W, tk.E, tk.N, tk.S))
+        
+        self.output_text = scrolledtext.ScrolledText(
+            output_frame, height=18, width=100, 
+            font=('Menlo', 10), bg='#1e1e1e', fg='#d4d4d4',
+            insertbackground='white', relief=tk.FLAT, padx=10, pady=10
+        )
+        self.output_text.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
+        
+        # カラータグを設定
+        self.output_text.tag_config('success', foreground='#4ade80')
+        self.output_text.tag_config('error', foreground='#f87171')
+        self.output_text.tag_config('warning', foreground='#fbbf24')
+        self.output_text.tag_config('info', foreground='#60a5fa')
+        self.output_text.tag_config('header', foreground='#a78bfa', font=('Menlo', 10, 'bold'))
+        
+        output_frame.columnconfigure(0, weight=1)
+        output_frame.rowconfigure(0, weight=1)
+    
+    def _configure_grid_weights(self, main_frame):
+        """グリッドの重み設定"""
+        self.root.columnconfigure(0, weight=1)
+        self.root.rowconfigure(0, weight=1)
+        main_frame.columnconfigure(0, weight=1)
+        main_frame.rowconfigure(1, weight=2)
+        main_frame.rowconfigure(4, weight=1)
+    
+    def browse_directory(self):
+        """ディレクトリ選択ダイアログ"""
+        directory = filedialog.askdirectory(initialdir=self.current_dir)
+        if directory:
+            self.current_dir = directory
+            self.dir_var.set(directory)
+            self.refresh_files()
+    
+    def refresh_files(self):
+        """フォルダーツリーとVerilogファイルリストを更新"""
+        try:
+            directory = self.dir_var.get()
+            if not os.path.exists(directory):
+                self.log_output("エラー: 指定されたディレクトリが存在しません。\n", 'error')
+                return
+            
+            os.chdir(directory)
+            self.current_dir = directory
+            
+            self.populate_folder_tree(directory)
+            self.update_file_list(directory)
+            self.build_testbench_index(directory)
+            
+            self.log_output(f"✓ ディレクトリを更新: {directory}\n\n", 'success')
+            
+        except Exception as e:
+            self.log_output(f"エラー: {e}\n", 'error')
+    
+    def build_testbench_index(self, root_dir):
+        """検索用のテストベンチ索引をバックグラウンドで作成"""
+        self.search_status_var.set("索引を作成中...")
+        
+        def build():
+            index = TestbenchIndex.build(root_dir)
+            self.root.after(0, lambda: self._set_testbench_index(index))
+        
+        threading.Thread(target=build, daemon=True).start()
+    
+    def _set_testbench_index(self, index):
+        if index.root_dir != self.current_dir:
+            return
+        self.testbench_index = index
+        self.search_status_var.set(f"{len(index.paths)} 件のテストベンチ")
+        if self.search_var.get().strip():
+            self.on_search_changed()
+    
+    def on_search_changed(self):
+        """入力のたびに索引から検索して候補を表示"""
+        query = self.search_var.get()
+        if not query.strip() or self.testbench_index is None:
+            self.search_listbox.grid_remove()
+            if self.testbench_index is not None:
+                self.search_status_var.set(f"{len(self.testbench_index.paths)} 件のテストベンチ")
+            return
+        
+        start = time.perf_counter()
+        results = self.testbench_index.search(query)
+        elapsed = (time.perf_counter() - start) * 1000
+        
+        self.search_listbox.delete(0, tk.END)
+        for path in results:
+            self.search_listbox.insert(tk.END, f"🧪 {path}")
+        self.search_listbox.grid()
+        self.search_status_var.set(f"{len(results)} 件 ({elapsed:.1f} ms)")
+    
+    def _focus_search_results(self):
+        if self.search_listbox.size():
+            self.search_listbox.focus_set()
+            self.search_listbox.selection_clear(0, tk.END)
+            self.search_listbox.selection_set(0)
+            self.search_listbox.activate(0)
+    
+    def jump_to_search_result(self, position=None):
+        """検索結果のテストベンチのフォルダーへ移動し、依存ファイルを解決して選択"""
+        if position is None:
+            selection = self.search_listbox.curselection()
+            position = selection[0] if selection else 0
+        if position >= self.search_listbox.size():
+            return
+        
+        rel_path = self.search_listbox.get(position).replace('🧪 ', '', 1)
+        directory, tb_file = os.path.split(os.path.join(self.testbench_index.root_dir, rel_path))
+        self.search_var.set("")
+        
+        self.pending_testbench = tb_file
+        item = self._find_tree_item(directory)
+        if item is None or self.folder_tree.selection() == (item,):
+            self.update_file_list(directory)
+        else:
+            # 選択イベント経由で update_file_list が呼ばれる
+            self.folder_tree.selection_set(item)
+            self.folder_tree.see(item)
+    
+    def _find_tree_item(self, directory, parent=""):
+        """フォルダーツリーから指定ディレクトリの項目を探す"""
+        target = os.path.normpath(directory)
+        for item in self.folder_tree.get_children(parent):
+            item_path = os.path.normpath(self.folder_tree.item(item, "values")[0])
+            if item_path == target:
+                return item
+            if target.startswith(item_path.rstrip(os.sep) + os.sep):
+                return self._find_tree_item(directory, item)
+        return None
+    
+    def populate_folder_tree(self, root_dir):
+        """フォルダーツリーを構築"""
+        for item in self.folder_tree.get_children():
+            self.folder_tree.delete(item)
+        
+        root_name = os.path.basename(root_dir) or root_dir
+        root_item = self.folder_tree.insert("", "end", text=f"📁 {root_name}", values=[root_dir], open=True)
+        
+        self.add_directories_to_tree(root_item, root_dir)
+    
+    def add_directories_to_tree(self, parent_item, parent_dir):
+        """ツリーにディレクトリを再帰的に追加"""
+        try:
+            items = []
+            for item in os.listdir(parent_dir):
+                item_path = os.path.join(parent_dir, item)
+                if os.path.isdir(item_path) and not item.startswith('.'):
+                    if self.has_verilog_files(item_path):
+                        items.append((item, item_path))
+            
+            for item_name, item_path in sorted(items):
+                child_item = self.folder_tree.insert(parent_item, "end", text=f"📁 {item_name}", values=[item_path])
+                self.add_directories_to_tree(child_item, item_path)
+                
+        except PermissionError:
+            pass
+    
+    def has_verilog_files(self, directory):
+        """ディレクトリ内にVerilogファイルがあるかチェック"""
+        try:
+            verilog_files = glob.glob(os.path.join(directory, "*.v"))
+            if verilog_files:
+                return True
+            
+            for item in os.listdir(directory):
+                item_path = os.path.join(directory, item)
+                if os.path.isdir(item_path) and not item.startswith('.'):
+                    if self.has_verilog_files(item_path):
+                        return True
+            return False
+        except (PermissionError, OSError):
+            return False
+    
+    def on_folder_select(self, event):
+        """フォルダー選択時のイベントハンドラ"""
+        selection = self.folder_tree.selection()
+        if selection:
+            item = selection[0]
+            folder_path = self.folder_tree.item(item, "values")[0]
+            self.update_file_list(folder_path)
+    
+    def update_file_list(self, directory):
+        """指定ディレクトリのテストベンチファイルリストを更新"""
+        try:
+            self.tb_listbox.delete(0, tk.END)
+            self.selected_directory = directory
+            
+            # テストベンチファイルを検索
+            pattern = os.path.join(directory, "*_tb.v")
+            tb_files = glob.glob(pattern)
+            
+            for file_path in sorted(tb_files):
+                file_name = os.path.basename(file_path)
+                display_text = f"🧪 {file_name}"
+                self.tb_listbox.insert(tk.END, display_text)
+            self.dependency_cache.prefetch(self.dependency_pool, sorted(tb_files))
+            
+            # 依存ファイルリストをクリア
+            self.clear_dependency_list()
+            
+            # 検索から移動してきた場合はテストベンチを選択して依存ファイルを表示
+            if self.pending_testbench:
+                names = [os.path.basename(p) for p in sorted(tb_files)]
+                if self.pending_testbench in names:
+                    position = names.index(self.pending_testbench)
+                    self.tb_listbox.selection_set(position)
+                    self.tb_listbox.see(position)
+                    self.on_testbench_select(None)
+                self.pending_testbench = None
+            
+        except Exception as e:
+            self.log_output(f"ファイルリスト更新エラー: {e}\n", 'error')
+    
+    def on_testbench_select(self, event):
+        """テストベンチ選択時のイベントハンドラ"""
+        selection = self.tb_listbox.curselection()
+        if not selection:
+            return
+        
+        selected_text = self.tb_listbox.get(selection[0])
+        tb_file = selected_text.replace('🧪 ', '')
+        self.backend_var.set(testbench_backend(os.path.join(self.selected_directory, tb_file), history=self.history))
         
-        # カスタムカラー
-        self.colors = {
-            'primary': '#2563eb',
-            'success': '#10b981',
-            'warning': '#f59e0b',
-            'danger': '#ef4444',
-            'bg_light': '#f8fafc',
-            'border': '#e2e8f0'
-        }
+        if self.auto_detect_var.get():
+            self.detect_dependencies(tb_file)
+        else:
+            self.update_dependency_list(tb_file)
+    
+    def module_references(self, file_path, directory):
+        """インスタンス化しているモジュール（解析結果はテストベンチ間で共有）"""
+        return self.dependency_cache.module_references(file_path, directory, super().module_references)
+    
+    def detect_dependencies(self, tb_file):
+        """テストベンチファイルから依存ファイルを自動検出（先読み済みならキャッシュから）"""
+        try:
+            dependencies = self.dependency_cache.resolve(tb_file, self.selected_directory)
+            self.update_dependency_list(tb_file, list(dependencies))
+            
+        except Exception as e:
+            self.log_output(f"依存ファイル検出エラー: {e}\n", 'error')
+            self.update_dependency_list(tb_file)
+    
+    def update_dependency_list(self, tb_file, auto_detected=None):
+        """依存ファイルリストを更新"""
+        self.clear_dependency_list()
         
-        # 現在のディレクトリ
-        self.current_dir = os.getcwd()
-        self.selected_directory = self.current_dir
+        # 全てのVerilogファイルを取得（テストベンチを除く）
+        pattern = os.path.join(self.selected_directory, "*.v")
+        all_files = [os.path.basename(f) for f in glob.glob(pattern) 
+                     if not f.endswith('_tb.v')]
+        
+        for file_name in sorted(all_files):
+            var = tk.BooleanVar()
+            
+            # 自動検出されたファイルはチェック
+            if auto_detected and file_name in auto_detected:
+                var.set(True)
+            
+            cb = ttk.Checkbutton(
+                self.dep_checkbutton_frame,
+                text=self.dependency_label(file_name),
+                variable=var,
+                onvalue=True,
+                offvalue=False
+            )
+            cb.pack(anchor=tk.W, padx=5, pady=2)
+            
+            self.dep_vars.append(var)
+            self.dep_files.append(file_name)
+            self.dep_checkbuttons[file_name] = cb
+    
+    def dependency_label(self, file_name):
+        """依存ファイルリストの表示名（構文エラーがあれば最初のエラーを併記）"""
+        errors = self.syntax_checker.errors(os.path.join(self.selected_directory, file_name))
+        if errors:
+            line, message = errors[0]
+            return f"  ❌ {file_name}  ({line}: {message})"
+        return f"  📄 {file_name}"
+    
+    def poll_syntax(self):
+        """選択中のフォルダーの変更を定期的に検出して構文チェックを投入"""
+        self.syntax_checker.scan(os.path.abspath(self.selected_directory))
+        self.root.after(500, self.poll_syntax)
+    
+    def on_syntax_result(self, path, errors, previous):
+        """構文チェック結果が変わったらメインスレッドで反映（バックグラウンドスレッドから呼ばれる）"""
+        self.root.after(0, lambda: self.show_syntax_result(path, errors, previous))
+    
+    def show_syntax_result(self, path, errors, previous):
+        """依存ファイルリストのマーカーを更新し、エラーの発生・解消をログに出力"""
+        file_name = os.path.basename(path)
+        if errors:
+            for line, message in errors:
+                self.log_output(f"❌ 構文エラー: {file_name}:{line}: {message}\n", 'error')
+        elif previous:
+            self.log_output(f"✓ 構文エラー解消: {file_name}\n", 'success')
+        cb = self.dep_checkbuttons.get(file_name)
+        if cb is not None and os.path.dirname(path) == os.path.abspath(self.selected_directory):
+            cb.config(text=self.dependency_label(file_name))
+    
+    def clear_dependency_list(self):
+        """依存ファイルリストをクリア"""
+        for widget in self.dep_checkbutton_frame.winfo_children():
+            widget.destroy()
+        self.dep_vars.clear()
+        self.dep_files.clear()
+        self.dep_checkbuttons.clear()
+    
+    def select_all_deps(self):
+        """すべての依存ファイルを選択"""
+        for var in self.dep_vars:
+            var.set(True)
+    
+    def deselect_all_deps(self):
+        """すべての依存ファイルを解除"""
+        for var in self.dep_vars:
+            var.set(False)
+    
+    def on_auto_detect_toggle(self):
+        """自動検出トグル時の処理"""
+        selection = self.tb_listbox.curselection()
+        if selection:
+            self.on_testbench_select(None)
+    
+    def get_selected_files(self):
+        """選択されたテストベンチと依存ファイルを取得"""
+        tb_selection = self.tb_listbox.curselection()
+        if not tb_selection:
+            return None, None, None
+        
+        selected_text = self.tb_listbox.get(tb_selection[0])
+        tb_file = selected_text.replace('🧪 ', '')
+        
+        # 選択された依存ファイルを取得
+        dep_files = [self.dep_files[i] for i, var in enumerate(self.dep_vars) if var.get()]
+        
+        return tb_file, dep_files, self.selected_directory
+    
+    def run_gtkwave(self, name, directory, layout_name=None):
+        """gtkwaveで波形を表示（テストベンチごとの .gtkw レイアウトがあれば復元）"""
+        # 成果物の整理で実行ごとのファイル名に変更・圧縮された波形を含めて最新のものを開く
+        vcd_file = self.artifact_store.latest(os.path.join(directory, f"{name}.vcd"))
+        if vcd_file is None:
+            self.log_output(f"⚠️  警告: VCDファイル '{name}.vcd' が見つかりません。\n", 'warning')
+            return False
+        vcd_name = os.path.relpath(vcd_file, directory)
+        
+        self.artifact_store.touch(vcd_file)
+        try:
+            return self.gtkwave_sessions.open(vcd_name, directory, f"{layout_name or name}.gtkw")
+        except FileNotFoundError:
+            self.log_output("❌ エラー: gtkwaveが見つかりません。\n", 'error')
+            return False
+        except OSError as e:
+            self.log_output(f"GTKWave起動エラー: {e}\n", 'error')
+            return False
+    
+    def open_waveform_preview(self):
+        """選択中のテストベンチのVCDを内蔵プレビューで表示"""
+        tb_file = self.get_selected_files()[0]
+        if not tb_file:
+            messagebox.showwarning("警告", "テストベンチファイルを選択してください。")
+            return
+        
+        name = tb_file.replace('_tb.v', '')
+        vcd_file = self.artifact_store.latest(os.path.join(self.selected_directory, f"{name}.vcd"))
+        if vcd_file is None or vcd_file.endswith('.gz'):
+            self.log_output(f"⚠️  警告: VCDファイル '{name}.vcd' が見つかりません。\n", 'warning')
+            return
+        self.artifact_store.touch(vcd_file)
+        WaveformPreview(self.root, vcd_file)
+    
+    def poll_viewers(self):
+        """終了したGTKWaveを定期的に回収し、起動数とメモリ使用量を表示"""
+        self.gtkwave_sessions.reap()
+        count, rss = self.gtkwave_sessions.stats()
+        self.viewer_status_var.set(f"📈 GTKWave: {count} 件起動中" + (f" / {format_size(rss)}" if count else ""))
+        self.artifact_usage_var.set(self.artifact_store.describe_usage())
+        self.root.after(2000, self.poll_viewers)
+    
+    def log_output(self, text, tag=None):
+        """出力エリアにテキストを追加"""
+        self.output_text.insert(tk.END, text, tag)
+        self.output_text.see(tk.END)
+        self.root.update_idletasks()
+    
+    def clear_log(self):
+        """ログをクリア"""
+        self.output_text.delete(1.0, tk.END)
+    
+    def run_verilog_thread(self, tb_file, dep_files, directory):
+        """Verilogコンパイル・実行をバックグラウンドで実行"""
+        try:
+            # 実行ファイル名（.vを除く）
+            name = tb_file.replace('_tb.v', '')
+            
+            self.log_output(f"\n{'='*60}\n", 'header')
+            self.log_output(f"🚀 {name} の実行を開始\n", 'header')
+            self.log_output(f"{'='*60}\n\n", 'header')
+            self.log_output(f"📂 作業ディレクトリ: {directory}\n", 'info')
+            self.log_output(f"🧪 テストベンチ: {tb_file}\n", 'info')
+            self.log_output(f"📄 依存ファイル: {', '.join(dep_files) if dep_files else 'なし'}\n\n", 'info')
+            
+            try:
+                self.dump_control = self.get_dump_control()
+                self.golden = self.get_golden()
+            except ValueError as e:
+                self.log_output(f"❌ オプションの指定が不正です: {e}\n", 'error')
+                return
+            try:
+                threads = self.get_threads()
+            except ValueError:
+                self.log_output(f"❌ スレッド数の指定が不正です: {self.threads_var.get()}\n", 'error')
+                return
+            backend = create_backend(self.backend_var.get(), threads)
+            self.log_output(f"🧰 シミュレーター: {backend.label}\n", 'info')
+            
+            workers = self.workers_var.get().strip()
+            seeds = self.seeds_var.get().strip()
+            if seeds:
+                if backend.name != 'icarus':
+                    self.log_output("⚠️  シードのファンアウト実行はIcarus Verilogで行います。\n", 'warning')
+                self.run_seed_fanout(name, tb_file, dep_files, directory, seeds)
+            elif workers:
+                self.run_distributed(name, tb_file, dep_files, directory, workers, backend)
+            else:
+                if (backend.compile(self, name, tb_file, dep_files, directory) and 
+                    backend.simulate(self, name, directory)):
+                    
+                    self.report_dump_stats(name, tb_file, directory)
+                    self.compare_golden(name, tb_file, directory, backend)
+                    self.store_artifacts(tb_file, directory, [backend.waveform_path(name, tb_file, directory)])
+                    if self.gtkwave_var.get():
+                        self.run_gtkwave(name, directory)
+                
+                backend.cleanup(self, name, directory)
+            
+            self.log_output(f"\n{'='*60}\n", 'header')
+            self.log_output(f"✅ {name} の実行完了\n", 'success')
+            self.log_output(f"{'='*60}\n\n", 'header')
+            
+        except Exception as e:
+            self.log_output(f"❌ 予期しないエラー: {e}\n", 'error')
+        finally:
+            self.root.after(0, lambda: self.set_run_buttons_state("normal"))
+    
+    def run_seed_fanout(self, name, tb_file, dep_files, directory, seeds):
+        """シード範囲でファンアウト実行し、失敗したシードの波形を表示"""
+        try:
+            runs = build_fanout_runs(parse_seed_range(seeds))
+        except ValueError as e:
+            self.log_output(f"❌ {e}\n", 'error')
+            return
+        
+        results = self.run_fanout(name, tb_file, dep_files, directory, runs)
+        if not results or not self.gtkwave_var.get():
+            return
+        
+        # 失敗があれば最初の失敗シード、なければ先頭の波形を開く
+        failed = [r for r in results if not r.passed]
+        target = (failed or results)[0]
+        if target.waveform and target.waveform.endswith('.vcd'):
+            self.run_gtkwave(f"{name}_{target.label}", directory, layout_name=name)
+    
+    def run_distributed(self, name, tb_file, dep_files, directory, workers, backend):
+        """ワーカーにジョブを送って実行し、必要に応じて波形を取得して表示"""
+        coordinator = JobCoordinator(parse_worker_list(workers), self.log_output,
+                                     dump_control=self.dump_control)
+        job = SimulationJob(tb_file, dep_files, directory)
+        job.backend = backend.name
+        job.threads = getattr(backend, 'threads', None)
+        coordinator.run([job])
+        
+        if job.status != 'passed':
+            self.log_output(f"❌ 分散実行に失敗しました ({job.status})\n", 'error')
+            return
+        
+        if self.gtkwave_var.get():
+            vcd_name = f"{name}.vcd"
+            if vcd_name not in job.artifacts:
+                self.log_output(f"⚠️  警告: VCDファイル '{vcd_name}' が生成されていません。\n", 'warning')
+                return
+            try:
+                self.store_artifacts(tb_file, directory, [coordinator.fetch_artifact(job, vcd_name, directory)])
+                self.run_gtkwave(name, directory)
+            except (WorkerLostError, WorkerRejectedError) as e:
+                self.log_output(f"⚠️  波形を取得できません: {e}\n", 'warning')
+    
+    def run_verilog(self):
+        """Verilogファイルを実行"""
+        file_info = self.get_selected_files()
+        if not file_info or not file_info[0]:
+            messagebox.showwarning("警告", "テストベンチファイルを選択してください。")
+            return
+        
+        tb_file, dep_files, directory = file_info
+        
+        if not dep_files:
+            response = messagebox.askyesno(
+                "確認", 
+                "依存ファイルが選択されていません。\nテストベンチファイルのみで実行しますか?"
+            )
+            if not response:
+                return
+        
+        self.set_run_buttons_state("disabled")
+        
+        thread = threading.Thread(
+            target=self.run_verilog_thread, 
+            args=(tb_file, dep_files, directory), 
+            daemon=True
+        )
+        thread.start()
+
+
+def process_rss(pid):
+    """プロセスの常駐メモリ量（バイト）を返す（取得できなければ0）"""
+    try:
+        with open(f"/proc/{pid}/status", 'r') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    try:
+        result = subprocess.run(["ps", "-o", "rss=", "-p", str(pid)], capture_output=True, text=True)
+        return int(result.stdout.strip() or 0) * 1024
+    except (OSError, ValueError):
+        return 0
+
+
+class GtkwaveSessionManager:
+    """波形ファイルごとにGTKWaveを管理（再実行時は再読み込み、終了済みは回収）"""
+    
+    def __init__(self, log_output):
+        self.log_output = log_output
+        self.sessions = {}
+        self.lock = threading.Lock()
+    
+    def open(self, waveform, directory, layout=None):
+        """波形を表示（同じ波形のGTKWaveが起動中なら再読み込み）"""
+        self.reap()
+        key = os.path.abspath(os.path.join(directory, waveform))
+        
+        with self.lock:
+            process = self.sessions.get(key)
+        if process is not None:
+            try:
+                # --wish で有効にしたTclコマンドラインから再読み込みを指示
+                process.stdin.write(b"gtkwave::reLoadFile\n")
+                process.stdin.flush()
+                self.log_output(f"🔄 GTKWaveで波形を再読み込みしました (PID: {process.pid})\n", 'success')
+                return True
+            except OSError:
+                self._discard(key)
+        
+        cmd = ["gtkwave", "--wish", waveform]
+        if layout and os.path.exists(os.path.join(directory, layout)):
+            cmd.append(layout)
+        self.log_output(f"📈 実行中: {' '.join(cmd)}\n", 'info')
+        
+        process = subprocess.Popen(
+            cmd,
+            cwd=directory,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL
+        )
+        with self.lock:
+            self.sessions[key] = process
+        self.log_output(f"✓ GTKWaveを起動しました (PID: {process.pid})\n", 'success')
+        return True
+    
+    def _discard(self, key):
+        with self.lock:
+            process = self.sessions.pop(key, None)
+        if process is not None:
+            if process.stdin:
+                try:
+                    process.stdin.close()
+                except OSError:
+                    pass
+            process.wait()
+    
+    def reap(self):
+        """終了したGTKWaveを回収し、回収した数を返す"""
+        with self.lock:
+            finished = [key for key, process in self.sessions.items() if process.poll() is not None]
+        for key in finished:
+            self._discard(key)
+        return len(finished)
+    
+    def stats(self):
+        """起動中のGTKWaveの数と合計メモリ使用量を返す"""
+        with self.lock:
+            pids = [process.pid for process in self.sessions.values()]
+        return len(pids), sum(process_rss(pid) for pid in pids)
+
+
+class SyntaxChecker:
+    """ファイル単位の構文チェック（iverilog -t null）をバックグラウンドで並列実行し、内容ハッシュでキャッシュ"""
+    
+    ERROR_LINE_PATTERN = re.compile(r'^(.+?):(\d+):\s*(.*)$', re.MULTILINE)
+    # 単独ファイルのチェックでは解決できない参照（構文エラーではない）
+    IGNORED_MESSAGES = ('Unknown module type', 'were missing', 'error(s) during elaboration')
+    
+    def __init__(self, on_result=None, max_workers=None, timeout=30):
+        # 各スレッドがiverilogを1プロセスずつ起動するので、同時プロセス数はmax_workersまで
+        self.pool = ThreadPoolExecutor(max_workers=max_workers or min(4, os.cpu_count() or 1))
+        self.on_result = on_result
+        # 1ファイルのチェックにかける時間の上限（秒、超えたら結果なしとして次の変更で再チェック）
+        self.timeout = timeout
+        # {パス: (内容ハッシュ, エラー)}（ファイルごとに最新のハッシュだけを持つ）
+        self.cache = {}
+        self.results = {}
+        self.mtimes = {}
+        self.pending = set()
+        self.lock = threading.Lock()
+    
+    def scan(self, directory):
+        """ディレクトリ内の変更を検出し、変更があれば .v ファイルを再チェック"""
+        mtimes = {}
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if entry.is_file() and entry.name.endswith(('.v', '.vh')):
+                        mtimes[entry.path] = entry.stat().st_mtime_ns
+        except OSError:
+            return 0
+        
+        with self.lock:
+            previous = {path: mtime for path, mtime in self.mtimes.items() if os.path.dirname(path) == directory}
+            if mtimes == previous:
+                return 0
+            for path in previous:
+                if path not in mtimes:
+                    self.mtimes.pop(path, None)
+                    self.results.pop(path, None)
+                    self.cache.pop(path, None)
+            self.mtimes.update(mtimes)
+        
+        # include先の変更も反映されるよう全ファイルを投入（内容が同じならキャッシュで即座に返る）
+        targets = [path for path in mtimes if path.endswith('.v')]
+        for path in targets:
+            self.submit(path)
+        return len(targets)
+    
+    def submit(self, path):
+        """ファイルのチェックを投入（同じファイルが待機中なら何もしない）"""
+        with self.lock:
+            if path in self.pending:
+                return
+            self.pending.add(path)
+        self.pool.submit(self._run, path)
+    
+    def errors(self, path):
+        """直近のチェック結果のエラー [(行番号, メッセージ)]"""
+        with self.lock:
+            return self.results.get(os.path.abspath(path), [])
+    
+    def _run(self, path):
+        with self.lock:
+            self.pending.discard(path)
+        try:
+            errors = self.check(path)
+        except OSError:
+            return
+        with self.lock:
+            previous = self.results.get(path)
+            self.results[path] = errors
+        if self.on_result and errors != previous:
+            self.on_result(path, errors, previous)
+    
+    def _included_files(self, path, content):
+        """ソースがincludeしているファイル（同じディレクトリから解決できるもの）"""
+        directory = os.path.dirname(path)
+        included = []
+        for match in SOURCE_REFERENCE_PATTERN.finditer(content):
+            include_path = os.path.normpath(os.path.join(directory, match.group(1)))
+            if '`include' in match.group(0) and os.path.isfile(include_path):
+                included.append(include_path)
+        return included
+    
+    def _source_digest(self, path):
+        """ファイル・include先と、-y で解決される同じディレクトリのモジュール（インスタンス先を再帰的に）の内容ハッシュ
+        
+        (ハッシュ, ファイルとinclude先のパス) を返す。インスタンス先のポートの変更などで
+        エラボレーションの結果が変わるので、それらのファイルもキャッシュのキーに含める
+        """
+        directory = os.path.dirname(path)
+        digest = hashlib.sha256()
+        own_files = None
+        visited = set()
+        queue = [path]
+        while queue:
+            source = queue.pop(0)
+            if source in visited:
+                continue
+            visited.add(source)
+            with open(source, 'rb') as f:
+                data = f.read()
+            content = data.decode('utf-8', errors='ignore')
+            included = self._included_files(source, content)
+            digest.update(source.encode('utf-8', 'surrogateescape') + b'\0' + data)
+            for include_path in included:
+                with open(include_path, 'rb') as f:
+                    digest.update(include_path.encode('utf-8', 'surrogateescape') + b'\0' + f.read())
+            if own_files is None:
+                own_files = [path] + included
+            for match in MODULE_INSTANCE_PATTERN.finditer(content):
+                module_path = os.path.join(directory, f"{match.group(1)}.v")
+                if module_path not in visited and os.path.isfile(module_path):
+                    queue.append(module_path)
+        return digest.hexdigest(), own_files
+    
+    def check(self, path):
+        """1ファイルを構文チェック（結果はファイル・include先・インスタンス先モジュールの内容ハッシュでキャッシュ）"""
+        digest, own_files = self._source_digest(path)
+        with self.lock:
+            cached = self.cache.get(path)
+            if cached is not None and cached[0] == digest:
+                return cached[1]
+        
+        directory = os.path.dirname(path)
+        # 同じディレクトリのモジュールは -y でライブラリとして解決する
+        cmd = ["iverilog", "-t", "null", "-o", os.devnull, "-I", directory, "-y", directory, path]
+        try:
+            result = subprocess.run(cmd, capture_output=True, text=True, cwd=directory, timeout=self.timeout)
+        except (FileNotFoundError, subprocess.TimeoutExpired):
+            return []
+        
+        errors = []
+        if result.returncode != 0:
+            own_files = {os.path.normpath(p) for p in own_files}
+            for match in self.ERROR_LINE_PATTERN.finditer(result.stderr):
+                file_path = os.path.normpath(os.path.join(directory, match.group(1)))
+                message = match.group(3)
+                if file_path in own_files and not any(ignored in message for ignored in self.IGNORED_MESSAGES):
+                    prefix = '' if file_path == os.path.normpath(path) else f"{os.path.basename(file_path)}:"
+                    errors.append((f"{prefix}{match.group(2)}", message))
+        with self.lock:
+            self.cache[path] = (digest, errors)
+        return errors
+
+
+class VcdSignal:
+    """1信号分の変化点インデックス（時刻と値を array で保持）"""
+    
+    # ミップマップ1段あたりのまとめ数
+    PYRAMID_FACTOR = 64
+    
+    def __init__(self, width):
+        self.width = width
+        self.times = array('Q')
+        # 数値化できる値はそのまま、x/z や64bit超は -(文字列表のインデックス+1)
+        self.values = array('q')
+        self.strings = []
+        self._string_codes = {}
+        self.max_value = 1
+        self.pyramid = []
+        # ミップマップ作成済みの変化点数（変化がなければ作り直さない）
+        self.pyramid_count = 0
+    
+    def append(self, time, raw):
+        """値の変化を追加（raw は 'b' を除いたビット列の bytes）"""
+        if len(raw) <= 62 and not raw.translate(None, b'01'):
+            value = int(raw, 2)
+        else:
+            value = self._string_codes.get(raw)
+            if value is None:
+                self.strings.append(raw.decode('ascii', 'replace'))
+                value = self._string_codes[raw] = -len(self.strings)
+        if value > self.max_value:
+            self.max_value = value
+        if self.times and self.times[-1] == time:
+            self.values[-1] = value
+        else:
+            self.times.append(time)
+            self.values.append(value)
+    
+    def format_value(self, value):
+        """表示用の値文字列"""
+        if value < 0:
+            text = self.strings[-value - 1]
+            return text if self.width == 1 or text.translate(str.maketrans('', '', '01')) else f"'b{text}"
+        return str(value) if self.width == 1 else f"{value:X}"
+    
+    def update_pyramid(self):
+        """区間の最小値・最大値を高速に求めるミップマップを、揃ったブロックの分だけ追加で作成"""
+        factor = self.PYRAMID_FACTOR
+        # 読み込み中は times だけ追加された状態があるため、両方に揃った分だけを対象にする
+        count = min(len(self.times), len(self.values))
+        if count == self.pyramid_count:
+            return
+        self.pyramid_count = count
+        source_mins = source_maxs = self.values
+        for level in range(64):
+            if level == len(self.pyramid):
+                if count < 2 * factor:
+                    return
+                self.pyramid.append((array('q'), array('q')))
+            mins, maxs = self.pyramid[level]
+            for i in range(len(mins) * factor, count // factor * factor, factor):
+                mins.append(min(source_mins[i:i + factor]))
+                maxs.append(max(source_maxs[i:i + factor]))
+            source_mins, source_maxs = mins, maxs
+            count = len(mins)
+    
+    def range_minmax(self, lo, hi):
+        """values[lo:hi] の最小値と最大値（負の値はx/zなどの非数値）"""
+        factor = self.PYRAMID_FACTOR
+        levels = [(self.values, self.values)] + self.pyramid
+        result_min = result_max = None
+        level = 0
+        while lo < hi:
+            mins, maxs = levels[level]
+            spans = ((lo, hi),)
+            next_lo = next_hi = hi
+            if level + 1 < len(levels) and hi - lo > 2 * factor:
+                # 端数は現在の段で、揃った部分は1段上の段で集計する
+                lo_aligned = -(-lo // factor) * factor
+                hi_aligned = min(hi // factor, len(levels[level + 1][0])) * factor
+                if hi_aligned > lo_aligned:
+                    spans = ((lo, lo_aligned), (hi_aligned, hi))
+                    next_lo, next_hi = lo_aligned // factor, hi_aligned // factor
+            for a, b in spans:
+                if a < b:
+                    span_min, span_max = min(mins[a:b]), max(maxs[a:b])
+                    result_min = span_min if result_min is None else min(result_min, span_min)
+                    result_max = span_max if result_max is None else max(result_max, span_max)
+            lo, hi = next_lo, next_hi
+            level += 1
+        return result_min, result_max
+
+
+class VcdIndex:
+    """VCDファイルを1度だけ読み、信号ごとの変化点インデックスを作成"""
+    
+    def __init__(self, path):
+        self.path = path
+        self.signals = []
+        self.timescale = '1s'
+        self.end_time = 0
+        self.bytes_read = 0
+        self.size = os.path.getsize(path)
+        self.done = False
+        self.error = None
+    
+    def parse(self):
+        """ヘッダーと値の変化を順に読み込む（別スレッドからの呼び出しを想定）"""
+        try:
+            with open(self.path, 'rb') as f:
+                by_id = self._parse_header(f)
+                self._parse_changes(f, by_id)
+        except (OSError, ValueError) as e:
+            self.error = e
+        finally:
+            self.done = True
+    
+    def _parse_header(self, f):
+        by_id = {}
+        scope = []
+        tokens = []
+        for line in f:
+            self.bytes_read += len(line)
+            tokens.extend(line.split())
+            if not tokens or tokens[-1] != b'$end':
+                continue
+            keyword = tokens[0]
+            if keyword == b'$scope':
+                scope.append(tokens[2].decode('utf-8', 'replace'))
+            elif keyword == b'$upscope':
+                scope.pop()
+            elif keyword == b'$timescale':
+                self.timescale = b''.join(tokens[1:-1]).decode('ascii', 'replace')
+            elif keyword == b'$var':
+                width, ident = int(tokens[2]), tokens[3]
+                name = '.'.join(scope + [b' '.join(tokens[4:-1]).decode('utf-8', 'replace')])
+                signal = by_id.get(ident)
+                if signal is None:
+                    signal = by_id[ident] = VcdSignal(width)
+                self.signals.append((name, signal))
+            elif keyword == b'$enddefinitions':
+                return by_id
+            tokens = []
+        return by_id
+    
+    def _parse_changes(self, f, by_id):
+        time = 0
+        for line in f:
+            self.bytes_read += len(line)
+            head = line[:1]
+            if head == b'#':
+                time = int(line[1:])
+                self.end_time = time
+            elif head in b'01xzXZ' and head:
+                signal = by_id.get(line[1:].strip())
+                if signal is not None:
+                    signal.append(time, head.lower())
+            elif head in b'bBrR' and head:
+                parts = line[1:].split()
+                if len(parts) == 2:
+                    signal = by_id.get(parts[1])
+                    if signal is not None:
+                        signal.append(time, parts[0].lower())
+
+
+# VCDの $var の参照名末尾のビット範囲（例: 'cnt [3:0]'、'data[7]'）
+VCD_RANGE_PATTERN = re.compile(r'^(.*?)\s*(\[[^\[\]]*\])$')
+
+
+def split_vcd_name(name):
+    """VCDの信号名を (階層名, ビット範囲) に分ける（範囲がなければ空文字列）"""
+    match = VCD_RANGE_PATTERN.match(name)
+    return (match.group(1), match.group(2)) if match and match.group(1) else (name, '')
+
+
+class VcdChangeReader:
+    """VCDの値の変化を時間の区切りごとに読み出す（メモリ使用量は1区切りの変化数まで）
+    
+    時刻は unit 単位（Noneなら ps、ps で割り切れない timescale なら fs）で返す
+    """
+    
+    def __init__(self, path, codes, unit=None):
+        self.path = path
+        self.codes = codes
+        self.file = open(path, 'rb')
+        index = VcdIndex(path)
+        by_id = index._parse_header(self.file)
+        ident_of = {id(signal): ident for ident, signal in by_id.items()}
+        # 信号はビット範囲を除いた階層名で引き、範囲は別に保持する
+        self.signals = {}
+        self.ranges = {}
+        for name, signal in index.signals:
+            base, bit_range = split_vcd_name(name)
+            if self.ranges.get(base, bit_range) != bit_range:
+                # 同じ名前のベクタが範囲ごとに分かれている場合は範囲付きの名前にする
+                base += bit_range
+            self.signals[base] = ident_of[id(signal)]
+            self.ranges[base] = bit_range
+        self.widths = {ident: signal.width for ident, signal in by_id.items()}
+        try:
+            timescale_fs = max(parse_sim_time(index.timescale, 'fs'), 1)
+        except ValueError:
+            timescale_fs = TIME_UNITS_FS['ps']
+        self.unit = unit or ('ps' if timescale_fs % TIME_UNITS_FS['ps'] == 0 else 'fs')
+        self.scale = max(timescale_fs // TIME_UNITS_FS[self.unit], 1)
+        self.time = 0
+        self.pending = {}
+        self._next_time = None
+    
+    def close(self):
+        self.file.close()
+    
+    def encode(self, ident, raw):
+        """値を比較用の整数に変換（数値化できない値は両ファイル共通の負のコード）
         
-        self._setup_ui()
-        self.refresh_files()
+        62bitを超える信号は上位の0が省略されていても同じコードになるよう、宣言した幅に揃えてから変換する
+        """
+        width = self.widths.get(ident, len(raw))
+        if width <= 62 and len(raw) <= 62 and not raw.translate(None, b'01'):
+            return int(raw, 2)
+        # 省略された上位ビットを補う（x/z で始まる値はその文字で埋める）
+        raw = raw.rjust(width, raw[:1] if raw[:1] in b'xz' else b'0')
+        if len(raw) <= 62 and not raw.translate(None, b'01'):
+            return int(raw, 2)
+        code = self.codes.get(raw)
+        if code is None:
+            code = self.codes[raw] = -len(self.codes) - 1
+        return code
     
-    def _setup_ui(self):
-        """UIコンポーネントを設定"""
-        # メインフレーム
-        main_frame = ttk.Frame(self.root, padding="15")
-        main_frame.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
+    def read_until(self, end_time, budget):
+        """end_time より前の変化を読み込む。変化数が budget を超えたらその時刻で区切る
         
-        self._setup_directory_frame(main_frame)
-        self._setup_file_frame(main_frame)
-        self._setup_button_frame(main_frame)
-        self._setup_output_frame(main_frame)
-        self._configure_grid_weights(main_frame)
+        (信号ごとの (時刻, 値) 列, 次に読む時刻) を返す（ファイル末尾ならNone）
+        """
+        chunk, self.pending = self.pending, {}
+        count = sum(len(times) for times, _ in chunk.values())
+        while True:
+            if self._next_time is not None:
+                if self._next_time >= end_time or count >= budget:
+                    return chunk, self._next_time
+                self.time, self._next_time = self._next_time, None
+            
+            line = self.file.readline()
+            if not line:
+                return chunk, None
+            head = line[:1]
+            if head == b'#':
+                self._next_time = int(line[1:]) * self.scale
+                continue
+            if head in b'01xzXZ' and head:
+                ident, raw = line[1:].strip(), head.lower()
+            elif head in b'bB' and head:
+                parts = line[1:].split()
+                if len(parts) != 2:
+                    continue
+                raw, ident = parts[0].lower(), parts[1]
+            else:
+                continue
+            
+            column = chunk.get(ident)
+            if column is None:
+                column = chunk[ident] = (array('Q'), array('q'))
+            times, values = column
+            value = self.encode(ident, raw)
+            if times and times[-1] == self.time:
+                values[-1] = value
+            else:
+                times.append(self.time)
+                values.append(value)
+                count += 1
     
-    def _setup_directory_frame(self, parent):
-        """ディレクトリ選択フレームを設定"""
-        dir_frame = ttk.LabelFrame(parent, text="📂 作業ディレクトリ", padding="10")
-        dir_frame.grid(row=0, column=0, columnspan=2, sticky=(tk.W, tk.E), pady=(0, 10))
+    def push_back(self, chunk, split_time):
+        """split_time 以降の変化を次の区切りに回す"""
+        kept = {}
+        for ident, (times, values) in chunk.items():
+            index = bisect_left(times, split_time)
+            kept[ident] = (times[:index], values[:index])
+            if index < len(times):
+                self.pending[ident] = (times[index:], values[index:])
+        return kept
+
+
+def _mismatch_runs(golden, new, start, end):
+    """区間 [start, end) で2つの値の列が異なる区間の (開始, 終了, 開始時の値の組) を返す
+    
+    golden/new は start 時点の値を先頭に持つ (時刻列, 値列)。NumPyがあればベクトル演算で求める。
+    """
+    (golden_times, golden_values), (new_times, new_values) = golden, new
+    if np is not None:
+        golden_t = np.frombuffer(golden_times, dtype=np.uint64)
+        new_t = np.frombuffer(new_times, dtype=np.uint64)
+        times = np.union1d(golden_t, new_t)
+        golden_v = np.frombuffer(golden_values, dtype=np.int64)[np.searchsorted(golden_t, times, 'right') - 1]
+        new_v = np.frombuffer(new_values, dtype=np.int64)[np.searchsorted(new_t, times, 'right') - 1]
+        diff = np.concatenate(([False], golden_v != new_v, [False])).astype(np.int8)
+        edges = np.diff(diff)
+        run_starts = np.flatnonzero(edges == 1)
+        run_ends = np.flatnonzero(edges == -1)
+        bounds = np.append(times, np.uint64(end))
+        return [(int(bounds[s]), int(bounds[e]), (int(golden_v[s]), int(new_v[s])))
+                for s, e in zip(run_starts, run_ends)]
+    
+    runs = []
+    current = None
+    i = j = 0
+    golden_value = new_value = None
+    while i < len(golden_times) or j < len(new_times):
+        time = min(golden_times[i] if i < len(golden_times) else end,
+                   new_times[j] if j < len(new_times) else end)
+        while i < len(golden_times) and golden_times[i] == time:
+            golden_value = golden_values[i]
+            i += 1
+        while j < len(new_times) and new_times[j] == time:
+            new_value = new_values[j]
+            j += 1
+        if golden_value != new_value:
+            if current is None:
+                current = [time, end, (golden_value, new_value)]
+        elif current is not None:
+            current[1] = time
+            runs.append(tuple(current))
+            current = None
+    if current is not None:
+        runs.append(tuple(current))
+    return runs
+
+
+class WaveformComparison:
+    """ゴールデン波形との比較（信号名の対応付け・除外・時間の許容誤差）"""
+    
+    # ゴールデン波形の保存先（テストベンチのディレクトリからの相対パス）
+    DEFAULT_DIR = 'golden'
+    # 1区切りで読み込む値の変化数
+    CHUNK_CHANGES = 1000000
+    # 最初の変化より前の値
+    UNDEFINED = -(1 << 62)
+    
+    def __init__(self, golden_dir=None, mapping=None, ignore=None, tolerance=0, chunk_changes=None):
+        self.golden_dir = golden_dir or self.DEFAULT_DIR
+        # Trueなら比較せず、今回の波形をゴールデンとして保存する
+        self.update = False
+        # ゴールデン側の階層名 → 新しい波形側の階層名（前方一致）
+        self.mapping = mapping or {}
+        self.ignore = ignore or []
+        # 許容誤差（fs）
+        self.tolerance = tolerance
+        self.chunk_changes = chunk_changes or self.CHUNK_CHANGES
+    
+    @classmethod
+    def from_options(cls, golden_dir=None, mapping=(), ignore=(), tolerance=None):
+        """文字列の指定から作成（mapping は 'ゴールデン側=新しい側'、tolerance は '1ns' など）"""
+        pairs = {}
+        for item in mapping:
+            for pair in filter(None, (p.strip() for p in item.split(','))):
+                if '=' not in pair:
+                    raise ValueError(f"信号名の対応付けが不正です: {pair}")
+                old, new = pair.split('=', 1)
+                pairs[split_vcd_name(old.strip())[0]] = split_vcd_name(new.strip())[0]
+        # 信号はビット範囲を除いた名前で比較するため、指定側の範囲も除く
+        patterns = [split_vcd_name(p.strip())[0] for item in ignore for p in item.split(',') if p.strip()]
+        return cls(golden_dir, pairs, patterns, parse_sim_time(tolerance, 'fs') if tolerance else 0)
+    
+    def golden_path(self, waveform_path):
+        """波形に対応するゴールデン波形のパス"""
+        directory = os.path.dirname(waveform_path)
+        return os.path.join(directory, self.golden_dir, os.path.basename(waveform_path))
+    
+    def map_name(self, name):
+        """ゴールデン側の信号名を新しい波形側の名前に変換"""
+        for old, new in self.mapping.items():
+            if name == old or name.startswith(old + '.'):
+                return new + name[len(old):]
+        return name
+    
+    def compare(self, golden_path, new_path):
+        """2つのVCDを時間の区切りごとに比較し、信号ごとの最初の不一致を返す（時刻はfs）"""
+        codes = {}
+        # timescale の異なる波形どうしも比べられるよう、最も細かいfs単位に揃える
+        golden = VcdChangeReader(golden_path, codes, 'fs')
+        new = VcdChangeReader(new_path, codes, 'fs')
+        try:
+            return self._compare(golden, new, codes)
+        finally:
+            golden.close()
+            new.close()
+    
+    def _compare(self, golden, new, codes):
+        pairs = {}
+        missing = []
+        ignored = 0
+        for name, golden_ident in golden.signals.items():
+            if any(fnmatch.fnmatchcase(name, pattern) for pattern in self.ignore):
+                ignored += 1
+                continue
+            new_ident = new.signals.get(self.map_name(name))
+            if new_ident is None:
+                missing.append(name)
+            else:
+                pairs.setdefault((golden_ident, new_ident), name)
         
-        self.dir_var = tk.StringVar(value=self.current_dir)
-        ttk.Label(dir_frame, text="ディレクトリ:", font=('', 10, 'bold')).grid(row=0, column=0, sticky=tk.W, padx=(0, 10))
-        self.dir_entry = ttk.Entry(dir_frame, textvariable=self.dir_var, width=70, font=('', 10))
-        self.dir_entry.grid(row=0, column=1, padx=(0, 5), sticky=(tk.W, tk.E))
-        ttk.Button(dir_frame, text="📁 参照", command=self.browse_directory).grid(row=0, column=2, padx=(0, 5))
-        ttk.Button(dir_frame, text="🔄 更新", command=self.refresh_files).grid(row=0, column=3)
+        # 信号ごとの区切りをまたぐ状態: 直前の値と、継続中の不一致
+        last_values = {pair: (self.UNDEFINED, self.UNDEFINED) for pair in pairs}
+        open_runs = {}
+        mismatches = {}
+        start = 0
+        chunks = 0
+        while pairs.keys() - mismatches.keys():
+            golden_chunk, golden_stop = golden.read_until(float('inf'), self.chunk_changes)
+            new_chunk, new_stop = new.read_until(golden_stop if golden_stop is not None else float('inf'),
+                                                 self.chunk_changes)
+            if new_stop is not None and (golden_stop is None or new_stop < golden_stop):
+                golden_chunk = golden.push_back(golden_chunk, new_stop)
+                stop = new_stop
+            else:
+                stop = golden_stop
+            end = stop if stop is not None else (1 << 64) - 1
+            chunks += 1
+            
+            for pair, name in pairs.items():
+                if pair in mismatches:
+                    continue
+                columns = []
+                for side, (ident, chunk) in enumerate(((pair[0], golden_chunk), (pair[1], new_chunk))):
+                    times, values = chunk.get(ident, (array('Q'), array('q')))
+                    if not times or times[0] > start:
+                        times = array('Q', [start]) + times
+                        values = array('q', [last_values[pair][side]]) + values
+                    columns.append((times, values))
+                last_values[pair] = (columns[0][1][-1], columns[1][1][-1])
+                
+                runs = _mismatch_runs(columns[0], columns[1], start, end)
+                if runs and pair in open_runs and runs[0][0] == start:
+                    # 前の区切りから続く不一致
+                    runs[0] = (open_runs[pair][0], runs[0][1], open_runs[pair][1])
+                open_runs.pop(pair, None)
+                for run_start, run_end, values in runs:
+                    if run_end == end and stop is not None:
+                        open_runs[pair] = (run_start, values)
+                        if run_end - run_start <= self.tolerance:
+                            break
+                    if run_end - run_start > self.tolerance:
+                        mismatches[pair] = (run_start, values)
+                        break
+            
+            if stop is None:
+                break
+            start = stop
         
-        dir_frame.columnconfigure(1, weight=1)
+        strings = {code: raw.decode('ascii', 'replace') for raw, code in codes.items()}
+        
+        def format_value(value):
+            if value == self.UNDEFINED:
+                return '(未定義)'
+            return strings.get(value, hex(value) if value > 1 else str(value))
+        
+        report = sorted((time, pairs[pair], format_value(values[0]), format_value(values[1]))
+                        for pair, (time, values) in mismatches.items())
+        return {'mismatches': report, 'missing': missing, 'compared': len(pairs),
+                'ignored': ignored, 'chunks': chunks}
     
-    def _setup_file_frame(self, parent):
-        """ファイル選択フレームを設定"""
-        file_frame = ttk.LabelFrame(parent, text="📝 Verilogファイル選択", padding="10")
-        file_frame.grid(row=1, column=0, columnspan=2, sticky=(tk.W, tk.E, tk.N, tk.S), pady=(0, 10))
+    def run(self, pipeline, waveform_path):
+        """ゴールデン波形があれば比較して結果をログに出力（一致またはゴールデンなしならTrue）"""
+        golden_path = self.golden_path(waveform_path)
+        if self.update:
+            if not os.path.exists(waveform_path):
+                pipeline.log_output(f"❌ 登録する波形がありません: {waveform_path}\n", 'error')
+                return False
+            os.makedirs(os.path.dirname(golden_path), exist_ok=True)
+            shutil.copy2(waveform_path, golden_path)
+            pipeline.log_output(f"📌 ゴールデン波形を更新: {golden_path}\n", 'success')
+            return True
+        if not os.path.exists(golden_path):
+            pipeline.log_output(f"🏅 ゴールデン波形がありません: {golden_path}\n", 'warning')
+            return True
+        if not os.path.exists(waveform_path):
+            pipeline.log_output(f"❌ 比較する波形がありません: {waveform_path}\n", 'error')
+            return False
         
-        # パネル分割器を作成
-        paned = ttk.PanedWindow(file_frame, orient=tk.HORIZONTAL)
-        paned.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
+        pipeline.log_output(f"🏅 ゴールデン波形と比較: {golden_path}\n", 'info')
+        start = time.time()
+        result = self.compare(golden_path, waveform_path)
+        elapsed = time.time() - start
+        summary = (f"{result['compared']} 信号 / 除外 {result['ignored']} / {result['chunks']} 区切り / "
+                   f"{elapsed:.2f}s{'' if np is not None else ' (NumPyなし)'}")
+        for name in result['missing']:
+            pipeline.log_output(f"   ⚠️  新しい波形に信号がありません: {name}\n", 'warning')
+        if not result['mismatches'] and not result['missing']:
+            pipeline.log_output(f"✓ ゴールデン波形と一致 ({summary})\n", 'success')
+            return True
         
-        # 左側: フォルダーツリー
-        tree_frame = ttk.Frame(paned)
-        paned.add(tree_frame, weight=1)
+        pipeline.log_output(f"❌ ゴールデン波形と不一致: {len(result['mismatches'])} 信号 ({summary})\n", 'error')
+        for time_fs, name, golden_value, new_value in result['mismatches']:
+            pipeline.log_output(f"   {format_sim_time(time_fs, 'fs'):>12}  {name}: ゴールデン {golden_value} / 今回 {new_value}\n",
+                                'error')
+        return False
+
+
+class ColumnarExport:
+    """VCDを信号ごとの時刻・値の列（.npy）とマニフェストに変換（NumPyがなくても書き出せる）"""
+    
+    MANIFEST = 'manifest.json'
+    # .npy のヘッダー長（要素数を書き終えてから上書きするため固定長）
+    HEADER_SIZE = 128
+    CHUNK_CHANGES = 1000000
+    
+    def __init__(self, chunk_changes=None):
+        self.chunk_changes = chunk_changes or self.CHUNK_CHANGES
+    
+    @classmethod
+    def npy_header(cls, descr, count):
+        """.npy 形式 (バージョン1.0) のヘッダー"""
+        header = f"{{'descr': '{descr}', 'fortran_order': False, 'shape': ({count},), }}"
+        header = header.ljust(cls.HEADER_SIZE - 10 - 1) + '\n'
+        return b'\x93NUMPY\x01\x00' + len(header).to_bytes(2, 'little') + header.encode('latin1')
+    
+    def export(self, vcd_path, out_dir):
+        """VCDを out_dir に書き出し、件数と処理時間を返す"""
+        start = time.time()
+        os.makedirs(out_dir, exist_ok=True)
+        codes = {}
+        reader = VcdChangeReader(vcd_path, codes)
+        try:
+            # 同じIDを参照する信号（別名）は同じファイルを共有する
+            files = {}
+            signals = []
+            for name, ident in reader.signals.items():
+                if ident not in files:
+                    index = len(files)
+                    files[ident] = (f"s{index}.t.npy", f"s{index}.v.npy")
+                scope, _, short_name = name.rpartition('.')
+                signals.append({'name': name, 'scope': scope, 'signal': short_name,
+                                'range': reader.ranges[name], 'width': reader.widths.get(ident, 1),
+                                'times': files[ident][0], 'values': files[ident][1]})
+            
+            counts = dict.fromkeys(files, 0)
+            for ident, (times_file, values_file) in files.items():
+                for file_name, descr in ((times_file, '<u8'), (values_file, '<i8')):
+                    with open(os.path.join(out_dir, file_name), 'wb') as f:
+                        f.write(self.npy_header(descr, 0))
+            
+            end_time = 0
+            while True:
+                chunk, stop = reader.read_until(float('inf'), self.chunk_changes)
+                for ident, (times, values) in chunk.items():
+                    if ident not in files:
+                        continue
+                    if sys.byteorder != 'little':
+                        times, values = array('Q', times), array('q', values)
+                        times.byteswap()
+                        values.byteswap()
+                    with open(os.path.join(out_dir, files[ident][0]), 'ab') as f:
+                        times.tofile(f)
+                    with open(os.path.join(out_dir, files[ident][1]), 'ab') as f:
+                        values.tofile(f)
+                    counts[ident] += len(times)
+                end_time = max([end_time, reader.time] + [times[-1] for times, _ in chunk.values() if times])
+                if stop is None:
+                    break
+            
+            for ident, (times_file, values_file) in files.items():
+                for file_name, descr in ((times_file, '<u8'), (values_file, '<i8')):
+                    with open(os.path.join(out_dir, file_name), 'r+b') as f:
+                        f.write(self.npy_header(descr, counts[ident]))
+            for signal, ident in zip(signals, reader.signals.values()):
+                signal['count'] = counts[ident]
+        finally:
+            reader.close()
         
-        ttk.Label(tree_frame, text="📁 フォルダー", font=('', 11, 'bold')).pack(anchor=tk.W, pady=(0, 5))
+        manifest = {
+            'version': 1,
+            'source': os.path.abspath(vcd_path),
+            'time_unit': reader.unit,
+            'end_time': end_time,
+            # 値が負なら -(strings のインデックス+1) の文字列（x/z を含む値や62bit超の値）
+            'strings': [raw.decode('ascii', 'replace') for raw, _ in sorted(codes.items(), key=lambda item: -item[1])],
+            'signals': signals,
+        }
+        with open(os.path.join(out_dir, self.MANIFEST), 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=1)
+        return {'signals': len(signals), 'changes': sum(counts.values()),
+                'bytes': os.path.getsize(vcd_path), 'elapsed': time.time() - start}
+    
+    def run(self, pipeline, waveform_path, out_dir):
+        """エクスポートして処理量をログに出力"""
+        if not os.path.exists(waveform_path):
+            pipeline.log_output(f"⚠️  エクスポートする波形がありません: {waveform_path}\n", 'warning')
+            return None
+        try:
+            stats = self.export(waveform_path, out_dir)
+        except (OSError, ValueError) as e:
+            pipeline.log_output(f"❌ 波形のエクスポートエラー: {e}\n", 'error')
+            return None
+        elapsed = max(stats['elapsed'], 1e-6)
+        pipeline.log_output(f"📦 列形式でエクスポート: {out_dir} ({stats['signals']} 信号 / {stats['changes']} 変化 / "
+                            f"{elapsed:.2f}s, {format_size(stats['bytes'] / elapsed)}/s, "
+                            f"{stats['changes'] / elapsed:,.0f} 変化/s)\n", 'info')
+        return stats
+
+
+class ColumnarWaveform:
+    """列形式でエクスポートした波形の読み込み（ファイルをメモリマップして参照、コピーしない）
+    
+    例:
+        wave = ColumnarWaveform('columns/add1')
+        times, values = wave.columns('add1_tb.dut.y')
+        wave.value_at('add1_tb.dut.y', 100000)
+    """
+    
+    def __init__(self, directory):
+        self.directory = directory
+        with open(os.path.join(directory, ColumnarExport.MANIFEST), 'r', encoding='utf-8') as f:
+            self.manifest = json.load(f)
+        self.strings = self.manifest['strings']
+        self.signals = {signal['name']: signal for signal in self.manifest['signals']}
+        self._maps = {}
+        self._mapped = []
+    
+    @property
+    def names(self):
+        return list(self.signals)
+    
+    def _load(self, file_name, typecode):
+        """.npy をメモリマップで開く（NumPyがあれば np.memmap、なければ memoryview）"""
+        column = self._maps.get(file_name)
+        if column is None:
+            path = os.path.join(self.directory, file_name)
+            if np is not None:
+                column = np.load(path, mmap_mode='r')
+            else:
+                with open(path, 'rb') as f:
+                    header_len = int.from_bytes(f.read(10)[8:10], 'little')
+                    mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                base = memoryview(mapped)
+                column = base[10 + header_len:].cast(typecode)
+                self._mapped.append((mapped, base))
+            self._maps[file_name] = column
+        return column
+    
+    def columns(self, name):
+        """信号の (時刻列, 値列) を返す（時刻はマニフェストの time_unit 単位、値の負数は strings の参照）"""
+        signal = self.signals[name]
+        return self._load(signal['times'], 'Q'), self._load(signal['values'], 'q')
+    
+    def decode(self, value):
+        """値列の要素を整数または文字列に変換"""
+        value = int(value)
+        return self.strings[-value - 1] if value < 0 else value
+    
+    def value_at(self, name, time):
+        """指定時刻（マニフェストの time_unit 単位）の値（最初の変化より前ならNone）"""
+        times, values = self.columns(name)
+        index = (int(np.searchsorted(times, time, 'right')) if np is not None else bisect_right(times, time)) - 1
+        return self.decode(values[index]) if index >= 0 else None
+    
+    def close(self):
+        """メモリマップを解放（取得した列は使えなくなる）"""
+        for column in self._maps.values():
+            if isinstance(column, memoryview):
+                column.release()
+        for mapped, base in self._mapped:
+            base.release()
+            mapped.close()
+        self._maps.clear()
+        self._mapped.clear()
+
+
+class WaveformPreview(tk.Toplevel):
+    """VCDの変化点インデックスから描画する簡易波形プレビュー"""
+    
+    NAME_WIDTH = 180
+    ROW_HEIGHT = 28
+    RULER_HEIGHT = 24
+    
+    def __init__(self, master, path):
+        super().__init__(master)
+        self.title(f"👁️ 波形プレビュー - {os.path.basename(path)}")
+        self.geometry("1000x520")
         
-        tree_scroll_frame = ttk.Frame(tree_frame)
-        tree_scroll_frame.pack(fill=tk.BOTH, expand=True)
+        self.index = VcdIndex(path)
+        self.view_start = 0
+        self.view_end = None
+        self.drag_x = None
         
-        self.folder_tree = ttk.Treeview(tree_scroll_frame, selectmode="browse")
-        tree_scrollbar = ttk.Scrollbar(tree_scroll_frame, orient="vertical", command=self.folder_tree.yview)
-        self.folder_tree.configure(yscrollcommand=tree_scrollbar.set)
+        toolbar = ttk.Frame(self, padding=5)
+        toolbar.pack(fill=tk.X)
+        ttk.Button(toolbar, text="🔍 全体表示", command=self.zoom_fit).pack(side=tk.LEFT)
+        self.status_var = tk.StringVar(value="読み込み中...")
+        ttk.Label(toolbar, textvariable=self.status_var).pack(side=tk.LEFT, padx=10)
         
-        self.folder_tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
-        tree_scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
-        self.folder_tree.bind("<<TreeviewSelect>>", self.on_folder_select)
+        body = ttk.PanedWindow(self, orient=tk.HORIZONTAL)
+        body.pack(fill=tk.BOTH, expand=True)
         
-        # 中央: テストベンチファイルリスト
-        tb_list_frame = ttk.Frame(paned)
-        paned.add(tb_list_frame, weight=1)
+        self.signal_listbox = tk.Listbox(body, selectmode=tk.EXTENDED, exportselection=False, width=28)
+        self.signal_listbox.bind("<<ListboxSelect>>", lambda e: self.render())
+        body.add(self.signal_listbox, weight=0)
         
-        ttk.Label(tb_list_frame, text="🧪 テストベンチ (*_tb.v)", font=('', 11, 'bold')).pack(anchor=tk.W, pady=(0, 5))
+        self.canvas = tk.Canvas(body, bg='#1e1e1e', highlightthickness=0)
+        body.add(self.canvas, weight=1)
         
-        tb_scroll_frame = ttk.Frame(tb_list_frame)
-        tb_scroll_frame.pack(fill=tk.BOTH, expand=True)
+        self.canvas.bind("<Configure>", lambda e: self.render())
+        self.canvas.bind("<MouseWheel>", lambda e: self.zoom(e.x, 0.8 if e.delta > 0 else 1.25))
+        self.canvas.bind("<Button-4>", lambda e: self.zoom(e.x, 0.8))
+        self.canvas.bind("<Button-5>", lambda e: self.zoom(e.x, 1.25))
+        self.canvas.bind("<ButtonPress-1>", self.on_drag_start)
+        self.canvas.bind("<B1-Motion>", self.on_drag)
+        self.canvas.bind("<Motion>", self.on_hover)
         
-        self.tb_listbox = tk.Listbox(tb_scroll_frame, height=10, selectmode=tk.SINGLE, 
-                                      bg='#f0f8ff', font=('', 10), relief=tk.FLAT, 
-                                      borderwidth=1, highlightthickness=1, highlightcolor=self.colors['primary'])
-        tb_scrollbar = ttk.Scrollbar(tb_scroll_frame, orient="vertical", command=self.tb_listbox.yview)
-        self.tb_listbox.configure(yscrollcommand=tb_scrollbar.set)
+        self.listed_signals = 0
+        threading.Thread(target=self.index.parse, daemon=True).start()
+        self.after(100, self.poll_index)
+    
+    def poll_index(self):
+        """読み込み中は途中までのインデックスで描画を更新"""
+        signals = self.index.signals
+        if len(signals) > self.listed_signals:
+            for name, _ in signals[self.listed_signals:]:
+                self.signal_listbox.insert(tk.END, name)
+            if not self.listed_signals:
+                self.signal_listbox.selection_set(0, min(len(signals), 16) - 1)
+            self.listed_signals = len(signals)
         
-        self.tb_listbox.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
-        tb_scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
-        self.tb_listbox.bind("<<ListboxSelect>>", self.on_testbench_select)
+        if self.index.error:
+            self.status_var.set(f"読み込みエラー: {self.index.error}")
+            return
         
-        # 右側: 依存ファイルリスト
-        dep_list_frame = ttk.Frame(paned)
-        paned.add(dep_list_frame, weight=1)
+        self.render()
+        if self.index.done:
+            self.status_var.set(f"{len(signals)} 信号 / 終了時刻 {self.index.end_time} ({self.index.timescale})")
+        else:
+            percent = 100 * self.index.bytes_read / max(self.index.size, 1)
+            self.status_var.set(f"読み込み中... {percent:.0f}%")
+            self.after(250, self.poll_index)
+    
+    def visible_range(self):
+        end = self.view_end if self.view_end is not None else max(self.index.end_time, 1)
+        return self.view_start, max(end, self.view_start + 1)
+    
+    def time_at(self, x):
+        start, end = self.visible_range()
+        plot_width = max(self.canvas.winfo_width() - self.NAME_WIDTH, 1)
+        return start + (x - self.NAME_WIDTH) * (end - start) / plot_width
+    
+    def zoom_fit(self):
+        self.view_start, self.view_end = 0, None
+        self.render()
+    
+    def zoom(self, x, factor):
+        """カーソル位置を中心に拡大・縮小（再読み込みはしない）"""
+        start, end = self.visible_range()
+        center = min(max(self.time_at(x), start), end)
+        new_start = max(center - (center - start) * factor, 0)
+        new_end = max(center + (end - center) * factor, new_start + 1)
+        self.view_start, self.view_end = int(new_start), int(new_end)
+        self.render()
+    
+    def on_drag_start(self, event):
+        self.drag_x = event.x
+    
+    def on_drag(self, event):
+        """ドラッグで左右にスクロール"""
+        if self.drag_x is None:
+            return
+        start, end = self.visible_range()
+        shift = (self.time_at(self.drag_x) - self.time_at(event.x))
+        shift = max(shift, -start)
+        self.view_start, self.view_end = int(start + shift), int(end + shift)
+        self.drag_x = event.x
+        self.render()
+    
+    def on_hover(self, event):
+        """カーソル位置の時刻と値を表示"""
+        if event.x < self.NAME_WIDTH or not self.index.done:
+            return
+        time = int(self.time_at(event.x))
+        row = (event.y - self.RULER_HEIGHT) // self.ROW_HEIGHT
+        selected = self.signal_listbox.curselection()
+        if 0 <= row < len(selected):
+            name, signal = self.index.signals[selected[row]]
+            i = bisect_right(signal.times, time) - 1
+            value = signal.format_value(signal.values[i]) if i >= 0 else '-'
+            self.status_var.set(f"t={time} ({self.index.timescale})  {name} = {value}")
+    
+    def render(self):
+        """表示範囲をピクセル幅に合わせて間引き（min/max）して描画"""
+        canvas = self.canvas
+        canvas.delete('all')
+        width = canvas.winfo_width()
+        plot_width = width - self.NAME_WIDTH
+        if plot_width <= 0:
+            return
+        start, end = self.visible_range()
+        span = end - start
         
-        dep_header = ttk.Frame(dep_list_frame)
-        dep_header.pack(fill=tk.X, pady=(0, 5))
-        ttk.Label(dep_header, text="📄 依存ファイル", font=('', 11, 'bold')).pack(side=tk.LEFT)
-        ttk.Button(dep_header, text="すべて選択", command=self.select_all_deps, width=12).pack(side=tk.RIGHT, padx=(5, 0))
-        ttk.Button(dep_header, text="すべて解除", command=self.deselect_all_deps, width=12).pack(side=tk.RIGHT)
+        # 時間軸
+        for i in range(9):
+            x = self.NAME_WIDTH + i * plot_width / 8
+            canvas.create_line(x, self.RULER_HEIGHT - 6, x, self.RULER_HEIGHT, fill='#6b7280')
+            canvas.create_text(x + 2, 4, text=str(int(start + i * span / 8)), anchor='nw',
+                               fill='#9ca3af', font=('Menlo', 8))
         
-        # Checkbuttonを使ったリスト
-        dep_canvas_frame = ttk.Frame(dep_list_frame)
-        dep_canvas_frame.pack(fill=tk.BOTH, expand=True)
+        for row, signal_number in enumerate(self.signal_listbox.curselection()):
+            name, signal = self.index.signals[signal_number]
+            top = self.RULER_HEIGHT + row * self.ROW_HEIGHT
+            canvas.create_text(6, top + self.ROW_HEIGHT / 2, text=name.split('.')[-1], anchor='w',
+                               fill='#d4d4d4', font=('Menlo', 9))
+            self._render_signal(signal, top, start, span, plot_width)
+    
+    def _render_signal(self, signal, top, start, span, plot_width):
+        canvas = self.canvas
+        count = min(len(signal.times), len(signal.values))
+        if count == 0:
+            return
+        signal.update_pyramid()
+        times = signal.times
+        low, high = top + self.ROW_HEIGHT - 5, top + 5
+        scale = (low - high) / (signal.max_value if signal.width > 1 else 1)
         
-        self.dep_canvas = tk.Canvas(dep_canvas_frame, bg='white', highlightthickness=1, 
-                                    highlightbackground=self.colors['border'])
-        dep_scrollbar = ttk.Scrollbar(dep_canvas_frame, orient="vertical", command=self.dep_canvas.yview)
-        self.dep_checkbutton_frame = ttk.Frame(self.dep_canvas)
+        def y_of(value):
+            return low - scale * value
         
-        self.dep_checkbutton_frame.bind(
-            "<Configure>",
-            lambda e: self.dep_canvas.configure(scrollregion=self.dep_canvas.bbox("all"))
-        )
+        points = []
+        unknown_columns = []
+        label_x = -100
+        previous = bisect_right(times, start, 0, count) - 1
+        for column in range(plot_width):
+            t_end = start + (column + 1) * span / plot_width
+            hi = bisect_right(times, t_end, max(previous, 0), count)
+            lo = max(previous, 0)
+            if hi <= lo:
+                previous = hi - 1
+                continue
+            value_min, value_max = signal.range_minmax(lo, hi)
+            x = self.NAME_WIDTH + column
+            if value_min < 0:
+                unknown_columns.append(x)
+            else:
+                points.extend((x, y_of(value_min), x, y_of(value_max), x + 1, y_of(value_max)))
+            # 変化点に値のラベル（間隔が空いているときのみ）
+            if signal.width > 1 and (hi - 1 > previous or label_x < 0) and x - label_x > 60:
+                label_x = x
+                canvas.create_text(x + 3, top + 1, text=signal.format_value(signal.values[hi - 1]),
+                                   anchor='nw', fill='#fbbf24', font=('Menlo', 8))
+            previous = hi - 1
         
-        self.dep_canvas.create_window((0, 0), window=self.dep_checkbutton_frame, anchor="nw")
-        self.dep_canvas.configure(yscrollcommand=dep_scrollbar.set)
+        for x in unknown_columns:
+            canvas.create_line(x, high, x, low, fill='#f87171')
+        if len(points) >= 4:
+            canvas.create_line(*points, fill='#4ade80')
+
+
+class Diagnostics:
+    """ランナー自身の主要処理の時間・回数とメインループの停止を計測"""
+    
+    STALL_INTERVAL_MS = 50
+    STALL_THRESHOLD = 0.1
+    
+    def __init__(self):
+        self.enabled = False
+        self.timers = {}
+        self.stalls = deque(maxlen=200)
+        self.profiler = None
+        self.profiling = False
+        self.lock = threading.Lock()
+        self._heartbeat = None
+    
+    def instrument(self, obj, names):
+        """インスタンスのメソッドを計測付きのものに置き換える"""
+        for name in names:
+            setattr(obj, name, self._wrap(name, getattr(obj, name)))
+    
+    def _wrap(self, name, func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not self.enabled:
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.record(name, time.perf_counter() - start)
+        return wrapper
+    
+    def record(self, name, elapsed):
+        """1回分の処理時間を記録"""
+        with self.lock:
+            timer = self.timers.setdefault(name, [0, 0.0, 0.0])
+            timer[0] += 1
+            timer[1] += elapsed
+            timer[2] = max(timer[2], elapsed)
+    
+    def reset(self):
+        with self.lock:
+            self.timers.clear()
+            self.stalls.clear()
+    
+    def watch_mainloop(self, root):
+        """一定間隔の after 呼び出しの遅れからメインループの停止を検出"""
+        expected = time.perf_counter() + self.STALL_INTERVAL_MS / 1000
         
-        self.dep_canvas.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
-        dep_scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        def heartbeat():
+            nonlocal expected
+            now = time.perf_counter()
+            if self.enabled and now - expected > self.STALL_THRESHOLD:
+                self.stalls.append((time.time(), now - expected))
+            expected = now + self.STALL_INTERVAL_MS / 1000
+            self._heartbeat = root.after(self.STALL_INTERVAL_MS, heartbeat)
         
-        self.dep_vars = []
-        self.dep_files = []
+        self._heartbeat = root.after(self.STALL_INTERVAL_MS, heartbeat)
+    
+    def set_profiling(self, active):
+        """cProfile による計測を開始・停止（メインスレッドが対象）"""
+        if self.profiler is None:
+            self.profiler = cProfile.Profile()
+        if active and not self.profiling:
+            self.profiler.enable()
+        elif not active and self.profiling:
+            self.profiler.disable()
+        self.profiling = active
+    
+    def set_tracemalloc(self, active):
+        """tracemalloc によるメモリ割り当ての追跡を開始・停止"""
+        if active and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        elif not active and tracemalloc.is_tracing():
+            tracemalloc.stop()
+    
+    def snapshot(self):
+        """現在の計測結果を辞書で返す"""
+        with self.lock:
+            timers = {
+                name: {'count': count, 'total': total, 'avg': total / count, 'max': longest}
+                for name, (count, total, longest) in self.timers.items()
+            }
+            stalls = [duration for _, duration in self.stalls]
+        data = {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': sys.version,
+            'platform': sys.platform,
+            'timers': timers,
+            'stalls': {
+                'count': len(stalls),
+                'max': max(stalls, default=0.0),
+                'recent': stalls[-20:],
+            },
+        }
+        if tracemalloc.is_tracing():
+            current, peak = tracemalloc.get_traced_memory()
+            top = tracemalloc.take_snapshot().statistics('lineno')[:10]
+            data['tracemalloc'] = {
+                'current': current,
+                'peak': peak,
+                'top': [{'location': str(stat.traceback), 'size': stat.size, 'count': stat.count} for stat in top],
+            }
+        return data
+    
+    def export(self, directory):
+        """計測結果をJSONとpstats形式で書き出し、作成したファイルを返す"""
+        stem = os.path.join(directory, f"verilog_runner_diag_{time.strftime('%Y%m%d_%H%M%S')}")
+        paths = [f"{stem}.json"]
+        with open(paths[0], 'w', encoding='utf-8') as f:
+            json.dump(self.snapshot(), f, ensure_ascii=False, indent=2)
         
-        file_frame.columnconfigure(0, weight=1)
-        file_frame.rowconfigure(0, weight=1)
+        if self.profiler is not None:
+            if self.profiling:
+                self.profiler.disable()
+            self.profiler.dump_stats(f"{stem}.pstats")
+            paths.append(f"{stem}.pstats")
+            if self.profiling:
+                self.profiler.enable()
+        return paths
+
+
+class DiagnosticsPanel(tk.Toplevel):
+    """診断モードの操作と計測結果の表示"""
     
-    def _setup_button_frame(self, parent):
-        """ボタンフレームを設定"""
-        button_frame = ttk.Frame(parent)
-        button_frame.grid(row=2, column=0, columnspan=2, pady=(0, 10))
+    def __init__(self, master, diagnostics):
+        super().__init__(master)
+        self.title("🩺 診断")
+        self.geometry("720x480")
+        self.diagnostics = diagnostics
         
-        # 左側のオプション
-        left_options = ttk.Frame(button_frame)
-        left_options.pack(side=tk.LEFT, fill=tk.X, expand=True)
+        controls = ttk.Frame(self, padding=5)
+        controls.pack(fill=tk.X)
         
-        self.gtkwave_var = tk.BooleanVar(value=True)
-        self.gtkwave_checkbox = ttk.Checkbutton(
-            left_options, 
-            text="📊 GTKWaveで波形表示", 
-            variable=self.gtkwave_var
-        )
-        self.gtkwave_checkbox.pack(side=tk.LEFT, padx=(0, 20))
+        self.enabled_var = tk.BooleanVar(value=diagnostics.enabled)
+        self.profile_var = tk.BooleanVar(value=diagnostics.profiling)
+        self.tracemalloc_var = tk.BooleanVar(value=tracemalloc.is_tracing())
+        ttk.Checkbutton(controls, text="⏱️ 計測", variable=self.enabled_var,
+                        command=lambda: setattr(diagnostics, 'enabled', self.enabled_var.get())).pack(side=tk.LEFT)
+        ttk.Checkbutton(controls, text="cProfile", variable=self.profile_var,
+                        command=lambda: diagnostics.set_profiling(self.profile_var.get())).pack(side=tk.LEFT, padx=(10, 0))
+        ttk.Checkbutton(controls, text="tracemalloc", variable=self.tracemalloc_var,
+                        command=lambda: diagnostics.set_tracemalloc(self.tracemalloc_var.get())).pack(side=tk.LEFT, padx=(10, 0))
+        ttk.Button(controls, text="💾 エクスポート", command=self.export).pack(side=tk.RIGHT)
+        ttk.Button(controls, text="リセット", command=diagnostics.reset).pack(side=tk.RIGHT, padx=(0, 5))
         
-        self.auto_detect_var = tk.BooleanVar(value=True)
-        self.auto_detect_checkbox = ttk.Checkbutton(
-            left_options,
-            text="🔍 依存ファイル自動検出",
-            variable=self.auto_detect_var,
-            command=self.on_auto_detect_toggle
-        )
-        self.auto_detect_checkbox.pack(side=tk.LEFT)
+        self.report_text = scrolledtext.ScrolledText(self, font=('Menlo', 10), bg='#1e1e1e', fg='#d4d4d4')
+        self.report_text.pack(fill=tk.BOTH, expand=True)
+        self.refresh()
+    
+    def refresh(self):
+        """計測結果の表示を定期的に更新"""
+        if not self.winfo_exists():
+            return
+        data = self.diagnostics.snapshot()
+        lines = [f"{'処理':28} {'回数':>8} {'合計(ms)':>10} {'平均(ms)':>10} {'最大(ms)':>10}"]
+        for name, timer in sorted(data['timers'].items(), key=lambda item: -item[1]['total']):
+            lines.append(f"{name:28} {timer['count']:>8} {timer['total'] * 1000:>10.1f} "
+                         f"{timer['avg'] * 1000:>10.2f} {timer['max'] * 1000:>10.1f}")
         
-        # 右側のボタン
-        right_buttons = ttk.Frame(button_frame)
-        right_buttons.pack(side=tk.RIGHT)
+        stalls = data['stalls']
+        lines += ['', f"メインループ停止 (>{Diagnostics.STALL_THRESHOLD * 1000:.0f}ms): "
+                      f"{stalls['count']} 回 / 最大 {stalls['max'] * 1000:.0f}ms"]
+        if stalls['recent']:
+            lines.append('  直近: ' + ', '.join(f"{d * 1000:.0f}ms" for d in stalls['recent'][-10:]))
         
-        self.run_button = ttk.Button(right_buttons, text="▶️ コンパイル & 実行", 
-                                      command=self.run_verilog)
-        self.run_button.pack(side=tk.LEFT, padx=(0, 10))
+        if 'tracemalloc' in data:
+            memory = data['tracemalloc']
+            lines += ['', f"tracemalloc: 現在 {format_size(memory['current'])} / ピーク {format_size(memory['peak'])}"]
+            lines += [f"  {format_size(stat['size']):>10}  {stat['location']}" for stat in memory['top']]
         
-        self.clear_button = ttk.Button(right_buttons, text="🗑️ ログクリア", 
-                                        command=self.clear_log)
-        self.clear_button.pack(side=tk.LEFT)
+        self.report_text.delete(1.0, tk.END)
+        self.report_text.insert(tk.END, '\n'.join(lines))
+        self.after(1000, self.refresh)
+    
+    def export(self):
+        """計測結果をファイルに書き出す"""
+        directory = filedialog.askdirectory(parent=self, title="エクスポート先")
+        if directory:
+            paths = self.diagnostics.export(directory)
+            messagebox.showinfo("診断", "書き出しました:\n" + '\n'.join(paths), parent=self)
+
+
+class DependencyCache:
+    """依存ファイル解決のキャッシュ（ファイルの更新時刻で検証するLRU、共通モジュールの解析は1回だけ）"""
+    
+    def __init__(self, pipeline, max_entries=256):
+        self.pipeline = pipeline
+        self.max_entries = max_entries
+        # テストベンチ → (検証用の更新時刻, 依存ファイル)
+        self.closures = OrderedDict()
+        # ファイル → (検証用の更新時刻, インスタンス化しているモジュールのファイル)
+        self.references = {}
+        self._listings = {}
+        self._path_locks = {}
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+    
+    @staticmethod
+    def _stamp(path):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+    
+    def _listing(self, directory):
+        """ディレクトリ内の .v ファイル名の集合（モジュールの解決結果はこれに依存する）"""
+        stamp = self._stamp(directory)
+        with self.lock:
+            cached = self._listings.get(directory)
+        if cached and cached[0] == stamp:
+            return cached[1]
+        try:
+            names = frozenset(name for name in os.listdir(directory) if name.endswith('.v'))
+        except OSError:
+            names = frozenset()
+        with self.lock:
+            self._listings[directory] = (stamp, names)
+        return names
+    
+    def module_references(self, file_path, directory, scan):
+        """ファイルの参照モジュール（ファイルとディレクトリ内の .v が変わっていなければ前回の解析結果）"""
+        file_path = os.path.abspath(file_path)
+        stamp = (self._stamp(file_path), self._listing(directory))
+        with self.lock:
+            path_lock = self._path_locks.setdefault(file_path, threading.Lock())
+        # 同じファイルを複数のスレッドが同時に解析しないようにする
+        with path_lock:
+            cached = self.references.get(file_path)
+            if cached and cached[0] == stamp:
+                return cached[1]
+            modules = scan(file_path, directory)
+            self.references[file_path] = (stamp, modules)
+            return modules
+    
+    def _closure_stamp(self, tb_path, directory, dependencies):
+        return ((self._listing(directory), self._stamp(tb_path)) +
+                tuple(self._stamp(os.path.join(directory, dep)) for dep in sorted(dependencies)))
+    
+    def resolve(self, tb_file, directory):
+        """テストベンチの依存ファイルを返す（キャッシュが有効ならファイルを読まない）"""
+        tb_path = os.path.abspath(os.path.join(directory, tb_file))
+        with self.lock:
+            cached = self.closures.get(tb_path)
+            if cached:
+                self.closures.move_to_end(tb_path)
+        if cached and cached[0] == self._closure_stamp(tb_path, directory, cached[1]):
+            with self.lock:
+                self.hits += 1
+            return set(cached[1])
+        
+        with self.lock:
+            self.misses += 1
+        dependencies = frozenset(self.pipeline.find_dependencies(tb_file, directory))
+        stamp = self._closure_stamp(tb_path, directory, dependencies)
+        with self.lock:
+            self.closures[tb_path] = (stamp, dependencies)
+            self.closures.move_to_end(tb_path)
+            while len(self.closures) > self.max_entries:
+                self.closures.popitem(last=False)
+        return set(dependencies)
+    
+    def prefetch(self, pool, tb_paths):
+        """テストベンチの依存ファイルをスレッドプールで先に解決"""
+        return [pool.submit(self.resolve, os.path.basename(path), os.path.dirname(path)) for path in tb_paths]
+
+
+class TestbenchIndex:
+    """ワークスペース内の全テストベンチのパスを検索する索引（ファイル名の前方一致＋トライグラム）"""
+    
+    # 全体のこの割合を超えて出現するトライグラムはあいまい検索に使わない
+    COMMON_TRIGRAM_RATIO = 0.2
+    
+    def __init__(self, root_dir, paths):
+        self.root_dir = root_dir
+        # 番号は短いパス順（同じ順位なら短いパスを上位に表示する）
+        self.paths = sorted(paths, key=lambda p: (len(p), p))
+        self.lower_paths = [p.lower() for p in self.paths]
+        self.lower_names = [os.path.basename(p) for p in self.lower_paths]
+        self.name_order = sorted(range(len(self.paths)), key=self.lower_names.__getitem__)
+        self.sorted_names = [self.lower_names[n] for n in self.name_order]
+        self.trigrams = {}
+        for number, path in enumerate(self.lower_paths):
+            for trigram in {path[i:i + 3] for i in range(len(path) - 2)}:
+                postings = self.trigrams.get(trigram)
+                if postings is None:
+                    postings = self.trigrams[trigram] = array('I')
+                postings.append(number)
+    
+    @classmethod
+    def build(cls, root_dir):
+        """ディレクトリ以下の *_tb.v を収集して索引を作成"""
+        paths = []
+        for dirpath, dirnames, filenames in os.walk(root_dir):
+            dirnames[:] = [d for d in dirnames if not d.startswith('.')]
+            rel_dir = os.path.relpath(dirpath, root_dir)
+            for filename in filenames:
+                if filename.endswith('_tb.v'):
+                    paths.append(filename if rel_dir == '.' else os.path.join(rel_dir, filename))
+        return cls(root_dir, paths)
     
-    def _setup_output_frame(self, parent):
-        """出力フレームを設定"""
-        output_frame = ttk.LabelFrame(parent, text="📋 実行結果", padding="10")
-        output_frame.grid(row=3, column=0, columnspan=2, sticky=(tk.W, tk.E, tk.N, tk.S))
+    def search(self, query, limit=50):
+        """入力に合うテストベンチを順位付けして返す
         
-        self.output_text = scrolledtext.ScrolledText(
-            output_frame, height=18, width=100, 
-            font=('Menlo', 10), bg='#1e1e1e', fg='#d4d4d4',
-            insertbackground='white', relief=tk.FLAT, padx=10, pady=10
-        )
-        self.output_text.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
+        順位: ファイル名が前方一致 > ファイル名に含む > パスに含む > トライグラムが近い（入力ミス）
+        """
+        query = query.lower().strip()
+        if not query:
+            return []
+        terms = query.split()
+        first = terms[0]
+        lower_paths, lower_names = self.lower_paths, self.lower_names
         
-        # カラータグを設定
-        self.output_text.tag_config('success', foreground='#4ade80')
-        self.output_text.tag_config('error', foreground='#f87171')
-        self.output_text.tag_config('warning', foreground='#fbbf24')
-        self.output_text.tag_config('info', foreground='#60a5fa')
-        self.output_text.tag_config('header', foreground='#a78bfa', font=('Menlo', 10, 'bold'))
+        # ファイル名の前方一致（ソート済みの名前を二分探索）
+        start = bisect_left(self.sorted_names, first)
+        end = bisect_left(self.sorted_names, first + '\uffff', start)
+        prefix = sorted(self.name_order[start:end])
+        if len(terms) > 1:
+            prefix = [n for n in prefix if all(term in lower_paths[n] for term in terms[1:])]
+        ranked = prefix[:limit]
         
-        output_frame.columnconfigure(0, weight=1)
-        output_frame.rowconfigure(0, weight=1)
+        # 部分一致（最も出現の少ないトライグラムで候補を絞り、十分集まったら打ち切る）
+        if len(ranked) < limit:
+            long_terms = [t for t in terms if len(t) >= 3]
+            if long_terms:
+                candidates = min((self.trigrams.get(t[i:i + 3], ()) for t in long_terms for i in range(len(t) - 2)),
+                                 key=len)
+            else:
+                candidates = range(len(self.paths))
+            seen = set(prefix)
+            need = limit - len(ranked)
+            # 区切り文字を含む語はファイル名には現れない
+            name_possible = '/' not in first and os.sep not in first
+            in_name, in_path = [], []
+            for number in candidates:
+                path = lower_paths[number]
+                if first in path and number not in seen and all(term in path for term in terms):
+                    (in_name if name_possible and first in lower_names[number] else in_path).append(number)
+                    if len(in_name) >= need or (not name_possible and len(in_path) >= need):
+                        break
+            ranked += (in_name + in_path)[:need]
+        
+        if len(ranked) < limit and len(query) >= 3:
+            ranked += self._fuzzy_matches(query.replace(' ', ''), set(ranked), limit - len(ranked))
+        return [self.paths[n] for n in ranked]
     
-    def _configure_grid_weights(self, main_frame):
-        """グリッドの重み設定"""
-        self.root.columnconfigure(0, weight=1)
-        self.root.rowconfigure(0, weight=1)
-        main_frame.columnconfigure(0, weight=1)
-        main_frame.rowconfigure(1, weight=2)
-        main_frame.rowconfigure(3, weight=1)
+    def _fuzzy_matches(self, query, exclude, limit):
+        """共通するトライグラムの数で近いパスを探す（入力ミスの許容）"""
+        query_trigrams = {query[i:i + 3] for i in range(len(query) - 2)}
+        common_limit = max(len(self.paths) * self.COMMON_TRIGRAM_RATIO, 1)
+        counts = Counter()
+        for trigram in query_trigrams:
+            postings = self.trigrams.get(trigram)
+            if postings is not None and len(postings) <= common_limit:
+                counts.update(postings)
+        threshold = max(1, (len(query_trigrams) + 1) // 2)
+        matches = []
+        for number, count in counts.most_common():
+            if count < threshold or len(matches) >= limit:
+                break
+            if number not in exclude:
+                matches.append(number)
+        return matches
+
+
+class DependencyGraph:
+    """テストベンチからソースへの参照（モジュール・include）の逆引きグラフ"""
     
-    def browse_directory(self):
-        """ディレクトリ選択ダイアログ"""
-        directory = filedialog.askdirectory(initialdir=self.current_dir)
-        if directory:
-            self.current_dir = directory
-            self.dir_var.set(directory)
-            self.refresh_files()
+    def __init__(self, pipeline):
+        self.pipeline = pipeline
+        # 参照先の実パス → [(参照元の実パス, 参照の種類)]（シンボリックリンクを解決して git diff のパスと照合する）
+        self.referrers = {}
+        self.edges = set()
+        self.testbenches = set()
+        # 展開済みの (ファイル, モジュールを探すディレクトリ) と、その参照先（ファイルは1回だけ読む）
+        self.references = {}
     
-    def refresh_files(self):
-        """フォルダーツリーとVerilogファイルリストを更新"""
-        try:
-            directory = self.dir_var.get()
-            if not os.path.exists(directory):
-                self.log_output("エラー: 指定されたディレクトリが存在しません。\n", 'error')
-                return
-            
-            os.chdir(directory)
-            self.current_dir = directory
-            
-            self.populate_folder_tree(directory)
-            self.update_file_list(directory)
-            
-            self.log_output(f"✓ ディレクトリを更新: {directory}\n\n", 'success')
-            
-        except Exception as e:
-            self.log_output(f"エラー: {e}\n", 'error')
+    def _add_edge(self, source, target, kind):
+        if (source, target, kind) not in self.edges:
+            self.edges.add((source, target, kind))
+            self.referrers.setdefault(target, []).append((source, kind))
     
-    def populate_folder_tree(self, root_dir):
-        """フォルダーツリーを構築"""
-        for item in self.folder_tree.get_children():
-            self.folder_tree.delete(item)
-        
-        root_name = os.path.basename(root_dir) or root_dir
-        root_item = self.folder_tree.insert("", "end", text=f"📁 {root_name}", values=[root_dir], open=True)
+    def _references(self, path, directory):
+        """ファイルが参照するファイルと参照の種類（モジュールは directory から探す）"""
+        with open(path, 'r', encoding='utf-8', errors='ignore') as f:
+            content = f.read()
+        targets = [(os.path.realpath(os.path.join(directory, module_file)), 'インスタンス')
+                   for module_file in self.pipeline.referenced_modules(content, directory)]
+        for match in SOURCE_REFERENCE_PATTERN.finditer(content):
+            # include は参照元と同じディレクトリ、次にテストベンチのディレクトリから探す
+            for base in (os.path.dirname(path), directory):
+                target = os.path.normpath(os.path.join(base, match.group(1)))
+                if os.path.isfile(target):
+                    targets.append((os.path.realpath(target), 'include' if 'include' in match.group(0) else '$readmem'))
+                    break
+        return targets
+    
+    def add_testbench(self, tb_path):
+        """テストベンチから辿れるファイルを登録（他のテストベンチで展開済みのファイルは読み直さない）"""
+        directory, tb_file = os.path.split(os.path.abspath(tb_path))
+        tb_path = os.path.realpath(tb_path)
+        self.testbenches.add(tb_path)
         
-        self.add_directories_to_tree(root_item, root_dir)
+        pending = [tb_path]
+        main_module = self.pipeline.main_module_file(tb_file, directory)
+        if main_module:
+            target = os.path.realpath(os.path.join(directory, main_module))
+            self._add_edge(tb_path, target, 'メインモジュール')
+            pending.append(target)
+        while pending:
+            path = pending.pop()
+            if (path, directory) in self.references or not os.path.isfile(path):
+                continue
+            targets = self.references[(path, directory)] = self._references(path, directory)
+            for target, kind in targets:
+                self._add_edge(path, target, kind)
+                pending.append(target)
     
-    def add_directories_to_tree(self, parent_item, parent_dir):
-        """ツリーにディレクトリを再帰的に追加"""
+    def affected_testbenches(self, changed_paths):
+        """変更されたファイルから参照を逆に辿り、影響を受けるテストベンチと経路を返す（キーはテストベンチの実パス）"""
+        affected = {}
+        for changed in changed_paths:
+            changed = os.path.realpath(changed)
+            parents = {changed: None}
+            pending = deque([changed])
+            while pending:
+                path = pending.popleft()
+                if path in self.testbenches and path not in affected:
+                    chain = []
+                    node = path
+                    while node is not None:
+                        chain.append(node)
+                        node = parents[node] and parents[node][0]
+                    affected[path] = [(node, parents[node][1] if parents[node] else None)
+                                      for node in reversed(chain)]
+                for source, kind in self.referrers.get(path, ()):
+                    if source not in parents:
+                        parents[source] = (path, kind)
+                        pending.append(source)
+        return affected
+
+
+def git_changed_files(ref, directory, extensions=('.v', '.vh')):
+    """git ref 以降に変更された（未追跡を含む）ソースファイルの絶対パス（取得できなければRuntimeError）"""
+    def git(*args):
         try:
-            items = []
-            for item in os.listdir(parent_dir):
-                item_path = os.path.join(parent_dir, item)
-                if os.path.isdir(item_path) and not item.startswith('.'):
-                    if self.has_verilog_files(item_path):
-                        items.append((item, item_path))
-            
-            for item_name, item_path in sorted(items):
-                child_item = self.folder_tree.insert(parent_item, "end", text=f"📁 {item_name}", values=[item_path])
-                self.add_directories_to_tree(child_item, item_path)
-                
-        except PermissionError:
-            pass
+            result = subprocess.run(["git"] + list(args), capture_output=True, text=True, cwd=directory)
+        except OSError as e:
+            raise RuntimeError(f"gitを実行できません: {e}") from e
+        if result.returncode != 0:
+            raise RuntimeError(result.stderr.strip() or f"git {' '.join(args)} に失敗しました")
+        return result.stdout.splitlines()
     
-    def has_verilog_files(self, directory):
-        """ディレクトリ内にVerilogファイルがあるかチェック"""
-        try:
-            verilog_files = glob.glob(os.path.join(directory, "*.v"))
-            if verilog_files:
-                return True
-            
-            for item in os.listdir(directory):
-                item_path = os.path.join(directory, item)
-                if os.path.isdir(item_path) and not item.startswith('.'):
-                    if self.has_verilog_files(item_path):
-                        return True
+    top = git("rev-parse", "--show-toplevel")[0]
+    # どちらもリポジトリ全体をルートからの相対パスで取得する（ls-files はカレントディレクトリ以下しか列挙しない）
+    names = (git("diff", "--name-only", ref, "--") +
+             git("-C", top, "ls-files", "--others", "--exclude-standard"))
+    return sorted({os.path.join(top, name) for name in names if name.endswith(extensions)})
+
+
+def select_changed_testbenches(pipeline, tb_paths, ref, directory):
+    """ref 以降の変更の影響を受けるテストベンチを選び、選んだ理由をログに出力"""
+    changed = git_changed_files(ref, directory)
+    pipeline.log_output(f"🔀 {ref} 以降に変更されたソース: {len(changed)} 件\n", 'header')
+    for path in changed:
+        pipeline.log_output(f"   {os.path.relpath(path, directory)}\n", 'info')
+    
+    graph = DependencyGraph(pipeline)
+    for tb_path in tb_paths:
+        graph.add_testbench(tb_path)
+    affected = graph.affected_testbenches(changed)
+    
+    selected = [tb_path for tb_path in tb_paths if os.path.realpath(tb_path) in affected]
+    pipeline.log_output(f"🎯 影響を受けるテストベンチ: {len(selected)}/{len(tb_paths)} 件\n", 'header')
+    for tb_path in selected:
+        chain = affected[os.path.realpath(tb_path)]
+        if len(chain) == 1:
+            reason = "テストベンチ自体が変更"
+        else:
+            reason = os.path.basename(chain[0][0]) + ''.join(
+                f" ←({kind}) {os.path.basename(path)}" for path, kind in chain[1:])
+        pipeline.log_output(f"   {os.path.relpath(tb_path, directory)}: {reason}\n", 'info')
+    return selected
+
+
+class WorkerLostError(Exception):
+    """ワーカーとの通信が途絶えた（ジョブは別ワーカーで再試行する）"""
+
+
+class WorkerRejectedError(Exception):
+    """ワーカーがリクエストを拒否した（4xx。ジョブの失敗として扱い、ワーカーは使い続ける）"""
+    
+    def __init__(self, address, status, payload):
+        super().__init__(f"{address}: HTTP {status} {payload.get('error', '')}".rstrip())
+        self.status = status
+        self.payload = payload
+
+
+class MissingBlobsError(ValueError):
+    """ジョブのソースがワーカーにない（再起動や容量制限で削除された。送り直せば投入できる）"""
+    
+    def __init__(self, digests):
+        super().__init__(f"未受信のソース: {len(digests)} 件")
+        self.digests = digests
+
+
+def file_sha256(path):
+    """ファイル内容のSHA-256ハッシュを返す"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def is_safe_relative_path(path):
+    """ジョブディレクトリの外を指さない相対パスかどうか"""
+    normalized = os.path.normpath(path)
+    return (bool(path) and not os.path.isabs(normalized) and normalized not in ('.', '..') and
+            not normalized.startswith('..' + os.sep))
+
+
+def collect_source_bundle(tb_file, dep_files, directory):
+    """ジョブに同梱するソースファイル（include・メモリ初期化ファイルを含む）を収集"""
+    bundle = {}
+    pending = [tb_file] + list(dep_files)
+    
+    while pending:
+        rel_path = os.path.normpath(pending.pop())
+        if rel_path in bundle or not is_safe_relative_path(rel_path):
+            continue
+        file_path = os.path.join(directory, rel_path)
+        if not os.path.isfile(file_path):
+            continue
+        bundle[rel_path] = file_path
+        
+        if rel_path.endswith(('.v', '.vh', '.sv', '.svh')):
+            with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
+                content = f.read()
+            for match in SOURCE_REFERENCE_PATTERN.finditer(content):
+                pending.append(match.group(1))
+    
+    return bundle
+
+
+def prefix_lines(text, prefix):
+    """各行の先頭にプレフィックスを付ける"""
+    return ''.join(prefix + line for line in text.splitlines(keepends=True))
+
+
+def link_or_copy(src, dest):
+    """シンボリックリンクを作成（できなければコピー）"""
+    try:
+        os.symlink(os.path.abspath(src), dest)
+    except OSError:
+        shutil.copyfile(src, dest)
+
+
+class FanoutResult:
+    """ファンアウト実行1件分の結果"""
+    
+    def __init__(self, label, plusargs):
+        self.label = label
+        self.plusargs = plusargs
+        self.passed = False
+        self.returncode = None
+        self.elapsed = 0.0
+        self.output = ''
+        self.waveform = None
+        self.log_file = None
+
+
+def parse_seed_range(text):
+    """'1-8,12,20-22' 形式のシード指定を整数リストに変換"""
+    seeds = []
+    for part in re.split(r'[,\s]+', text.strip()):
+        if not part:
+            continue
+        match = re.fullmatch(r'(\d+)(?:-(\d+))?', part)
+        if not match:
+            raise ValueError(f"シード指定が不正です: {part} (例: 1-100 または 1,5,9)")
+        first = int(match.group(1))
+        last = int(match.group(2)) if match.group(2) else first
+        if last < first:
+            raise ValueError(f"シード範囲の終わりが始まりより小さいです: {part}")
+        seeds.extend(range(first, last + 1))
+    return seeds
+
+
+def build_fanout_runs(seeds=None, plusarg_sets=None, seed_arg='SEED'):
+    """シードとplusargセットの組み合わせから (ラベル, plusargリスト) を作成"""
+    plusarg_sets = [s.split() for s in plusarg_sets or [] if s.strip()] or [[]]
+    seed_items = [(f"seed{seed}", [f"+{seed_arg}={seed}"]) for seed in seeds or []] or [(None, [])]
+    
+    runs = []
+    for set_index, plusargs in enumerate(plusarg_sets):
+        for seed_label, seed_args in seed_items:
+            labels = [seed_label] if seed_label else []
+            if len(plusarg_sets) > 1:
+                labels.append(f"args{set_index}")
+            runs.append(('_'.join(labels) or 'run0', seed_args + plusargs))
+    return runs
+
+
+class SimulationJob:
+    """1本のテストベンチのコンパイル・実行ジョブ"""
+    
+    def __init__(self, tb_file, dep_files, directory):
+        self.tb_file = tb_file
+        self.dep_files = list(dep_files)
+        self.directory = directory
+        self.name = tb_file.replace('_tb.v', '')
+        self.status = 'pending'
+        self.attempts = 0
+        self.elapsed = None
+        # シミュレーターのバックエンド（Noneなら既定）
+        self.backend = None
+        self.threads = None
+        # スケジューリング用の見積もり時間と優先度（小さいほど先に実行）
+        self.estimate = None
+        self.estimated_from = None
+        self.priority = None
+        self.started = None
+        # 分散実行時の実行先
+        self.client = None
+        self.job_id = None
+        self.artifacts = []
+
+
+class _WorkerJob(VerilogPipeline):
+    """ワーカー上で実行中のジョブ（出力をバッファに蓄積）"""
+    
+    def __init__(self, job_id, spec, directory):
+        self.job_id = job_id
+        self.spec = spec
+        self.directory = directory
+        self.status = 'queued'
+        self.artifacts = []
+        self.chunks = []
+        self.lock = threading.Lock()
+    
+    def log_output(self, text, tag=None):
+        """出力をバッファに追加"""
+        with self.lock:
+            self.chunks.append((text, tag))
+    
+    def snapshot(self, offset):
+        """offset以降の出力と現在の状態を返す"""
+        with self.lock:
+            return {
+                'status': self.status,
+                'chunks': self.chunks[offset:],
+                'offset': len(self.chunks),
+                'artifacts': self.artifacts,
+            }
+
+
+class SimulationWorker:
+    """ジョブサーバーのワーカー: 受け取ったソースバンドルをコンパイル・実行する"""
+    
+    def __init__(self, work_dir, slots, token, keep_jobs=100, blob_cache=DEFAULT_BLOB_CACHE):
+        self.work_dir = work_dir
+        self.token = token
+        self.blob_dir = os.path.join(work_dir, 'blobs')
+        self.jobs_dir = os.path.join(work_dir, 'jobs')
+        os.makedirs(self.blob_dir, exist_ok=True)
+        os.makedirs(self.jobs_dir, exist_ok=True)
+        self.slots = slots
+        self.keep_jobs = keep_jobs
+        self.jobs = {}
+        self.lock = threading.Lock()
+        self.semaphore = threading.Semaphore(slots)
+        # 受信済みソースの合計サイズ（上限を超えたら使われていない古いものから削除）
+        self.blob_cache = blob_cache
+        self.blob_lock = threading.Lock()
+        self.blob_bytes = sum(size for _, size, _ in self._blob_entries())
+    
+    def info(self):
+        """ワーカーの状態を返す"""
+        with self.lock:
+            running = sum(1 for job in self.jobs.values() if job.status == 'running')
+            return {'slots': self.slots, 'running': running, 'jobs': len(self.jobs)}
+    
+    def _blob_path(self, digest):
+        return os.path.join(self.blob_dir, digest)
+    
+    def _has_blob(self, digest):
+        """受信済みか（使われたソースは更新時刻を進め、容量制限で削除されにくくする）"""
+        if not isinstance(digest, str) or not BLOB_DIGEST_PATTERN.match(digest):
             return False
-        except (PermissionError, OSError):
+        try:
+            os.utime(self._blob_path(digest))
+            return True
+        except OSError:
             return False
     
-    def on_folder_select(self, event):
-        """フォルダー選択時のイベントハンドラ"""
-        selection = self.folder_tree.selection()
-        if selection:
-            item = selection[0]
-            folder_path = self.folder_tree.item(item, "values")[0]
-            self.update_file_list(folder_path)
+    def missing_blobs(self, digests):
+        """未受信のソース（内容ハッシュ）を返す"""
+        return [d for d in digests if not self._has_blob(d)]
     
-    def update_file_list(self, directory):
-        """指定ディレクトリのテストベンチファイルリストを更新"""
-        try:
-            self.tb_listbox.delete(0, tk.END)
-            self.selected_directory = directory
-            
-            # テストベンチファイルを検索
-            pattern = os.path.join(directory, "*_tb.v")
-            tb_files = glob.glob(pattern)
-            
-            for file_path in sorted(tb_files):
-                file_name = os.path.basename(file_path)
-                display_text = f"🧪 {file_name}"
-                self.tb_listbox.insert(tk.END, display_text)
-            
-            # 依存ファイルリストをクリア
-            self.clear_dependency_list()
-            
-        except Exception as e:
-            self.log_output(f"ファイルリスト更新エラー: {e}\n", 'error')
+    def store_blob(self, digest, data):
+        """ソースを内容ハッシュで保存"""
+        if hashlib.sha256(data).hexdigest() != digest:
+            raise ValueError(f"ハッシュ不一致: {digest}")
+        path = self._blob_path(digest)
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        with self.blob_lock:
+            if not os.path.exists(path):
+                self.blob_bytes += len(data)
+            os.replace(tmp_path, path)
+        self._prune_blobs()
     
-    def on_testbench_select(self, event):
-        """テストベンチ選択時のイベントハンドラ"""
-        selection = self.tb_listbox.curselection()
-        if not selection:
+    def _blob_entries(self):
+        """受信済みソースの (更新時刻, サイズ, ハッシュ) の一覧"""
+        entries = []
+        for entry in os.scandir(self.blob_dir):
+            if not BLOB_DIGEST_PATTERN.match(entry.name):
+                continue
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry.name))
+        return entries
+    
+    def _prune_blobs(self):
+        """合計サイズが上限を超えたら、実行待ち・実行中のジョブが使っていないソースを古い順に削除"""
+        if not self.blob_cache or self.blob_bytes <= self.blob_cache:
             return
+        with self.blob_lock:
+            with self.lock:
+                in_use = {digest for job in self.jobs.values() if job.status in ('queued', 'running')
+                          for digest in job.spec.get('files', {}).values()}
+            entries = sorted(self._blob_entries())
+            self.blob_bytes = sum(size for _, size, _ in entries)
+            for _, size, digest in entries:
+                if self.blob_bytes <= self.blob_cache:
+                    break
+                if digest in in_use:
+                    continue
+                try:
+                    os.remove(self._blob_path(digest))
+                except OSError:
+                    continue
+                self.blob_bytes -= size
+    
+    def authorized(self, token):
+        """リクエストのトークンがワーカーのトークンと一致するか"""
+        return bool(token) and hmac.compare_digest(token.encode('utf-8'), self.token.encode('utf-8'))
+    
+    def submit(self, spec):
+        """ジョブを受け付けてバックグラウンドで実行"""
+        files = spec.get('files', {})
+        if not isinstance(files, dict):
+            raise ValueError("不正なソースバンドル")
+        for rel_path, digest in files.items():
+            if not is_safe_relative_path(rel_path):
+                raise ValueError(f"不正なパス: {rel_path}")
+            if not isinstance(digest, str) or not BLOB_DIGEST_PATTERN.match(digest):
+                raise ValueError(f"不正なハッシュ: {rel_path}")
+        # コンパイラに渡すファイルはバンドル内の相対パスに限り、出力名にパスを含めない
+        for rel_path in [spec.get('tb_file')] + list(spec.get('dep_files', [])):
+            if (not isinstance(rel_path, str) or not is_safe_relative_path(rel_path) or
+                    os.path.normpath(rel_path) not in files):
+                raise ValueError(f"ソースバンドルにないファイル: {rel_path}")
+        name = spec.get('name')
+        if (not isinstance(name, str) or name in ('', '.', '..') or
+                any(sep in name for sep in ('/', '\\', os.sep))):
+            raise ValueError(f"不正なジョブ名: {name}")
         
-        selected_text = self.tb_listbox.get(selection[0])
-        tb_file = selected_text.replace('🧪 ', '')
+        job_id = uuid.uuid4().hex
+        job = _WorkerJob(job_id, spec, os.path.join(self.jobs_dir, job_id))
+        # 確認から登録までの間にソースが削除されないようにする
+        with self.blob_lock:
+            missing = sorted(set(self.missing_blobs(files.values())))
+            if missing:
+                raise MissingBlobsError(missing)
+            with self.lock:
+                self.jobs[job_id] = job
+        self._prune_jobs()
         
-        if self.auto_detect_var.get():
-            self.detect_dependencies(tb_file)
+        threading.Thread(target=self._run_job, args=(job,), daemon=True).start()
+        return job_id
+    
+    def _run_job(self, job):
+        """ソースを展開してコンパイル・シミュレーションを実行"""
+        with self.semaphore:
+            job.status = 'running'
+            spec = job.spec
+            try:
+                for rel_path, digest in spec['files'].items():
+                    dest = os.path.join(job.directory, rel_path)
+                    os.makedirs(os.path.dirname(dest), exist_ok=True)
+                    shutil.copyfile(self._blob_path(digest), dest)
+                
+                name = spec['name']
+                job.dump_control = DumpControl.from_dict(spec.get('dump_control'))
+                backend = create_backend(spec.get('backend'), spec.get('threads'))
+                passed = (backend.compile(job, name, spec['tb_file'], spec['dep_files'], job.directory) and
+                          backend.simulate(job, name, job.directory))
+                backend.cleanup(job, name, job.directory)
+                
+                artifacts = []
+                for dirpath, _, filenames in os.walk(job.directory):
+                    for filename in filenames:
+                        rel_path = os.path.relpath(os.path.join(dirpath, filename), job.directory)
+                        if rel_path not in spec['files']:
+                            artifacts.append(rel_path)
+                job.artifacts = sorted(artifacts)
+                job.status = 'passed' if passed else 'failed'
+            except Exception as e:
+                job.log_output(f"❌ ワーカーでの実行エラー: {e}\n", 'error')
+                job.status = 'failed'
+    
+    def _prune_jobs(self):
+        """古い完了済みジョブを削除"""
+        with self.lock:
+            finished = [job for job in self.jobs.values() if job.status in ('passed', 'failed')]
+            excess = len(self.jobs) - self.keep_jobs
+            for job in finished[:max(excess, 0)]:
+                del self.jobs[job.job_id]
+                shutil.rmtree(job.directory, ignore_errors=True)
+    
+    def artifact_path(self, job_id, name):
+        """成果物のパスを返す（存在しなければNone）"""
+        job = self.jobs.get(job_id)
+        if job is None or name not in job.artifacts:
+            return None
+        return os.path.join(job.directory, name)
+    
+    def create_server(self, host, port):
+        """HTTPジョブサーバーを作成"""
+        server = ThreadingHTTPServer((host, port), _WorkerRequestHandler)
+        server.daemon_threads = True
+        server.worker = self
+        return server
+
+
+class _WorkerRequestHandler(BaseHTTPRequestHandler):
+    """ワーカーのHTTPリクエストを処理"""
+    
+    protocol_version = 'HTTP/1.1'
+    
+    def log_message(self, format, *args):
+        pass
+    
+    def _route(self):
+        parsed = urllib.parse.urlsplit(self.path)
+        parts = [urllib.parse.unquote(p) for p in parsed.path.split('/') if p]
+        return parts, urllib.parse.parse_qs(parsed.query)
+    
+    def _read_body(self):
+        length = int(self.headers.get('Content-Length', 0))
+        return self.rfile.read(length)
+    
+    def _authorize(self):
+        """トークンを確認し、一致しなければ401を返す"""
+        if self.server.worker.authorized(self.headers.get(WORKER_TOKEN_HEADER)):
+            return True
+        self._read_body()
+        self._send_json({'error': 'unauthorized'}, 401)
+        return False
+    
+    def _send_json(self, payload, status=200):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def do_GET(self):
+        if not self._authorize():
+            return
+        worker = self.server.worker
+        parts, query = self._route()
+        
+        if parts == ['info']:
+            self._send_json(worker.info())
+        elif len(parts) == 2 and parts[0] == 'jobs':
+            job = worker.jobs.get(parts[1])
+            if job is None:
+                self._send_json({'error': 'job not found'}, 404)
+                return
+            offset = int(query.get('offset', ['0'])[0])
+            self._send_json(job.snapshot(offset))
+        elif len(parts) >= 4 and parts[0] == 'jobs' and parts[2] == 'artifacts':
+            path = worker.artifact_path(parts[1], os.path.join(*parts[3:]))
+            if path is None or not os.path.isfile(path):
+                self._send_json({'error': 'artifact not found'}, 404)
+                return
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/octet-stream')
+            self.send_header('Content-Length', str(os.path.getsize(path)))
+            self.end_headers()
+            with open(path, 'rb') as f:
+                shutil.copyfileobj(f, self.wfile)
         else:
-            self.update_dependency_list(tb_file)
+            self._send_json({'error': 'not found'}, 404)
     
-    def detect_dependencies(self, tb_file):
-        """テストベンチファイルから依存ファイルを自動検出"""
-        tb_path = os.path.join(self.selected_directory, tb_file)
-        dependencies = set()
+    def do_POST(self):
+        if not self._authorize():
+            return
+        worker = self.server.worker
+        parts, _ = self._route()
         
         try:
-            with open(tb_path, 'r', encoding='utf-8', errors='ignore') as f:
-                content = f.read()
-                
-            # Verilog予約語リスト
-            reserved_words = {
-                'module', 'endmodule', 'initial', 'always', 'assign', 'wire', 'reg', 
-                'integer', 'input', 'output', 'inout', 'parameter', 'localparam',
-                'begin', 'end', 'if', 'else', 'case', 'casex', 'casez', 'default',
-                'for', 'while', 'repeat', 'forever', 'task', 'function', 'and', 'or',
-                'not', 'nand', 'nor', 'xor', 'xnor', 'buf', 'bufif0', 'bufif1',
-                'notif0', 'notif1', 'posedge', 'negedge'
-            }
-            
-            # モジュールインスタンス化を検索（より柔軟なパターン）
-            # パターン: モジュール名 インスタンス名 (
-            module_pattern = r'^\s*(\w+)\s+(\w+)\s*\('
-            matches = re.finditer(module_pattern, content, re.MULTILINE)
-            
-            for match in matches:
-                module_name = match.group(1)
-                # 予約語を除外
-                if module_name.lower() not in reserved_words:
-                    module_file = f"{module_name}.v"
-                    module_path = os.path.join(self.selected_directory, module_file)
-                    if os.path.exists(module_path):
-                        dependencies.add(module_file)
-            
-            # メインモジュールファイルを追加（テストベンチと同じ名前から_tbを除いたもの）
-            main_module = tb_file.replace('_tb.v', '.v')
-            main_path = os.path.join(self.selected_directory, main_module)
-            if os.path.exists(main_path):
-                dependencies.add(main_module)
-            
-            # add1.vの依存関係を再帰的に検出
-            self.detect_nested_dependencies(dependencies, self.selected_directory)
-            
-            self.update_dependency_list(tb_file, list(dependencies))
-            
-        except Exception as e:
-            self.log_output(f"依存ファイル検出エラー: {e}\n", 'error')
-            self.update_dependency_list(tb_file)
+            payload = json.loads(self._read_body() or b'{}')
+            if parts == ['blobs', 'missing']:
+                self._send_json({'missing': worker.missing_blobs(payload.get('hashes', []))})
+            elif parts == ['jobs']:
+                self._send_json({'job_id': worker.submit(payload)})
+            else:
+                self._send_json({'error': 'not found'}, 404)
+        except MissingBlobsError as e:
+            self._send_json({'error': str(e), 'missing': e.digests}, 409)
+        except (ValueError, KeyError) as e:
+            self._send_json({'error': str(e)}, 400)
+    
+    def do_PUT(self):
+        if not self._authorize():
+            return
+        worker = self.server.worker
+        parts, _ = self._route()
+        
+        if len(parts) == 2 and parts[0] == 'blobs':
+            try:
+                worker.store_blob(parts[1], self._read_body())
+                self._send_json({'stored': parts[1]})
+            except ValueError as e:
+                self._send_json({'error': str(e)}, 400)
+        else:
+            self._send_json({'error': 'not found'}, 404)
+
+
+class WorkerClient:
+    """ワーカーのHTTPジョブサーバーへのクライアント"""
+    
+    def __init__(self, address, token, timeout=30):
+        self.address = address
+        self.token = token
+        self.base_url = f"http://{address}"
+        self.timeout = timeout
+        self.known_blobs = set()
+        self.lost = False
+    
+    def _open(self, method, path, data=None, payload=None):
+        headers = {WORKER_TOKEN_HEADER: self.token}
+        if payload is not None:
+            data = json.dumps(payload).encode('utf-8')
+            headers['Content-Type'] = 'application/json'
+        request = urllib.request.Request(self.base_url + path, data=data, method=method, headers=headers)
+        try:
+            return urllib.request.urlopen(request, timeout=self.timeout)
+        except urllib.error.HTTPError as e:
+            if 400 <= e.code < 500:
+                raise WorkerRejectedError(self.address, e.code, self._error_payload(e)) from e
+            raise WorkerLostError(f"{self.address}: {e}") from e
+        except OSError as e:
+            raise WorkerLostError(f"{self.address}: {e}") from e
+    
+    def _error_payload(self, error):
+        """エラー応答の本文（JSONでなければ空）"""
+        try:
+            payload = json.loads(error.read() or b'{}')
+        except (OSError, ValueError):
+            return {}
+        return payload if isinstance(payload, dict) else {}
+    
+    def _request(self, method, path, data=None, payload=None):
+        try:
+            with self._open(method, path, data, payload) as response:
+                return json.loads(response.read() or b'{}')
+        except (OSError, ValueError) as e:
+            raise WorkerLostError(f"{self.address}: {e}") from e
+    
+    def info(self):
+        """ワーカーのスロット数などを取得"""
+        return self._request('GET', '/info')
+    
+    def upload_bundle(self, bundle, hash_file=file_sha256):
+        """ソースバンドルを送信（内容ハッシュで重複排除）し、パス→ハッシュを返す"""
+        files = {rel_path: hash_file(path) for rel_path, path in bundle.items()}
+        unknown = sorted(set(files.values()) - self.known_blobs)
+        if unknown:
+            missing = set(self._request('POST', '/blobs/missing', payload={'hashes': unknown})['missing'])
+            for rel_path, digest in files.items():
+                if digest in missing:
+                    with open(bundle[rel_path], 'rb') as f:
+                        self._request('PUT', f"/blobs/{digest}", data=f.read())
+                    missing.discard(digest)
+            self.known_blobs.update(unknown)
+        return files
+    
+    def submit(self, spec, bundle=None, hash_file=file_sha256):
+        """ジョブを投入してジョブIDを返す（ワーカーがソースを失っていればバンドルを送り直す）"""
+        try:
+            return self._request('POST', '/jobs', payload=spec)['job_id']
+        except WorkerRejectedError as e:
+            if e.status != 409 or bundle is None:
+                raise
+        # ワーカーの再起動や容量制限で消えたソースは送信済みとみなさない
+        self.known_blobs.clear()
+        spec = dict(spec, files=self.upload_bundle(bundle, hash_file))
+        return self._request('POST', '/jobs', payload=spec)['job_id']
+    
+    def poll(self, job_id, offset):
+        """offset以降の出力と状態を取得"""
+        return self._request('GET', f"/jobs/{job_id}?offset={offset}")
+    
+    def fetch_artifact(self, job_id, name, dest_path):
+        """成果物をダウンロード"""
+        quoted = urllib.parse.quote(name.replace(os.sep, '/'))
+        try:
+            with self._open('GET', f"/jobs/{job_id}/artifacts/{quoted}") as response:
+                with open(dest_path, 'wb') as f:
+                    shutil.copyfileobj(response, f)
+        except OSError as e:
+            raise WorkerLostError(f"{self.address}: {e}") from e
+        return dest_path
+
+
+_local_worker_lock = threading.Lock()
+_local_worker_address = None
+_session_token = secrets.token_urlsafe(24)
+
+
+def worker_token(token=None):
+    """ワーカーとの通信に使うトークン（指定がなければ環境変数、なければこのプロセス用の乱数）"""
+    return token or os.environ.get(WORKER_TOKEN_ENV) or _session_token
+
+
+def start_local_worker(slots=None, token=None):
+    """同一マシン上のループバックワーカーを起動（初回のみ）してアドレスを返す"""
+    global _local_worker_address
+    with _local_worker_lock:
+        if _local_worker_address is None:
+            work_dir = tempfile.mkdtemp(prefix='verilog_worker_')
+            worker = SimulationWorker(work_dir, slots or os.cpu_count() or 1, worker_token(token))
+            server = worker.create_server('127.0.0.1', 0)
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            _local_worker_address = f"127.0.0.1:{server.server_address[1]}"
+        return _local_worker_address
+
+
+def parse_worker_list(text, token=None):
+    """'host:port, local' 形式のワーカー指定をアドレスのリストに変換"""
+    addresses = []
+    for item in re.split(r'[,\s]+', text.strip()):
+        if not item:
+            continue
+        if item == 'local':
+            addresses.append(start_local_worker(token=token))
+        elif ':' in item:
+            addresses.append(item)
+        else:
+            addresses.append(f"{item}:{DEFAULT_WORKER_PORT}")
+    return addresses
+
+
+class JobCoordinator:
+    """ジョブを複数ワーカーへ分配し、出力と状態を集約する"""
     
-    def detect_nested_dependencies(self, dependencies, directory):
-        """依存ファイルの中からさらに依存ファイルを再帰的に検出"""
-        # Verilog予約語リスト
-        reserved_words = {
-            'module', 'endmodule', 'initial', 'always', 'assign', 'wire', 'reg', 
-            'integer', 'input', 'output', 'inout', 'parameter', 'localparam',
-            'begin', 'end', 'if', 'else', 'case', 'casex', 'casez', 'default',
-            'for', 'while', 'repeat', 'forever', 'task', 'function', 'and', 'or',
-            'not', 'nand', 'nor', 'xor', 'xnor', 'buf', 'bufif0', 'bufif1',
-            'notif0', 'notif1', 'posedge', 'negedge'
-        }
-        
-        files_to_check = list(dependencies)
-        checked_files = set()
+    def __init__(self, addresses, log_output, max_retries=2, poll_interval=0.2, dump_control=None,
+                 progress=None, token=None, job_timeout=DEFAULT_JOB_TIMEOUT):
+        self.clients = [WorkerClient(address, worker_token(token)) for address in addresses]
+        self.dump_control = dump_control
+        self.progress = progress
+        self.log_output = log_output
+        self.max_retries = max_retries
+        self.poll_interval = poll_interval
+        # 実行開始から完了までの上限（秒、Noneなら無制限）
+        self.job_timeout = job_timeout
+        self._hash_cache = {}
+        self._lock = threading.Lock()
+        self._remaining = 0
+        self._done = threading.Event()
+    
+    def _hash_file(self, path):
+        """(パス, 更新時刻, サイズ) 単位でハッシュをキャッシュ"""
+        stat = os.stat(path)
+        key = (path, stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            digest = self._hash_cache.get(key)
+        if digest is None:
+            digest = file_sha256(path)
+            with self._lock:
+                self._hash_cache[key] = digest
+        return digest
+    
+    def run(self, jobs):
+        """全ジョブを実行し、完了まで待つ"""
+        # 見積もり時間の長いジョブから空いたスロットへ割り当てる（再試行も優先度を保つ）
+        pending = queue.PriorityQueue()
+        for index, job in enumerate(jobs):
+            pending.put((job.priority or (0, index), index, job))
+        self._remaining = len(jobs)
+        self._done.clear()
+        self._prefix_output = len(jobs) > 1
         
-        while files_to_check:
-            current_file = files_to_check.pop(0)
-            if current_file in checked_files:
+        capacity = []
+        for client in self.clients:
+            try:
+                slots = client.info()['slots']
+            except (WorkerLostError, WorkerRejectedError) as e:
+                self.log_output(f"⚠️  ワーカーに接続できません: {e}\n", 'warning')
                 continue
-            checked_files.add(current_file)
-            
-            file_path = os.path.join(directory, current_file)
-            if not os.path.exists(file_path):
+            self.log_output(f"🌐 ワーカー {client.address} ({slots} スロット)\n", 'info')
+            capacity.extend([client] * slots)
+        if self.progress:
+            self.progress.slots = max(len(capacity), 1)
+            self.progress.report_plan()
+        
+        threads = []
+        for client in capacity:
+            thread = threading.Thread(target=self._worker_loop, args=(client, pending), daemon=True)
+            thread.start()
+            threads.append(thread)
+        
+        if not threads:
+            self.log_output("❌ エラー: 利用可能なワーカーがありません。\n", 'error')
+        for thread in threads:
+            thread.join()
+        
+        # 全ワーカーを失って残ったジョブ
+        while not pending.empty():
+            _, _, job = pending.get_nowait()
+            job.status = 'error'
+        return jobs
+    
+    def _worker_loop(self, client, pending):
+        """1スロット分のジョブ取得・実行ループ"""
+        while not self._done.is_set() and not client.lost:
+            try:
+                entry = pending.get(timeout=self.poll_interval)
+            except queue.Empty:
                 continue
-            
+            job = entry[2]
+            if client.lost:
+                # 別スロットでワーカー喪失を検知済み
+                pending.put(entry)
+                break
+
+            job.attempts += 1
+            if self.progress:
+                self.progress.start(job)
             try:
-                with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                    content = f.read()
-                
-                # モジュールインスタンス化を検索
-                module_pattern = r'^\s*(\w+)\s+(\w+)\s*\('
-                matches = re.finditer(module_pattern, content, re.MULTILINE)
-                
-                for match in matches:
-                    module_name = match.group(1)
-                    if module_name.lower() not in reserved_words:
-                        module_file = f"{module_name}.v"
-                        module_path = os.path.join(directory, module_file)
-                        if os.path.exists(module_path) and module_file not in dependencies:
-                            dependencies.add(module_file)
-                            files_to_check.append(module_file)
-            except Exception:
-                pass
+                self._execute(client, job)
+            except WorkerLostError as e:
+                client.lost = True
+                self.log_output(f"⚠️  ワーカー喪失: {e}\n", 'warning')
+                if job.attempts <= self.max_retries:
+                    self.log_output(f"🔁 {job.name} を再試行します ({job.attempts}/{self.max_retries})\n", 'warning')
+                    pending.put(entry)
+                    continue
+                job.status = 'error'
+            except WorkerRejectedError as e:
+                # ジョブ自体の問題なのでワーカーは使い続ける
+                self.log_output(f"❌ {job.name} はワーカーに受け付けられませんでした: {e}\n", 'error')
+                job.status = 'error'
+            if self.progress:
+                self.progress.finish(job)
+            
+            with self._lock:
+                self._remaining -= 1
+                if self._remaining == 0:
+                    self._done.set()
     
-    def update_dependency_list(self, tb_file, auto_detected=None):
-        """依存ファイルリストを更新"""
-        self.clear_dependency_list()
+    def _execute(self, client, job):
+        """ジョブをワーカーに送り、出力をストリーミングで受け取る"""
+        start = time.time()
+        bundle = collect_source_bundle(job.tb_file, job.dep_files, job.directory)
+        files = client.upload_bundle(bundle, self._hash_file)
+        job.job_id = client.submit({
+            'name': job.name,
+            'tb_file': job.tb_file,
+            'dep_files': job.dep_files,
+            'files': files,
+            'dump_control': self.dump_control.to_dict() if self.dump_control else None,
+            'backend': job.backend,
+            'threads': job.threads,
+        }, bundle, self._hash_file)
+        job.client = client
         
-        # 全てのVerilogファイルを取得（テストベンチを除く）
-        pattern = os.path.join(self.selected_directory, "*.v")
-        all_files = [os.path.basename(f) for f in glob.glob(pattern) 
-                     if not f.endswith('_tb.v')]
+        prefix = f"[{job.name}@{client.address}] " if self._prefix_output else ''
+        offset = 0
+        deadline = None
+        while True:
+            state = client.poll(job.job_id, offset)
+            for text, tag in state['chunks']:
+                self.log_output(prefix_lines(text, prefix) if prefix else text, tag)
+            offset = state['offset']
+            if state['status'] in ('passed', 'failed'):
+                break
+            if state['status'] == 'running' and deadline is None and self.job_timeout:
+                deadline = time.time() + self.job_timeout
+            if deadline is not None and time.time() > deadline:
+                # ワーカー側のプロセスは止められないため、結果を待たずにこのスロットを解放する
+                self.log_output(f"❌ {job.name} が {format_duration(self.job_timeout)} 以内に完了しませんでした "
+                                f"({client.address})\n", 'error')
+                job.status = 'error'
+                job.elapsed = time.time() - start
+                return
+            time.sleep(self.poll_interval)
         
-        for file_name in sorted(all_files):
-            var = tk.BooleanVar()
-            
-            # 自動検出されたファイルはチェック
-            if auto_detected and file_name in auto_detected:
-                var.set(True)
-            
-            cb = ttk.Checkbutton(
-                self.dep_checkbutton_frame,
-                text=f"  📄 {file_name}",
-                variable=var,
-                onvalue=True,
-                offvalue=False
-            )
-            cb.pack(anchor=tk.W, padx=5, pady=2)
-            
-            self.dep_vars.append(var)
-            self.dep_files.append(file_name)
+        job.status = state['status']
+        job.artifacts = state['artifacts']
+        job.elapsed = time.time() - start
     
-    def clear_dependency_list(self):
-        """依存ファイルリストをクリア"""
-        for widget in self.dep_checkbutton_frame.winfo_children():
-            widget.destroy()
-        self.dep_vars.clear()
-        self.dep_files.clear()
+    def fetch_artifact(self, job, name, dest_dir):
+        """ジョブの成果物を必要に応じてローカルへ取得"""
+        dest_path = os.path.join(dest_dir, name)
+        job.client.fetch_artifact(job.job_id, name, dest_path)
+        self.log_output(f"📥 成果物を取得: {name} ({job.client.address})\n", 'info')
+        return dest_path
+
+
+def job_source_size(job):
+    """テストベンチと依存ファイルの合計サイズ"""
+    total = 0
+    for rel_path in [job.tb_file] + job.dep_files:
+        try:
+            total += os.path.getsize(os.path.join(job.directory, rel_path))
+        except OSError:
+            pass
+    return total
+
+
+def estimate_job_durations(jobs, history=None):
+    """実行記録からジョブの所要時間を見積もり、長いものから実行する優先度を設定"""
+    sizes = {id(job): job_source_size(job) for job in jobs}
+    known = {}
+    for job in jobs if history is not None else ():
+        durations = history.get(os.path.join(job.directory, job.tb_file)).get('durations')
+        if durations:
+            known[id(job)] = statistics.median(durations)
     
-    def select_all_deps(self):
-        """すべての依存ファイルを選択"""
-        for var in self.dep_vars:
-            var.set(True)
+    # 記録のないテストベンチは、記録のあるテストベンチのソース1バイトあたりの時間から推定
+    rates = [known[id(job)] / sizes[id(job)] for job in jobs if id(job) in known and sizes[id(job)]]
+    rate = statistics.median(rates) if rates else None
+    fallback = statistics.median(known.values()) if known else DEFAULT_TESTBENCH_ESTIMATE
     
-    def deselect_all_deps(self):
-        """すべての依存ファイルを解除"""
-        for var in self.dep_vars:
-            var.set(False)
+    for index, job in enumerate(jobs):
+        if id(job) in known:
+            job.estimate, job.estimated_from = known[id(job)], 'history'
+        elif rate is not None and sizes[id(job)]:
+            job.estimate, job.estimated_from = rate * sizes[id(job)], 'size'
+        else:
+            job.estimate, job.estimated_from = fallback, 'default'
+        # 見積もりが同じならソースの大きいものを先に
+        job.priority = (-job.estimate, -sizes[id(job)], index)
+    return sorted(jobs, key=lambda job: job.priority)
+
+
+def _partition_longest_first(weighted, count):
+    """(重み, ジョブ) を順に、重みの合計が最も小さいシャードへ割り当てる（重みの大きい順に渡すとLPT）"""
+    shards = [[] for _ in range(count)]
+    loads = [(0, index) for index in range(count)]
+    for weight, job in weighted:
+        load, index = heapq.heappop(loads)
+        shards[index].append(job)
+        heapq.heappush(loads, (load + weight, index))
+    return shards
+
+
+def plan_shards(jobs, count):
+    """見積もり時間の合計が均等になるようにジョブをN個のシャードに分割（LPT）"""
+    return _partition_longest_first([(job.estimate, job) for job in sorted(jobs, key=lambda job: job.priority)],
+                                     count)
+
+
+def size_shards(jobs, count, root):
+    """ソースサイズ（依存ファイルを含む）の合計が均等になるようにN個のシャードに分割（LPT）
     
-    def on_auto_detect_toggle(self):
-        """自動検出トグル時の処理"""
-        selection = self.tb_listbox.curselection()
-        if selection:
-            self.on_testbench_select(None)
+    実行記録を共有しないCIノードでも同じチェックアウトなら同じ割り当てになるよう、
+    同じサイズのものはテストベンチのパス（root からの相対）のハッシュ順に並べる
+    """
+    keyed = []
+    for job in jobs:
+        relative = os.path.relpath(os.path.join(job.directory, job.tb_file), root).replace(os.sep, '/')
+        keyed.append((-job_source_size(job), zlib.crc32(relative.encode('utf-8')), relative, job))
+    keyed.sort(key=lambda item: item[:3])
+    return _partition_longest_first([(-size, job) for size, _, _, job in keyed], count)
+
+
+def projected_makespan(durations, slots, busy=()):
+    """残りのジョブを空いたスロットへ長い順に割り当てたときの完了までの時間"""
+    loads = list(busy) + [0.0] * max(slots - len(busy), 0)
+    if not loads:
+        return 0.0
+    heapq.heapify(loads)
+    for duration in sorted(durations, reverse=True):
+        heapq.heapreplace(loads, loads[0] + duration)
+    return max(loads)
+
+
+def parse_shard(text):
+    """'K/N' 形式のシャード指定を (K, N) に変換"""
+    match = re.fullmatch(r'\s*(\d+)\s*/\s*(\d+)\s*', text)
+    if not match or not 1 <= int(match.group(1)) <= int(match.group(2)):
+        raise ValueError(f"シャード指定が不正です: {text}")
+    return int(match.group(1)), int(match.group(2))
+
+
+class ScheduleProgress:
+    """ジョブの完了ごとに実行記録を更新し、完了予定時刻を表示"""
     
-    def get_selected_files(self):
-        """選択されたテストベンチと依存ファイルを取得"""
-        tb_selection = self.tb_listbox.curselection()
-        if not tb_selection:
-            return None, None, None
-        
-        selected_text = self.tb_listbox.get(tb_selection[0])
-        tb_file = selected_text.replace('🧪 ', '')
+    def __init__(self, jobs, log_output, slots=1, history=None):
+        self.jobs = jobs
+        self.log_output = log_output
+        self.slots = slots
+        # 所要時間を記録する実行記録（Noneなら記録しない）
+        self.history = history
+        self.running = set()
+        self.finished = 0
+        self.lock = threading.Lock()
+    
+    def start(self, job):
+        with self.lock:
+            job.started = time.time()
+            self.running.add(job)
+    
+    def finish(self, job):
+        """所要時間を記録し、残りの見積もりから完了予定を更新"""
+        now = time.time()
+        with self.lock:
+            self.running.discard(job)
+            self.finished += 1
+            busy = [max((running.estimate or 0) - (now - running.started), 0) for running in self.running]
+            queued = [queued.estimate or 0 for queued in self.jobs if queued.started is None]
+            remaining = projected_makespan(queued, self.slots, busy)
+            done = self.finished
         
-        # 選択された依存ファイルを取得
-        dep_files = [self.dep_files[i] for i, var in enumerate(self.dep_vars) if var.get()]
+        if job.status in ('passed', 'failed') and job.elapsed is not None and self.history is not None:
+            tb_path = os.path.join(job.directory, job.tb_file)
+            durations = self.history.get(tb_path).get('durations', [])
+            self.history.update(tb_path, durations=(durations + [job.elapsed])[-DURATION_HISTORY_LENGTH:])
         
-        return tb_file, dep_files, self.selected_directory
+        finish_at = time.strftime('%H:%M:%S', time.localtime(now + remaining))
+        self.log_output(f"⏱️  {done}/{len(self.jobs)} 件完了 — 残り見込み {format_duration(remaining)} "
+                        f"(完了予定 {finish_at})\n", 'info')
     
-    def run_iverilog(self, name, tb_file, dep_files, directory):
-        """iverilogコマンドを実行（複数ファイル対応）"""
-        cmd = ["iverilog", "-Wall", "-o", name, tb_file] + dep_files
-        self.log_output(f"🔨 実行中: {' '.join(cmd)}\n", 'info')
+    def report_plan(self):
+        """実行順と見積もりを表示"""
+        total = sum(job.estimate or 0 for job in self.jobs)
+        makespan = projected_makespan([job.estimate or 0 for job in self.jobs], self.slots)
+        finish_at = time.strftime('%H:%M:%S', time.localtime(time.time() + makespan))
+        self.log_output(f"📋 実行計画: {len(self.jobs)} 件 / 見積もり合計 {format_duration(total)} / "
+                        f"{self.slots} スロットで約 {format_duration(makespan)} (完了予定 {finish_at})\n", 'header')
+        labels = {'history': '実績', 'size': 'サイズから推定', 'default': '既定値'}
+        for job in self.jobs:
+            self.log_output(f"   {format_duration(job.estimate or 0):>8}  {job.name}  "
+                            f"({labels.get(job.estimated_from, '-')})\n", 'info')
+
+
+class MergedSuite:
+    """同じディレクトリの複数テストベンチを、-s で複数のトップを指定した1つの実行イメージにまとめる"""
+    
+    HELPER_MODULE = '__vhr_merged'
+    # 表示系タスクに付ける階層名のマーカー（先頭の要素がトップモジュール名）
+    OUTPUT_MARKER = re.compile(r'<<([^.<>\s]+)[^<>\n]*>> ?')
+    DONE_PATTERN = re.compile(r'^<<__vhr_merged>> done (\d+)\s*$')
+    
+    def __init__(self, directory):
+        self.directory = directory
+        self.jobs = []
+        self.tops = []
+        self.modules = {}
+        self.timescale = None
+    
+    @staticmethod
+    def analyze(job):
+        """トップモジュール・宣言モジュールとファイル・`timescale を調べる（統合できなければValueError）"""
+        if (job.backend or DEFAULT_BACKEND) != 'icarus':
+            raise ValueError(f"{SIMULATOR_BACKENDS[job.backend].label} で実行するテストベンチです")
+        modules, timescales = {}, set()
+        for file_name in [job.tb_file] + job.dep_files:
+            with open(os.path.join(job.directory, file_name), 'r', encoding='utf-8', errors='ignore') as f:
+                content = f.read()
+            if file_name == job.tb_file:
+                tb_content = content
+            for module in MODULE_DECLARATION_PATTERN.findall(content):
+                modules.setdefault(module, file_name)
+            match = TIMESCALE_PATTERN.search(content)
+            timescales.add(''.join(match.group(1).split()) if match else None)
+
+        tops = MODULE_DECLARATION_PATTERN.findall(tb_content)
+        if not tops:
+            raise ValueError("テストベンチにモジュール宣言がありません")
+        if not FINISH_TASK_PATTERN.search(tb_content):
+            raise ValueError("テストベンチが $finish で終了しません")
+        if GLOBAL_TASK_PATTERN.search(tb_content):
+            raise ValueError("$monitor/$stop はシミュレーション全体に作用します")
+        if len(timescales) > 1:
+            # まとめるとファイルの並び順で `timescale の引き継ぎが変わる
+            raise ValueError("ファイルごとに `timescale が異なります")
+        return tops[0], modules, timescales.pop()
+    
+    def conflict(self, modules, timescale):
+        """このスイートに加えられない理由（加えられればNone）"""
+        if self.jobs and timescale != self.timescale:
+            return f"`timescale が他のテストベンチ ({self.timescale or '指定なし'}) と異なります"
+        for module, file_name in modules.items():
+            if self.modules.get(module, file_name) != file_name:
+                return f"モジュール {module} が {self.modules[module]} と {file_name} の両方で宣言されています"
+        return None
+    
+    def add(self, job, top, modules, timescale):
+        self.jobs.append(job)
+        self.tops.append(top)
+        self.modules.update(modules)
+        self.timescale = timescale
+    
+    def _prefix_display(self, match):
+        """表示系タスクの先頭に %m のマーカー引数を追加（行番号は保つ）"""
+        task, opening = match.group(1), match.group(3)
+        newlines = '\n' * match.group(0).count('\n')
+        if opening:
+            return f'{task}("<<%m>> ", {newlines}'
+        return f'{task}("<<%m>> "){newlines}'
+    
+    def prepare(self, executable, build_dir):
+        """書き換えたテストベンチのコピーと制御モジュールを生成し、iverilogのコマンドを返す"""
+        sources = []
+        for index, job in enumerate(self.jobs):
+            with open(os.path.join(job.directory, job.tb_file), 'r', encoding='utf-8', errors='ignore') as f:
+                content = f.read()
+            # 波形ダンプは1つのファイルしか開けないため無効化し、$finish は完了通知に置き換える
+            content = DUMP_TASK_PATTERN.sub(lambda m: ';' + '\n' * m.group(0).count('\n'), content)
+            content = FINISH_TASK_PATTERN.sub(
+                lambda m: f'{self.HELPER_MODULE}.finish_top({index});' + '\n' * m.group(0).count('\n'), content)
+            content = DISPLAY_TASK_PATTERN.sub(self._prefix_display, content)
+            tb_copy = os.path.join(build_dir, job.tb_file)
+            with open(tb_copy, 'w', encoding='utf-8') as f:
+                f.write(f'`line 1 "{job.tb_file}" 0\n{content}')
+            sources.append(tb_copy)
+
+        dep_files = []
+        for job in self.jobs:
+            dep_files.extend(dep for dep in job.dep_files if dep not in dep_files)
+
+        # 全テストベンチが完了通知を送ったところでシミュレーションを終了する
+        lines = ['// Verilog HDL Runner が生成した統合実行の制御モジュール']
+        if self.timescale:
+            lines.append(f'`timescale {self.timescale}')
+        lines += [
+            f'module {self.HELPER_MODULE};',
+            f'  reg [{len(self.jobs) - 1}:0] done = 0;',
+            '  task finish_top;',
+            '    input integer index;',
+            '    begin',
+            '      if (!done[index]) begin',
+            '        done[index] = 1\'b1;',
+            f'        $display("<<{self.HELPER_MODULE}>> done %0d", index);',
+            '        if (&done) $finish;',
+            '      end',
+            '    end',
+            '  endtask',
+            'endmodule',
+            '',
+        ]
+        helper = os.path.join(build_dir, f"{self.HELPER_MODULE}.v")
+        with open(helper, 'w', encoding='utf-8') as f:
+            f.write('\n'.join(lines))
+
+        cmd = ["iverilog", "-Wall", "-I", ".", "-o", executable]
+        for top in self.tops + [self.HELPER_MODULE]:
+            cmd += ["-s", top]
+        return cmd + sources + dep_files + [helper]
+    
+    def split_output(self, output):
+        """マーカーの階層名で出力をテストベンチごとに振り分ける（どれにも属さない行は共通出力）
         
+        $finish を置き換えたテストベンチは他のテストベンチの完了まで動き続けるため、
+        完了通知より後の出力（タイムアウト監視の表示など）は除外して行数だけ数える
+        """
+        outputs = {top: [] for top in self.tops}
+        late = dict.fromkeys(self.tops, 0)
+        shared, done = [], set()
+        for line in output.splitlines(keepends=True):
+            match = self.DONE_PATTERN.match(line)
+            if match:
+                done.add(int(match.group(1)))
+                continue
+            marker = self.OUTPUT_MARKER.search(line)
+            if marker and marker.group(1) in outputs:
+                top = marker.group(1)
+                if self.tops.index(top) in done:
+                    late[top] += 1
+                else:
+                    outputs[top].append(self.OUTPUT_MARKER.sub('', line))
+            else:
+                shared.append(line)
+        return outputs, shared, done, late
+
+
+def plan_merged_suites(jobs):
+    """統合できるテストベンチをディレクトリごとにまとめ、個別に実行するものを理由付きで返す"""
+    suites, fallback, reasons = [], [], {}
+    for job in jobs:
         try:
-            result = subprocess.run(cmd, capture_output=True, text=True, cwd=directory)
-            if result.returncode != 0:
-                self.log_output(f"❌ コンパイルエラー:\n{result.stderr}\n", 'error')
-                return False
-            
-            self.log_output(f"✓ コンパイル成功\n", 'success')
-            if result.stdout:
-                self.log_output(f"{result.stdout}\n")
-            return True
-            
-        except FileNotFoundError:
-            self.log_output("❌ エラー: iverilogが見つかりません。Icarus Verilogがインストールされているか確認してください。\n", 'error')
-            return False
+            top, modules, timescale = MergedSuite.analyze(job)
+        except (OSError, ValueError) as e:
+            fallback.append((job, str(e)))
+            continue
+        for suite in suites:
+            if suite.directory != job.directory:
+                continue
+            reason = suite.conflict(modules, timescale)
+            if reason is None:
+                suite.add(job, top, modules, timescale)
+                break
+            reasons.setdefault(id(job), reason)
+        else:
+            # どのスイートとも衝突する場合は別のスイートを作る
+            suite = MergedSuite(job.directory)
+            suite.add(job, top, modules, timescale)
+            suites.append(suite)
     
-    def run_vvp(self, name, directory):
-        """vvpコマンドを実行"""
-        cmd = ["vvp", name]
-        self.log_output(f"⚡ 実行中: {' '.join(cmd)}\n", 'info')
-        
+    merged = []
+    for suite in suites:
+        if len(suite.jobs) > 1:
+            merged.append(suite)
+        else:
+            job = suite.jobs[0]
+            fallback.append((job, reasons.get(id(job), "まとめられる他のテストベンチがありません")))
+    return merged, fallback
+
+
+def collect_testbenches(paths):
+    """パス（ファイルまたはディレクトリ）からテストベンチを収集"""
+    tb_paths = []
+    for path in paths:
+        if os.path.isdir(path):
+            for dirpath, dirnames, filenames in os.walk(path):
+                dirnames[:] = sorted(d for d in dirnames if not d.startswith('.'))
+                tb_paths.extend(os.path.join(dirpath, f) for f in sorted(filenames) if f.endswith('_tb.v'))
+        elif os.path.isfile(path):
+            tb_paths.append(path)
+    return [os.path.abspath(p) for p in tb_paths]
+
+
+def print_job_summary(jobs, log_output):
+    """ジョブ結果のサマリーを出力"""
+    log_output(f"\n{'='*60}\n", 'header')
+    for job in jobs:
+        elapsed = f"{job.elapsed:.2f}s" if job.elapsed is not None else '-'
+        tag = 'success' if job.status == 'passed' else 'error'
+        log_output(f"{job.status.upper():8} {job.name:30} {elapsed:>10}  {job.directory}\n", tag)
+    passed = sum(1 for job in jobs if job.status == 'passed')
+    log_output(f"{passed}/{len(jobs)} 件成功\n", 'success' if passed == len(jobs) else 'error')
+
+
+def run_cli(args):
+    """コマンドラインからテストベンチをヘッドレス実行"""
+    pipeline = VerilogPipeline()
+    pipeline.artifact_store = ArtifactStore(log_output=pipeline.log_output)
+    settings = {}
+    if args.artifact_quota is not None:
+        settings['quota'] = parse_size(args.artifact_quota) or None
+    if args.keep_last is not None:
+        settings['keep_last'] = args.keep_last or None
+    if args.compress_after is not None:
+        settings['compress_after'] = args.compress_after * 3600 or None
+    if settings:
+        pipeline.artifact_store.configure(**settings)
+    if args.golden or args.update_golden:
+        pipeline.golden = WaveformComparison.from_options(args.golden, args.golden_map or (),
+                                                          args.golden_ignore or (), args.golden_tolerance)
+        pipeline.golden.update = args.update_golden
+    pipeline.column_export_dir = args.export_columns
+    if args.dump_scope or args.dump_depth or args.dump_start or args.dump_stop:
+        pipeline.dump_control = DumpControl.from_options(args.dump_scope, args.dump_depth,
+                                                         args.dump_start, args.dump_stop)
+    tb_paths = collect_testbenches(args.testbenches or ['.'])
+    if args.changed_since and tb_paths:
         try:
-            result = subprocess.run(cmd, capture_output=True, text=True, cwd=directory)
-            self.log_output("📊 シミュレーション結果:\n", 'header')
-            self.log_output(f"{result.stdout}\n")
-            if result.stderr:
-                self.log_output(f"⚠️  警告:\n{result.stderr}\n", 'warning')
-            return result.returncode == 0
-        except FileNotFoundError:
-            self.log_output("❌ エラー: vvpが見つかりません。\n", 'error')
-            return False
+            tb_paths = select_changed_testbenches(pipeline, tb_paths, args.changed_since, os.getcwd())
+        except RuntimeError as e:
+            pipeline.log_output(f"❌ 変更ファイルを取得できません: {e}\n", 'error')
+            return 1
+        if not tb_paths:
+            pipeline.log_output("変更の影響を受けるテストベンチはありません。\n", 'info')
+            return 0
     
-    def cleanup_file(self, name, directory):
-        """生成された実行ファイルを削除"""
-        filepath = os.path.join(directory, name)
-        if os.path.exists(filepath):
-            try:
-                os.remove(filepath)
-                self.log_output(f"🗑️  実行ファイル '{name}' を削除しました。\n", 'info')
-            except OSError as e:
-                self.log_output(f"ファイル削除エラー: {e}\n", 'error')
+    if args.history:
+        pipeline.history = RunHistory(args.history, root=os.path.dirname(os.path.abspath(args.history)))
+    else:
+        pipeline.history = RunHistory()
+    history = pipeline.history
+    jobs = []
+    for tb_path in tb_paths:
+        directory, tb_file = os.path.split(tb_path)
+        dep_files = sorted(pipeline.find_dependencies(tb_file, directory))
+        job = SimulationJob(tb_file, dep_files, directory)
+        job.backend = testbench_backend(tb_path, args.backend, history)
+        job.threads = args.threads
+        jobs.append(job)
     
-    def run_gtkwave(self, name, directory):
-        """gtkwaveコマンドを実行して波形を表示"""
-        vcd_file = os.path.join(directory, f"{name}.vcd")
-        
-        if not os.path.exists(vcd_file):
-            self.log_output(f"⚠️  警告: VCDファイル '{name}.vcd' が見つかりません。\n", 'warning')
-            return False
-        
-        cmd = ["gtkwave", f"{name}.vcd"]
-        self.log_output(f"📈 実行中: {' '.join(cmd)}\n", 'info')
-        
-        try:
-            process = subprocess.Popen(
-                cmd, 
-                cwd=directory,
-                stdout=subprocess.DEVNULL,
-                stderr=subprocess.DEVNULL
-            )
-            self.log_output(f"✓ GTKWaveを起動しました (PID: {process.pid})\n", 'success')
-            return True
-        except FileNotFoundError:
-            self.log_output("❌ エラー: gtkwaveが見つかりません。\n", 'error')
-            return False
-        except OSError as e:
-            self.log_output(f"GTKWave起動エラー: {e}\n", 'error')
-            return False
+    if not jobs:
+        pipeline.log_output("エラー: テストベンチファイルが見つかりません。\n", 'error')
+        return 1
     
-    def log_output(self, text, tag=None):
-        """出力エリアにテキストを追加"""
-        self.output_text.insert(tk.END, text, tag)
-        self.output_text.see(tk.END)
-        self.root.update_idletasks()
+    # 実行記録から所要時間を見積もり、長いテストベンチから実行する
+    jobs = estimate_job_durations(jobs, history)
+    if args.shard:
+        index, count = parse_shard(args.shard)
+        if args.history:
+            shards = plan_shards(jobs, count)
+        else:
+            # マシンごとの実行記録で分割すると割り当てがずれるため、どこでも同じになるソースサイズで分割する
+            pipeline.log_output("⚠️  --history で実行記録を共有していないため、ソースサイズが均等になるようシャードに分割します\n",
+                                'warning')
+            shards = size_shards(jobs, count, os.getcwd())
+        for number, shard in enumerate(shards, 1):
+            pipeline.log_output(f"🧩 シャード {number}/{count}: {len(shard)} 件 / "
+                                f"見積もり {format_duration(sum(job.estimate for job in shard))} / "
+                                f"ソース {format_size(sum(job_source_size(job) for job in shard))}"
+                                f"{'  ← 実行' if number == index else ''}\n", 'info')
+        jobs = shards[index - 1]
+        if not jobs:
+            pipeline.log_output("このシャードに割り当てられたテストベンチはありません。\n", 'info')
+            return 0
+    progress = ScheduleProgress(jobs, pipeline.log_output, history=history)
     
-    def clear_log(self):
-        """ログをクリア"""
-        self.output_text.delete(1.0, tk.END)
+    if args.compare_backends:
+        for job in jobs:
+            timings = pipeline.compare_backends(job.name, job.tb_file, job.dep_files, job.directory, args.threads)
+            job.attempts += 1
+            job.status = 'passed' if timings else 'failed'
+        print_job_summary(jobs, pipeline.log_output)
+        return 0 if all(job.status == 'passed' for job in jobs) else 1
     
-    def run_verilog_thread(self, tb_file, dep_files, directory):
-        """Verilogコンパイル・実行をバックグラウンドで実行"""
-        try:
-            # 実行ファイル名（.vを除く）
-            name = tb_file.replace('_tb.v', '')
-            
-            self.log_output(f"\n{'='*60}\n", 'header')
-            self.log_output(f"🚀 {name} の実行を開始\n", 'header')
-            self.log_output(f"{'='*60}\n\n", 'header')
-            self.log_output(f"📂 作業ディレクトリ: {directory}\n", 'info')
-            self.log_output(f"🧪 テストベンチ: {tb_file}\n", 'info')
-            self.log_output(f"📄 依存ファイル: {', '.join(dep_files) if dep_files else 'なし'}\n\n", 'info')
-            
-            if (self.run_iverilog(name, tb_file, dep_files, directory) and 
-                self.run_vvp(name, directory)):
-                
-                if self.gtkwave_var.get():
-                    self.run_gtkwave(name, directory)
-            
-            self.cleanup_file(name, directory)
-            
-            self.log_output(f"\n{'='*60}\n", 'header')
-            self.log_output(f"✅ {name} の実行完了\n", 'success')
-            self.log_output(f"{'='*60}\n\n", 'header')
-            
-        except Exception as e:
-            self.log_output(f"❌ 予期しないエラー: {e}\n", 'error')
-        finally:
-            self.root.after(0, lambda: self.run_button.config(state="normal"))
+    fanout_runs = None
+    if args.seeds or args.plusargs:
+        fanout_runs = build_fanout_runs(parse_seed_range(args.seeds or ''), args.plusargs, args.seed_arg)
     
-    def run_verilog(self):
-        """Verilogファイルを実行"""
-        file_info = self.get_selected_files()
-        if not file_info or not file_info[0]:
-            messagebox.showwarning("警告", "テストベンチファイルを選択してください。")
-            return
-        
-        tb_file, dep_files, directory = file_info
-        
-        if not dep_files:
-            response = messagebox.askyesno(
-                "確認", 
-                "依存ファイルが選択されていません。\nテストベンチファイルのみで実行しますか?"
-            )
-            if not response:
-                return
-        
-        self.run_button.config(state="disabled")
-        
-        thread = threading.Thread(
-            target=self.run_verilog_thread, 
-            args=(tb_file, dep_files, directory), 
-            daemon=True
-        )
-        thread.start()
+    if fanout_runs:
+        for job in jobs:
+            start = time.time()
+            results = pipeline.run_fanout(job.name, job.tb_file, job.dep_files, job.directory,
+                                          fanout_runs, args.jobs)
+            job.attempts += 1
+            job.status = 'passed' if results and all(r.passed for r in results) else 'failed'
+            job.elapsed = time.time() - start
+    elif args.merge:
+        pipeline.run_merged(jobs)
+    elif args.workers:
+        coordinator = JobCoordinator(parse_worker_list(args.workers, args.token), pipeline.log_output,
+                                     max_retries=args.retries, dump_control=pipeline.dump_control,
+                                     progress=progress, token=args.token, job_timeout=args.job_timeout or None)
+        coordinator.run(jobs)
+        if args.fetch_artifacts:
+            for job in jobs:
+                if job.status != 'passed':
+                    continue
+                # 1回の実行の成果物としてまとめて記録する
+                fetched = []
+                for name in fnmatch.filter(job.artifacts, args.fetch_artifacts):
+                    try:
+                        fetched.append(coordinator.fetch_artifact(job, name, job.directory))
+                    except (WorkerLostError, WorkerRejectedError) as e:
+                        pipeline.log_output(f"⚠️  成果物を取得できません: {e}\n", 'warning')
+                pipeline.store_artifacts(job.tb_file, job.directory, fetched)
+    else:
+        progress.report_plan()
+        for job in jobs:
+            progress.start(job)
+            pipeline.run_job(job)
+            progress.finish(job)
+    
+    print_job_summary(jobs, pipeline.log_output)
+    pipeline.artifact_store.wait()
+    pipeline.log_output(f"{pipeline.artifact_store.describe_usage()}\n", 'info')
+    return 0 if all(job.status == 'passed' for job in jobs) else 1
+
+
+def serve_worker(args):
+    """ジョブサーバーのワーカーとして待ち受ける"""
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix='verilog_worker_')
+    token = args.token or secrets.token_urlsafe(24)
+    worker = SimulationWorker(work_dir, args.slots, token, blob_cache=parse_size(args.blob_cache))
+    server = worker.create_server(args.host, args.port)
+    print(f"🌐 ワーカー起動: {args.host}:{server.server_address[1]} ({args.slots} スロット, {work_dir})")
+    if not args.token:
+        # トークン未指定なら生成して表示（コーディネーター側で --token または環境変数に指定）
+        print(f"🔑 トークン: {token}  (コーディネーターで --token または {WORKER_TOKEN_ENV} に指定)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def parse_args(argv=None):
+    """コマンドライン引数を解析"""
+    parser = argparse.ArgumentParser(description="Verilog HDL Runner")
+    parser.add_argument('testbenches', nargs='*',
+                        help='ヘッドレス実行するテストベンチ (*_tb.v) またはディレクトリ（省略時はGUIを起動）')
+    parser.add_argument('--changed-since', metavar='REF',
+                        help='git ref 以降の変更（.v/.vh）の影響を受けるテストベンチだけを実行 '
+                             '(テストベンチ省略時はカレントディレクトリ以下)')
+    parser.add_argument('--workers',
+                        help='分散実行先のワーカー (host:port をカンマ区切り、"local" でループバックワーカー)')
+    parser.add_argument('--retries', type=int, default=2, help='ワーカー喪失時の再試行回数')
+    parser.add_argument('--job-timeout', type=float, default=DEFAULT_JOB_TIMEOUT, metavar='SECONDS',
+                        help=f'分散実行で1件の実行がこの秒数を超えたら失敗とする (既定: {DEFAULT_JOB_TIMEOUT}、0で無制限)')
+    parser.add_argument('--fetch-artifacts', default='*.vcd', metavar='PATTERN',
+                        help='分散実行後にワーカーから取得する成果物 (既定: *.vcd、空文字で取得しない)')
+    parser.add_argument('--seeds', metavar='RANGE',
+                        help='一度コンパイルしてシードごとに並列実行 (例: 1-100 または 1,5,9)')
+    parser.add_argument('--seed-arg', default='SEED', help='シードを渡すplusarg名 (既定: SEED → +SEED=n)')
+    parser.add_argument('--plusargs', action='append', metavar='ARGS',
+                        help='1回の実行に渡すplusarg (例: "+MODE=fast +N=10")、複数指定でファンアウト')
+    parser.add_argument('--shard', metavar='K/N',
+                        help='N分割したうちK番目だけを実行 (CIの並列実行用)。--history 指定時は見積もり時間が均等になるよう、'
+                             '未指定時は依存ファイルを含むソースサイズが均等になるよう分割')
+    parser.add_argument('--history', metavar='FILE',
+                        help='所要時間の見積もりに使う実行記録ファイル (既定: ~/.verilog_hdl_runner/history.json)。'
+                             'CIではリポジトリに置いて共有すると、どのマシンでも同じシャード分割になる')
+    parser.add_argument('--jobs', type=int, help='ファンアウト実行の並列数 (既定: CPUコア数)')
+    parser.add_argument('--merge', action='store_true',
+                        help='同じディレクトリの小さなテストベンチを1つのイメージにまとめてコンパイルし、vvpを1回で実行 '
+                             '(まとめられないものは個別に実行、波形はダンプしない)')
+    parser.add_argument('--dump-scope', metavar='SCOPE',
+                        help='波形をダンプする階層 (例: add1_tb.dut、カンマ区切りで複数)')
+    parser.add_argument('--dump-depth', type=int, default=0, help='ダンプする階層の深さ (0: 全階層)')
+    parser.add_argument('--dump-start', metavar='TIME', help='ダンプ開始時刻 (例: 100ns、単位省略時はns)')
+    parser.add_argument('--dump-stop', metavar='TIME', help='ダンプ終了時刻 (例: 2us)')
+    parser.add_argument('--backend', choices=list(SIMULATOR_BACKENDS),
+                        help='シミュレーターのバックエンド (省略時はテストベンチごとの選択、既定: icarus)')
+    parser.add_argument('--threads', type=int, help='Verilatorのモデルのスレッド数 (--threads)')
+    parser.add_argument('--compare-backends', action='store_true',
+                        help='インストール済みの各バックエンドで実行してコンパイル・実行時間を比較')
+    parser.add_argument('--artifact-quota', metavar='SIZE',
+                        help='波形・ログの合計サイズ上限 (例: 20GB、0で無制限)。超えた分は最終アクセスの古い順に削除')
+    parser.add_argument('--keep-last', type=int, metavar='N',
+                        help='テストベンチごとに成果物を保持する実行回数 (0で無制限)。'
+                             '指定時は実行ごとのファイル名 name.<実行ID>.vcd で保存')
+    parser.add_argument('--compress-after', type=float, metavar='HOURS',
+                        help='指定時間アクセスのない波形をgzip圧縮 (0で圧縮しない)')
+    parser.add_argument('--golden', nargs='?', const=WaveformComparison.DEFAULT_DIR, metavar='DIR',
+                        help='シミュレーション後にゴールデン波形と比較 (テストベンチのディレクトリからの相対パス、既定: golden)')
+    parser.add_argument('--update-golden', action='store_true', help='比較せずに今回の波形をゴールデン波形として保存')
+    parser.add_argument('--golden-map', action='append', metavar='GOLDEN=NEW',
+                        help='ゴールデン側と今回の階層名の対応 (例: tb.dut_old=tb.dut、前方一致)')
+    parser.add_argument('--golden-ignore', action='append', metavar='PATTERN',
+                        help='比較しない信号 (例: "*.debug_*"、カンマ区切り可)')
+    parser.add_argument('--golden-tolerance', metavar='TIME',
+                        help='この時間以内の不一致を無視 (例: 1ns)')
+    parser.add_argument('--export-columns', nargs='?', const='columns', metavar='DIR',
+                        help='実行後に波形を信号ごとの .npy 列とマニフェストに変換 '
+                             '(テストベンチのディレクトリからの相対パス、既定: columns)')
+    parser.add_argument('--diagnostics', action='store_true', help='GUIを診断モード（処理時間の計測）で起動')
+    parser.add_argument('--worker', action='store_true', help='ジョブサーバーのワーカーとして起動')
+    parser.add_argument('--token', default=os.environ.get(WORKER_TOKEN_ENV),
+                        help=f'ワーカーの認証トークン (既定: 環境変数 {WORKER_TOKEN_ENV}、ワーカー側で未指定なら生成して表示)')
+    parser.add_argument('--host', default='127.0.0.1',
+                        help='ワーカーの待ち受けアドレス (既定: 127.0.0.1、他のホストから使う場合は 0.0.0.0 など)')
+    parser.add_argument('--port', type=int, default=DEFAULT_WORKER_PORT, help='ワーカーの待ち受けポート')
+    parser.add_argument('--slots', type=int, default=os.cpu_count() or 1, help='ワーカーの同時実行数')
+    parser.add_argument('--work-dir', help='ワーカーの作業ディレクトリ')
+    parser.add_argument('--blob-cache', default=format_size(DEFAULT_BLOB_CACHE), metavar='SIZE',
+                        help='ワーカーが保持する受信済みソースの合計サイズ上限 (既定: %(default)s、0で無制限)。'
+                             '超えたら使われていない古いものから削除')
+    args = parser.parse_args(argv)
+    if args.golden_tolerance:
+        try:
+            parse_sim_time(args.golden_tolerance)
+        except ValueError as e:
+            parser.error(str(e))
+    try:
+        DumpControl.from_options(args.dump_scope, args.dump_depth, args.dump_start, args.dump_stop)
+    except ValueError as e:
+        parser.error(str(e))
+    if (args.seeds or args.plusargs) and args.workers:
+        parser.error('--seeds/--plusargs は --workers と同時に指定できません')
+    if (args.seeds or args.plusargs) and args.backend == 'verilator':
+        parser.error('--seeds/--plusargs はIcarus Verilogでのみ実行できます')
+    if args.merge and (args.workers or args.seeds or args.plusargs or args.compare_backends):
+        parser.error('--merge は --workers/--seeds/--plusargs/--compare-backends と同時に指定できません')
+    if args.merge and (args.golden or args.update_golden or args.export_columns or
+                       args.dump_scope or args.dump_depth or args.dump_start or args.dump_stop):
+        parser.error('--merge は波形をダンプしないため --golden/--update-golden/--export-columns/--dump-* '
+                     'と同時に指定できません')
+    if args.golden_map:
+        try:
+            WaveformComparison.from_options(mapping=args.golden_map)
+        except ValueError as e:
+            parser.error(str(e))
+    for size in (args.artifact_quota, args.blob_cache):
+        if size:
+            try:
+                parse_size(size)
+            except ValueError as e:
+                parser.error(str(e))
+    if args.job_timeout < 0:
+        parser.error('--job-timeout には0以上を指定してください')
+    if args.shard:
+        try:
+            parse_shard(args.shard)
+        except ValueError as e:
+            parser.error(str(e))
+    if args.seeds:
+        try:
+            if not parse_seed_range(args.seeds):
+                parser.error('--seeds にシードが指定されていません')
+        except ValueError as e:
+            parser.error(str(e))
+    if args.jobs is not None and args.jobs < 1:
+        parser.error('--jobs には1以上を指定してください')
+    if args.threads is not None and args.threads < 1:
+        parser.error('--threads には1以上を指定してください')
+    return args
 
 
 def main():
+    args = parse_args()
+    if args.worker:
+        serve_worker(args)
+        return
+    if args.testbenches or args.changed_since:
+        sys.exit(run_cli(args))
+    
     root = tk.Tk()
     app = VerilogRunner(root)
+    if args.diagnostics:
+        app.diagnostics.enabled = True
+        DiagnosticsPanel(root, app.diagnostics)
     root.mainloop()
 
 
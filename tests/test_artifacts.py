@@ -0,0 +1,123 @@
+"""成果物（波形・ログ）の記録と保持ルールによる整理のテスト"""
+
+import os
+import sys
+import shutil
+import subprocess
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import Verilog_HDL_Runner as runner
+
+
+class QuietPipeline(runner.VerilogPipeline):
+
+    def __init__(self):
+        self.messages = []
+
+    def log_output(self, text, tag=None):
+        self.messages.append((text, tag))
+
+
+def fake_simulator(cmd, cwd=None, **kwargs):
+    """iverilog は成功、vvp は実行ディレクトリに波形を書く"""
+    if cmd[0] == 'vvp':
+        with open(os.path.join(cwd, 'add.vcd'), 'w') as f:
+            f.write(f'$comment {cmd[2]} $end\n')
+    return subprocess.CompletedProcess(cmd, 0, 'ok\n', '')
+
+
+class ArtifactStoreTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        self.store_path = os.path.join(self.directory, 'state', 'artifacts.json')
+        self.store = runner.ArtifactStore(self.store_path)
+        self.tb_path = os.path.join(self.directory, 'add_tb.v')
+        with open(self.tb_path, 'w') as f:
+            f.write('module add_tb;\nendmodule\n')
+
+    def write(self, name, data='x'):
+        path = os.path.join(self.directory, name)
+        with open(path, 'w') as f:
+            f.write(data)
+        return path
+
+
+class KeepLastTest(ArtifactStoreTestCase):
+
+    def test_fanout_runs_count_as_one(self):
+        self.store.configure(keep_last=2)
+        pipeline = QuietPipeline()
+        pipeline.artifact_store = self.store
+        runs = runner.build_fanout_runs([1, 2, 3, 4])
+        with mock.patch.object(runner.subprocess, 'run', side_effect=fake_simulator), \
+                mock.patch.object(runner.ArtifactStore, 'compress_in_background'):
+            all_results = [pipeline.run_fanout('add', 'add_tb.v', [], self.directory, runs, jobs=2)
+                           for _ in range(3)]
+        # 1回の実行（4シード × 波形・ログ）をまとめて数え、直近2回分の16件だけが残る
+        self.assertEqual(len(self.store.artifacts), 16)
+        for results in all_results[1:]:
+            for result in results:
+                self.assertTrue(os.path.exists(result.waveform))
+                self.assertTrue(os.path.exists(result.log_file))
+                self.assertNotEqual(result.waveform, os.path.join(self.directory, f'add_{result.label}.vcd'))
+        for result in all_results[0]:
+            self.assertFalse(os.path.exists(result.waveform))
+        self.assertEqual(self.store.latest(os.path.join(self.directory, 'add_seed3.vcd')), all_results[2][2].waveform)
+
+    def test_per_run_names(self):
+        self.store.configure(keep_last=1)
+        first = self.store.record(self.tb_path, [self.write('add.vcd', 'first')])
+        self.store.enforce(protect=first.values())
+        second = self.store.record(self.tb_path, [self.write('add.vcd', 'second')])
+        self.store.enforce(protect=second.values())
+        vcd_path = os.path.join(self.directory, 'add.vcd')
+        self.assertNotEqual(first[vcd_path], second[vcd_path])
+        self.assertFalse(os.path.exists(first[vcd_path]))
+        self.assertFalse(os.path.exists(vcd_path))
+        self.assertEqual(self.store.latest(vcd_path), second[vcd_path])
+        with open(second[vcd_path]) as f:
+            self.assertEqual(f.read(), 'second')
+
+    def test_without_keep_last_overwrites(self):
+        vcd_path = self.write('add.vcd')
+        self.assertEqual(self.store.record(self.tb_path, [vcd_path]), {vcd_path: vcd_path})
+        self.assertEqual(self.store.latest(vcd_path), vcd_path)
+        self.assertIsNone(self.store.latest(os.path.join(self.directory, 'missing.vcd')))
+
+
+class QuotaTest(ArtifactStoreTestCase):
+
+    def test_evicts_least_recently_used(self):
+        self.store.configure(quota=25)
+        paths = [self.write(f'w{i}.vcd', 'x' * 10) for i in range(3)]
+        for path in paths:
+            self.store.record(self.tb_path, [path])
+        self.store.touch(paths[0])
+        self.assertEqual(self.store.enforce(protect=[paths[2]]), [paths[1]])
+        self.assertEqual(sorted(self.store.artifacts), sorted([paths[0], paths[2]]))
+
+
+class SharedStoreTest(ArtifactStoreTestCase):
+
+    def test_instances_merge_records(self):
+        # GUIとCLIなど、同じ記録ファイルを使う別インスタンスの記録を上書きしない
+        other = runner.ArtifactStore(self.store_path)
+        first = self.write('a.vcd')
+        second = self.write('b.vcd')
+        self.store.record(self.tb_path, [first])
+        other.record(self.tb_path, [second])
+        self.store.configure(compress_after=3600)
+        reloaded = runner.ArtifactStore(self.store_path)
+        self.assertEqual(sorted(reloaded.artifacts), [first, second])
+        self.assertEqual(reloaded.settings['compress_after'], 3600)
+        self.assertEqual(other.usage()[1], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,154 @@
+"""シミュレーターのバックエンド選択・Verilatorのビルドキャッシュ・実行記録のテスト"""
+
+import os
+import sys
+import json
+import shutil
+import subprocess
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import Verilog_HDL_Runner as runner
+
+
+class QuietPipeline(runner.VerilogPipeline):
+
+    def __init__(self):
+        self.messages = []
+
+    def log_output(self, text, tag=None):
+        self.messages.append((text, tag))
+
+
+class FakeBackend:
+    """コンパイル・実行時間だけを返すバックエンド"""
+
+    def __init__(self, name, compile_time, simulate_time):
+        self.name = name
+        self.label = name
+        self.compile_time = compile_time
+        self.simulate_time = simulate_time
+
+    def version(self):
+        return f'{self.name} 1.0'
+
+    def compile(self, pipeline, name, tb_file, dep_files, directory):
+        return True
+
+    def simulate(self, pipeline, name, directory):
+        pipeline.last_simulation_time = self.simulate_time
+        return True
+
+    def cleanup(self, pipeline, name, directory):
+        pass
+
+
+class StateDirTestCase(unittest.TestCase):
+    """既定の保存先（~/.verilog_hdl_runner）を一時ディレクトリに置き換える"""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        self.state_dir = os.path.join(self.directory, 'state')
+        patcher = mock.patch.object(runner, 'STATE_DIR', self.state_dir)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+
+class BackendSelectionTest(StateDirTestCase):
+
+    def test_override_history_default(self):
+        history = runner.RunHistory(os.path.join(self.directory, 'history.json'))
+        tb_path = os.path.join(self.directory, 'a_tb.v')
+        self.assertEqual(runner.testbench_backend(tb_path), runner.DEFAULT_BACKEND)
+        self.assertEqual(runner.testbench_backend(tb_path, history=history), runner.DEFAULT_BACKEND)
+        history.update(tb_path, backend='verilator')
+        self.assertEqual(runner.testbench_backend(tb_path, history=history), 'verilator')
+        self.assertEqual(runner.testbench_backend(tb_path, 'icarus', history), 'icarus')
+        history.update(tb_path, backend='removed')
+        self.assertEqual(runner.testbench_backend(tb_path, history=history), runner.DEFAULT_BACKEND)
+        self.assertFalse(os.path.exists(self.state_dir))
+
+    def test_create_backend(self):
+        self.assertIsInstance(runner.create_backend(), runner.IcarusBackend)
+        backend = runner.create_backend('verilator', 4)
+        self.assertIsInstance(backend, runner.VerilatorBackend)
+        self.assertEqual(backend.threads, 4)
+
+
+class VerilatorCacheTest(StateDirTestCase):
+
+    def test_build_dir_per_directory(self):
+        backend = runner.VerilatorBackend()
+        first = backend.build_dir('add', ['add_tb.v', 'add.v'], os.path.join(self.directory, 'a'))
+        self.assertEqual(first, backend.build_dir('add', ['add.v', 'add_tb.v'], os.path.join(self.directory, 'a')))
+        self.assertNotEqual(first, backend.build_dir('add', ['add_tb.v', 'add.v'], os.path.join(self.directory, 'b')))
+        self.assertNotEqual(first, backend.build_dir('add', ['add_tb.v'], os.path.join(self.directory, 'a')))
+        self.assertEqual(os.path.dirname(first), os.path.join(self.state_dir, 'verilator'))
+
+    def test_compile_reuses_build_dir(self):
+        with open(os.path.join(self.directory, 'add_tb.v'), 'w') as f:
+            f.write('module add_tb;\n  add dut ();\nendmodule\n')
+        pipeline = QuietPipeline()
+        backend = runner.VerilatorBackend(threads=2)
+        commands = []
+
+        def fake_run(cmd, **kwargs):
+            commands.append(cmd)
+            return subprocess.CompletedProcess(cmd, 0, '', '')
+
+        with mock.patch.object(runner.subprocess, 'run', side_effect=fake_run):
+            for _ in range(2):
+                self.assertTrue(backend.compile(pipeline, 'add', 'add_tb.v', ['add.v'], self.directory))
+        build_dir = backend.build_dir('add', ['add_tb.v', 'add.v'], self.directory)
+        self.assertEqual(commands[0], commands[1])
+        cmd = commands[0]
+        self.assertEqual(cmd[cmd.index('--Mdir') + 1], build_dir)
+        self.assertEqual(cmd[cmd.index('--top-module') + 1], 'add_tb')
+        self.assertEqual(cmd[cmd.index('--threads') + 1], '2')
+        self.assertEqual(backend.binary, os.path.join(build_dir, 'add'))
+        self.assertTrue(os.path.isdir(build_dir))
+
+
+class PipelineHistoryTest(StateDirTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.history_path = os.path.join(self.directory, 'ci', 'history.json')
+        self.pipeline = QuietPipeline()
+        self.pipeline.history = runner.RunHistory(self.history_path, root=self.directory)
+        with open(os.path.join(self.directory, 'add_tb.v'), 'w') as f:
+            f.write('module add_tb;\n  initial $dumpfile("add.vcd");\nendmodule\n')
+        with open(os.path.join(self.directory, 'add.vcd'), 'w') as f:
+            f.write('$enddefinitions $end\n')
+
+    def records(self):
+        with open(self.history_path) as f:
+            return json.load(f)
+
+    def test_dump_stats_use_pipeline_history(self):
+        self.pipeline.last_simulation_time = 1.5
+        self.pipeline.report_dump_stats('add', 'add_tb.v', self.directory)
+        self.assertEqual(self.records()['add_tb.v']['dump_full']['time'], 1.5)
+        self.assertFalse(os.path.exists(self.state_dir))
+
+    def test_backend_timings_use_pipeline_history(self):
+        backends = {'icarus': FakeBackend('icarus', 0.1, 4.0), 'verilator': FakeBackend('verilator', 3.0, 0.5)}
+        with mock.patch.object(runner, 'create_backend', lambda name, threads=None: backends[name]):
+            timings = self.pipeline.compare_backends('add', 'add_tb.v', [], self.directory)
+        self.assertEqual(set(timings), {'icarus', 'verilator'})
+        self.assertEqual(self.records()['add_tb.v']['backend_timing']['verilator']['simulate'], 0.5)
+        self.assertFalse(os.path.exists(self.state_dir))
+
+    def test_history_reloads_other_writers(self):
+        other = runner.RunHistory(self.history_path, root=self.directory)
+        other.update(os.path.join(self.directory, 'add_tb.v'), backend='verilator')
+        self.assertEqual(runner.testbench_backend(os.path.join(self.directory, 'add_tb.v'),
+                                                  history=self.pipeline.history), 'verilator')
+
+
+if __name__ == '__main__':
+    unittest.main()
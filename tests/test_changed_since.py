@@ -0,0 +1,130 @@
+"""--changed-since（git の変更から影響を受けるテストベンチを選ぶ）のテスト"""
+
+import os
+import sys
+import shutil
+import subprocess
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import Verilog_HDL_Runner as runner
+
+
+class DependencyGraphTest(unittest.TestCase):
+
+    FILES = {
+        'defs.vh': '`define WIDTH 4\n',
+        'half.v': '`include "defs.vh"\nmodule half(input a, output y);\nendmodule\n',
+        'add1.v': 'module add1(input a, output y);\n  half h0 (.a(a), .y(y));\nendmodule\n',
+        'add1_tb.v': 'module add1_tb;\n  add1 dut (.a(1\'b0), .y());\nendmodule\n',
+        'other.v': 'module other;\nendmodule\n',
+        'other_tb.v': 'module other_tb;\n  other dut ();\nendmodule\n',
+    }
+
+    def setUp(self):
+        self.directory = os.path.realpath(tempfile.mkdtemp())
+        for name, content in self.FILES.items():
+            with open(os.path.join(self.directory, name), 'w') as f:
+                f.write(content)
+        self.graph = runner.DependencyGraph(runner.VerilogPipeline())
+        for name in ('add1_tb.v', 'other_tb.v'):
+            self.graph.add_testbench(self.path(name))
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def path(self, name):
+        return os.path.join(self.directory, name)
+
+    def test_include_chain(self):
+        affected = self.graph.affected_testbenches([self.path('defs.vh')])
+        self.assertEqual(list(affected), [self.path('add1_tb.v')])
+        chain = [(os.path.basename(path), kind) for path, kind in affected[self.path('add1_tb.v')]]
+        self.assertEqual([name for name, _ in chain], ['defs.vh', 'half.v', 'add1.v', 'add1_tb.v'])
+        self.assertIsNone(chain[0][1])
+
+    def test_changed_testbench_itself(self):
+        affected = self.graph.affected_testbenches([self.path('other_tb.v')])
+        self.assertEqual(affected, {self.path('other_tb.v'): [(self.path('other_tb.v'), None)]})
+
+    def test_unrelated_change(self):
+        self.assertEqual(self.graph.affected_testbenches([self.path('unused.v')]), {})
+
+    def test_shared_files_are_read_once(self):
+        graph = runner.DependencyGraph(runner.VerilogPipeline())
+        with open(self.path('add2_tb.v'), 'w') as f:
+            f.write('module add2_tb;\n  add1 a0 ();\n  add1 a1 ();\n  half h ();\nendmodule\n')
+        with mock.patch.object(graph, '_references', wraps=graph._references) as references:
+            for name in ('add1_tb.v', 'add2_tb.v', 'add1_tb.v'):
+                graph.add_testbench(self.path(name))
+        read = [os.path.basename(call.args[0]) for call in references.call_args_list]
+        self.assertEqual(sorted(read), ['add1.v', 'add1_tb.v', 'add2_tb.v', 'defs.vh', 'half.v'])
+        self.assertEqual(len(graph.edges), sum(len(referrers) for referrers in graph.referrers.values()))
+        self.assertEqual(graph.referrers[self.path('add1.v')], [
+            (self.path('add1_tb.v'), 'メインモジュール'),
+            (self.path('add1_tb.v'), 'インスタンス'),
+            (self.path('add2_tb.v'), 'インスタンス'),
+        ])
+
+    @unittest.skipUnless(hasattr(os, 'symlink'), 'シンボリックリンクが使えない')
+    def test_symlinked_sources(self):
+        library = os.path.join(self.directory, 'lib')
+        os.makedirs(library)
+        os.replace(self.path('half.v'), os.path.join(library, 'half.v'))
+        os.symlink(os.path.join(library, 'half.v'), self.path('half.v'))
+        graph = runner.DependencyGraph(runner.VerilogPipeline())
+        graph.add_testbench(self.path('add1_tb.v'))
+        # git diff はリンク先の実パスを返す
+        affected = graph.affected_testbenches([os.path.join(library, 'half.v')])
+        self.assertEqual(list(affected), [self.path('add1_tb.v')])
+
+
+class SelectChangedTestbenchesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = os.path.realpath(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        self.messages = []
+        self.pipeline = runner.VerilogPipeline()
+        self.pipeline.log_output = lambda text, tag=None: self.messages.append(text)
+
+    def write(self, rel_path, content):
+        path = os.path.join(self.directory, rel_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as f:
+            f.write(content)
+        return path
+
+    def git(self, *args, cwd=None):
+        subprocess.run(['git', '-c', 'user.name=t', '-c', 'user.email=t@example.com'] + list(args),
+                       cwd=cwd or self.directory, check=True, capture_output=True)
+
+    @unittest.skipUnless(shutil.which('git'), 'gitが見つからない')
+    def test_changes_from_subdirectory(self):
+        tb = self.write(os.path.join('rtl', 'add', 'add_tb.v'), 'module add_tb;\n  add dut ();\nendmodule\n')
+        self.write(os.path.join('rtl', 'add', 'add.v'), 'module add;\nendmodule\n')
+        other = self.write(os.path.join('rtl', 'mux', 'mux_tb.v'), 'module mux_tb;\nendmodule\n')
+        self.git('init', '-q')
+        self.git('add', '.')
+        self.git('commit', '-q', '-m', 'init')
+        self.write(os.path.join('rtl', 'add', 'add.v'), 'module add;\n  wire x;\nendmodule\n')
+        helper = self.write(os.path.join('rtl', 'add', 'helper.vh'), '`define X 1\n')
+
+        cwd = os.path.join(self.directory, 'rtl', 'mux')
+        changed = runner.git_changed_files('HEAD', cwd)
+        self.assertEqual(changed, sorted([os.path.join(self.directory, 'rtl', 'add', 'add.v'), helper]))
+        self.assertEqual(runner.select_changed_testbenches(self.pipeline, [tb, other], 'HEAD', cwd), [tb])
+        self.assertTrue(any('add.v ←(メインモジュール) add_tb.v' in message for message in self.messages))
+
+    def test_git_errors(self):
+        with mock.patch.object(runner.subprocess, 'run', side_effect=FileNotFoundError('git')):
+            with self.assertRaises(RuntimeError):
+                runner.git_changed_files('HEAD', self.directory)
+
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,111 @@
+"""波形の列形式へのエクスポートと読み込みのテスト"""
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import Verilog_HDL_Runner as runner
+
+VCD = '''$timescale {timescale} $end
+$scope module tb $end
+$var wire 1 ! clk $end
+$var wire 1 ! clk_alias $end
+$var reg 4 " cnt [3:0] $end
+$var reg 70 # wide [69:0] $end
+$upscope $end
+$enddefinitions $end
+#0
+0!
+b0 "
+bx #
+#5
+1!
+b101 #
+#10
+0!
+b11 "
+b1{ones} #
+#15
+1!
+bz0 "
+'''
+
+
+class SplitVcdNameTest(unittest.TestCase):
+
+    def test_split_vcd_name(self):
+        self.assertEqual(runner.split_vcd_name('tb.cnt [3:0]'), ('tb.cnt', '[3:0]'))
+        self.assertEqual(runner.split_vcd_name('tb.data[7]'), ('tb.data', '[7]'))
+        self.assertEqual(runner.split_vcd_name('tb.clk'), ('tb.clk', ''))
+        self.assertEqual(runner.split_vcd_name('[3:0]'), ('[3:0]', ''))
+
+
+class ColumnarRoundTripTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        self.out_dir = os.path.join(self.directory, 'columns', 'add')
+
+    def export(self, timescale='1ns', chunk_changes=None):
+        vcd_path = os.path.join(self.directory, 'add.vcd')
+        with open(vcd_path, 'w') as f:
+            f.write(VCD.format(timescale=timescale, ones='1' * 69))
+        stats = runner.ColumnarExport(chunk_changes).export(vcd_path, self.out_dir)
+        wave = runner.ColumnarWaveform(self.out_dir)
+        self.addCleanup(wave.close)
+        return stats, wave
+
+    def modes(self):
+        yield 'python', None
+        if runner.np is not None:
+            yield 'numpy', runner.np
+
+    def test_round_trip(self):
+        for label, module in self.modes():
+            for chunk in (1, None):
+                with self.subTest(mode=label, chunk=chunk), mock.patch.object(runner, 'np', module):
+                    stats, wave = self.export(chunk_changes=chunk)
+                    self.assertEqual(stats['signals'], 4)
+                    self.assertEqual(sorted(wave.names), ['tb.clk', 'tb.clk_alias', 'tb.cnt', 'tb.wide'])
+                    self.assertEqual(wave.manifest['time_unit'], 'ps')
+                    self.assertEqual(wave.manifest['end_time'], 15000)
+                    self.assertEqual(wave.signals['tb.cnt']['range'], '[3:0]')
+                    self.assertEqual(wave.signals['tb.cnt']['width'], 4)
+                    self.assertEqual(wave.signals['tb.clk']['times'], wave.signals['tb.clk_alias']['times'])
+
+                    times, values = wave.columns('tb.clk')
+                    self.assertEqual(list(times), [0, 5000, 10000, 15000])
+                    self.assertEqual([int(v) for v in values], [0, 1, 0, 1])
+                    self.assertEqual(wave.value_at('tb.cnt', 9999), 0)
+                    self.assertEqual(wave.value_at('tb.cnt', 10000), 3)
+                    self.assertEqual(wave.value_at('tb.cnt', 20000), 'zzz0')
+                    self.assertEqual(wave.value_at('tb.wide', 0), 'x' * 70)
+                    self.assertEqual(wave.value_at('tb.wide', 5000), '0' * 67 + '101')
+                    self.assertEqual(wave.value_at('tb.wide', 10000), '1' * 70)
+                    wave.close()
+
+    def test_femtosecond_timescale(self):
+        _, wave = self.export(timescale='100fs')
+        self.assertEqual(wave.manifest['time_unit'], 'fs')
+        times, _ = wave.columns('tb.clk')
+        self.assertEqual(list(times), [0, 500, 1000, 1500])
+
+    def test_value_before_first_change(self):
+        vcd_path = os.path.join(self.directory, 'late.vcd')
+        with open(vcd_path, 'w') as f:
+            f.write('$timescale 1ps $end\n$var wire 1 ! a $end\n$enddefinitions $end\n#7\n1!\n')
+        runner.ColumnarExport().export(vcd_path, self.out_dir)
+        wave = runner.ColumnarWaveform(self.out_dir)
+        self.addCleanup(wave.close)
+        self.assertIsNone(wave.value_at('a', 6))
+        self.assertEqual(wave.value_at('a', 7), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,57 @@
+"""依存ファイル解決のキャッシュのテスト"""
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import Verilog_HDL_Runner as runner
+
+
+class QuietPipeline(runner.VerilogPipeline):
+
+    def __init__(self):
+        self.messages = []
+
+    def log_output(self, text, tag=None):
+        self.messages.append((text, tag))
+
+
+class DependencyCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        self.write('add_tb.v', 'module add_tb;\n  add dut (.a(a));\nendmodule\n')
+        self.write('add.v', 'module add(input a);\nendmodule\n')
+        self.write('sub.v', 'module sub(input a);\nendmodule\n')
+        self.cache = runner.DependencyCache(QuietPipeline())
+
+    def write(self, name, content):
+        with open(os.path.join(self.directory, name), 'w') as f:
+            f.write(content)
+
+    def test_counts_from_threads(self):
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            results = list(pool.map(lambda _: self.cache.resolve('add_tb.v', self.directory), range(200)))
+        self.assertTrue(all(result == results[0] for result in results))
+        self.assertIn('add.v', results[0])
+        self.assertEqual(self.cache.hits + self.cache.misses, 200)
+        self.assertGreaterEqual(self.cache.misses, 1)
+
+    def test_invalidated_by_changed_file(self):
+        self.assertNotIn('sub.v', self.cache.resolve('add_tb.v', self.directory))
+        self.assertNotIn('sub.v', self.cache.resolve('add_tb.v', self.directory))
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 1))
+        self.write('add.v', 'module add(input a);\n  sub s (.a(a));\nendmodule\n')
+        os.utime(os.path.join(self.directory, 'add.v'), ns=(1, 1))
+        self.assertIn('sub.v', self.cache.resolve('add_tb.v', self.directory))
+        self.assertEqual(self.cache.misses, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+"""波形ダンプ範囲の指定のテスト"""
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import Verilog_HDL_Runner as runner
+
+TESTBENCH = '''`timescale 1ns/1ps
+module add_tb;
+  initial begin
+    $dumpfile("waves/add.vcd");
+    $dumpvars(0,
+              add_tb);
+  end
+  initial #100 $finish;
+endmodule
+'''
+
+
+class DumpControlTest(unittest.TestCase):
+
+    def test_from_options(self):
+        control = runner.DumpControl.from_options('tb.dut, tb.bus', 1, '10ns', '1us')
+        self.assertEqual(control.scopes, ['tb.dut', 'tb.bus'])
+        self.assertEqual((control.depth, control.start, control.stop), (1, 10000, 1000000))
+        self.assertEqual(runner.DumpControl.from_dict(control.to_dict()).to_dict(), control.to_dict())
+        self.assertIsNone(runner.DumpControl.from_dict(None))
+
+    def test_invalid_window(self):
+        for options in (('tb', 0, '100ns', '50ns'), ('tb', 0, '100ns', '100ns'), ('tb', -1, '', ''),
+                        ('tb', 0, '10 parsecs', '')):
+            with self.subTest(options=options), self.assertRaises(ValueError):
+                runner.DumpControl.from_options(*options)
+
+    def test_prepare(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        build_dir = os.path.join(directory, 'build')
+        os.makedirs(build_dir)
+        with open(os.path.join(directory, 'add_tb.v'), 'w') as f:
+            f.write(TESTBENCH)
+
+        control = runner.DumpControl(['add_tb.dut'], 2, 50000, 80000)
+        tb_copy, helper, dump_file = control.prepare('add', 'add_tb.v', directory, build_dir)
+        self.assertEqual(dump_file, 'waves/add.vcd')
+        with open(tb_copy) as f:
+            copy = f.read()
+        # ダンプ関連タスクだけを消し、エラー行番号がずれないよう行数を保つ
+        self.assertNotIn('$dump', copy)
+        self.assertIn('$finish', copy)
+        self.assertEqual(copy.count('\n'), TESTBENCH.count('\n') + 1)
+        with open(helper) as f:
+            lines = [line.strip() for line in f]
+        self.assertIn('$dumpfile("waves/add.vcd");', lines)
+        self.assertIn('$dumpvars(2, add_tb.dut);', lines)
+        self.assertEqual(lines[lines.index('$dumpoff;') + 1:lines.index('$dumpoff;') + 3],
+                         ['#50000 $dumpon;', '#30000 $dumpoff;'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+"""シード・plusargのファンアウト実行のテスト"""
+
+import os
+import sys
+import shutil
+import subprocess
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import Verilog_HDL_Runner as runner
+
+
+class QuietPipeline(runner.VerilogPipeline):
+
+    def __init__(self):
+        self.messages = []
+
+    def log_output(self, text, tag=None):
+        self.messages.append((text, tag))
+
+
+def fake_simulator(cmd, cwd=None, **kwargs):
+    """iverilog は成功、vvp はサブディレクトリに波形を書き、seed3 だけ失敗を出力する"""
+    if cmd[0] == 'iverilog':
+        return subprocess.CompletedProcess(cmd, 0, '', '')
+    with open(os.path.join(cwd, 'mem', 'init.hex')) as f:
+        memory = f.read().strip()
+    os.makedirs(os.path.join(cwd, 'waves'), exist_ok=True)
+    with open(os.path.join(cwd, 'waves', 'add.vcd'), 'w') as f:
+        f.write(f'$comment {cmd[2]} $end\n')
+    output = 'FAIL: mismatch\n' if cmd[2] == '+SEED=3' else f'ok {memory}\n'
+    return subprocess.CompletedProcess(cmd, 0, output, '')
+
+
+class SeedRangeTest(unittest.TestCase):
+
+    def test_parse(self):
+        self.assertEqual(runner.parse_seed_range('1-3, 7 9-10'), [1, 2, 3, 7, 9, 10])
+        self.assertEqual(runner.parse_seed_range(''), [])
+        for text in ('1..5', '5-1', 'a'):
+            with self.assertRaises(ValueError):
+                runner.parse_seed_range(text)
+
+    def test_build_runs(self):
+        self.assertEqual(runner.build_fanout_runs([1, 2]), [('seed1', ['+SEED=1']), ('seed2', ['+SEED=2'])])
+        self.assertEqual(runner.build_fanout_runs([5], ['+A=1', '+B=2 +C'], 'S'), [
+            ('seed5_args0', ['+S=5', '+A=1']),
+            ('seed5_args1', ['+S=5', '+B=2', '+C']),
+        ])
+        self.assertEqual(runner.build_fanout_runs(plusarg_sets=['+A']), [('run0', ['+A'])])
+
+
+class RunFanoutTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        os.makedirs(os.path.join(self.directory, 'mem'))
+        with open(os.path.join(self.directory, 'mem', 'init.hex'), 'w') as f:
+            f.write('0f\n')
+        with open(os.path.join(self.directory, 'add_tb.v'), 'w') as f:
+            f.write('module add_tb;\n  reg [7:0] m [0:0];\n  initial $readmemh("mem/init.hex", m);\nendmodule\n')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_waveforms_in_subdirectory(self):
+        pipeline = QuietPipeline()
+        with mock.patch.object(runner.subprocess, 'run', side_effect=fake_simulator):
+            results = pipeline.run_fanout('add', 'add_tb.v', [], self.directory,
+                                          runner.build_fanout_runs([1, 2, 3]), jobs=2)
+        self.assertEqual([(r.label, r.passed) for r in results],
+                         [('seed1', True), ('seed2', True), ('seed3', False)])
+        for result in results:
+            self.assertEqual(result.waveform, os.path.join(self.directory, f'add_{result.label}.vcd'))
+            with open(result.waveform) as f:
+                self.assertIn(result.plusargs[0], f.read())
+            with open(result.log_file) as f:
+                self.assertEqual(f.read(), result.output)
+        self.assertEqual(results[0].output, 'ok 0f\n')
+
+
+if __name__ == '__main__':
+    unittest.main()
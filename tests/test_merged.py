@@ -0,0 +1,128 @@
+"""小さなテストベンチの統合実行のテスト"""
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import Verilog_HDL_Runner as runner
+
+FILES = {
+    'add.v': '`timescale 1ns/1ps\nmodule add(input a, output y);\nendmodule\n',
+    'sub.v': '`timescale 1ns/1ps\nmodule sub(input a, output y);\nendmodule\n',
+    'add_tb.v': ('`timescale 1ns/1ps\nmodule add_tb;\n  add dut ();\n'
+                 '  initial begin\n    $dumpfile("add.vcd");\n    $display("sum=%d",\n             1);\n'
+                 '    #10 $finish;\n  end\n  always #100 $display;\nendmodule\n'),
+    'sub_tb.v': ('`timescale 1ns/1ps\nmodule sub_tb;\n  sub dut ();\n'
+                 '  initial begin\n    $write("diff");\n    $finish(0);\n  end\nendmodule\n'),
+    'mon_tb.v': '`timescale 1ns/1ps\nmodule mon_tb;\n  initial $monitor("x");\n  initial $finish;\nendmodule\n',
+    'loop_tb.v': '`timescale 1ns/1ps\nmodule loop_tb;\nendmodule\n',
+    'ps_tb.v': '`timescale 1ps/1ps\nmodule ps_tb;\n  initial $finish;\nendmodule\n',
+}
+
+
+class MergedSuiteTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        for name, content in FILES.items():
+            with open(os.path.join(self.directory, name), 'w') as f:
+                f.write(content)
+
+    def job(self, tb_file, dep_files=()):
+        return runner.SimulationJob(tb_file, dep_files, self.directory)
+
+    def suite(self):
+        suites, fallback = runner.plan_merged_suites([self.job('add_tb.v', ['add.v']), self.job('sub_tb.v', ['sub.v'])])
+        self.assertEqual(fallback, [])
+        return suites[0]
+
+
+class PlanMergedSuitesTest(MergedSuiteTestCase):
+
+    def test_fallback_reasons(self):
+        jobs = [self.job('add_tb.v', ['add.v']), self.job('sub_tb.v', ['sub.v']), self.job('mon_tb.v'),
+                self.job('loop_tb.v'), self.job('ps_tb.v')]
+        suites, fallback = runner.plan_merged_suites(jobs)
+        self.assertEqual([[job.tb_file for job in suite.jobs] for suite in suites], [['add_tb.v', 'sub_tb.v']])
+        self.assertEqual(suites[0].tops, ['add_tb', 'sub_tb'])
+        reasons = {job.tb_file: reason for job, reason in fallback}
+        self.assertEqual(set(reasons), {'mon_tb.v', 'loop_tb.v', 'ps_tb.v'})
+        self.assertIn('$monitor', reasons['mon_tb.v'])
+        self.assertIn('$finish', reasons['loop_tb.v'])
+        self.assertIn('`timescale', reasons['ps_tb.v'])
+
+    def test_other_backend_runs_individually(self):
+        job = self.job('sub_tb.v', ['sub.v'])
+        job.backend = 'verilator'
+        suites, fallback = runner.plan_merged_suites([self.job('add_tb.v', ['add.v']), job])
+        self.assertEqual(suites, [])
+        self.assertEqual([job.tb_file for job, _ in fallback], ['sub_tb.v', 'add_tb.v'])
+
+
+class PrepareTest(MergedSuiteTestCase):
+
+    def test_rewrites_testbenches(self):
+        suite = self.suite()
+        build_dir = os.path.join(self.directory, 'build')
+        os.makedirs(build_dir)
+        cmd = suite.prepare('merged1', build_dir)
+
+        helper = os.path.join(build_dir, f'{runner.MergedSuite.HELPER_MODULE}.v')
+        self.assertEqual(cmd[:6], ['iverilog', '-Wall', '-I', '.', '-o', 'merged1'])
+        self.assertEqual(cmd[6:12], ['-s', 'add_tb', '-s', 'sub_tb', '-s', runner.MergedSuite.HELPER_MODULE])
+        self.assertEqual(cmd[12:], [os.path.join(build_dir, 'add_tb.v'), os.path.join(build_dir, 'sub_tb.v'),
+                                    'add.v', 'sub.v', helper])
+
+        with open(os.path.join(build_dir, 'add_tb.v')) as f:
+            copy = f.read()
+        # エラー行番号が元のファイルと一致するよう行数を保つ
+        self.assertTrue(copy.startswith('`line 1 "add_tb.v" 0\n'))
+        self.assertEqual(copy.count('\n'), FILES['add_tb.v'].count('\n') + 1)
+        self.assertNotIn('$dumpfile', copy)
+        self.assertNotIn('$finish', copy)
+        self.assertIn('#10 __vhr_merged.finish_top(0);', copy)
+        self.assertIn('$display("<<%m>> ", "sum=%d",', copy)
+        self.assertIn('$display("<<%m>> ");', copy)
+        with open(os.path.join(build_dir, 'sub_tb.v')) as f:
+            copy = f.read()
+        self.assertIn('$write("<<%m>> ", "diff");', copy)
+        self.assertIn('__vhr_merged.finish_top(1);', copy)
+
+        with open(helper) as f:
+            lines = [line.strip() for line in f]
+        self.assertIn('`timescale 1ns/1ps', lines)
+        self.assertIn('reg [1:0] done = 0;', lines)
+
+
+class SplitOutputTest(MergedSuiteTestCase):
+
+    def test_routes_lines_by_marker(self):
+        suite = self.suite()
+        output = ('VCD info: dumpfile\n'
+                  '<<add_tb>> sum=1\n'
+                  '<<sub_tb.dut>> diff\n'
+                  '<<__vhr_merged>> done 1\n'
+                  '<<sub_tb>> after finish\n'
+                  '<<add_tb>> \n'
+                  '<<other_tb>> unknown\n'
+                  '<<__vhr_merged>> done 0\n'
+                  '<<add_tb>> late\n')
+        outputs, shared, done, late = suite.split_output(output)
+        self.assertEqual(outputs, {'add_tb': ['sum=1\n', '\n'], 'sub_tb': ['diff\n']})
+        self.assertEqual(shared, ['VCD info: dumpfile\n', '<<other_tb>> unknown\n'])
+        self.assertEqual(done, {0, 1})
+        self.assertEqual(late, {'add_tb': 1, 'sub_tb': 1})
+
+    def test_missing_done(self):
+        outputs, shared, done, late = self.suite().split_output('<<add_tb>> sum=1\n<<__vhr_merged>> done 0\n')
+        self.assertEqual(done, {0})
+        self.assertEqual(outputs['sub_tb'], [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,61 @@
+"""ワークスペース内のテストベンチ検索のテスト"""
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import Verilog_HDL_Runner as runner
+
+
+class TestbenchIndexTest(unittest.TestCase):
+
+    PATHS = [
+        os.path.join('core', 'addalu_tb.v'),
+        os.path.join('alu_extra', 'mux_tb.v'),
+        os.path.join('core', 'alu_shift_tb.v'),
+        os.path.join('alu', 'alu_tb.v'),
+        os.path.join('uart', 'uart_rx_tb.v'),
+        os.path.join('uart', 'uart_tx_tb.v'),
+    ] + [os.path.join('misc', f'block{i}_tb.v') for i in range(20)]
+
+    def setUp(self):
+        self.index = runner.TestbenchIndex('/work', self.PATHS)
+
+    def test_ranking(self):
+        results = self.index.search('alu')
+        self.assertEqual(results[:4], [
+            os.path.join('alu', 'alu_tb.v'),
+            os.path.join('core', 'alu_shift_tb.v'),
+            os.path.join('core', 'addalu_tb.v'),
+            os.path.join('alu_extra', 'mux_tb.v'),
+        ])
+
+    def test_multiple_terms(self):
+        # すべての語を含むものが先、入力ミス扱いの近いものは後ろに並ぶ
+        self.assertEqual(self.index.search('uart tx')[0], os.path.join('uart', 'uart_tx_tb.v'))
+        self.assertEqual(self.index.search('uart tx', limit=1), [os.path.join('uart', 'uart_tx_tb.v')])
+
+    def test_typo(self):
+        self.assertIn(os.path.join('uart', 'uart_rx_tb.v'), self.index.search('uartrx')[:2])
+
+    def test_limit_and_empty(self):
+        self.assertEqual(len(self.index.search('block', limit=5)), 5)
+        self.assertEqual(self.index.search('  '), [])
+
+    def test_build_skips_hidden_directories(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        for path in ('top_tb.v', os.path.join('alu', 'alu_tb.v'), os.path.join('alu', 'alu.v'),
+                     os.path.join('.git', 'old_tb.v')):
+            os.makedirs(os.path.dirname(os.path.join(directory, path)), exist_ok=True)
+            open(os.path.join(directory, path), 'w').close()
+        index = runner.TestbenchIndex.build(directory)
+        self.assertEqual(index.paths, ['top_tb.v', os.path.join('alu', 'alu_tb.v')])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,110 @@
+"""実行順序の見積もりとCI向けのシャード分割のテスト"""
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import Verilog_HDL_Runner as runner
+
+
+def make_job(name, estimate, index):
+    job = runner.SimulationJob(f'{name}_tb.v', [], f'/work/{name}')
+    job.estimate = estimate
+    job.priority = (-estimate, 0, index)
+    return job
+
+
+class ShardTest(unittest.TestCase):
+
+    ESTIMATES = [40, 31, 29, 17, 13, 11, 9, 7, 7, 5, 3, 2, 2, 1, 1]
+
+    def jobs(self):
+        return [make_job(f't{i}', estimate, i) for i, estimate in enumerate(self.ESTIMATES)]
+
+    def test_plan_shards_balance(self):
+        for count in (2, 3, 4):
+            with self.subTest(count=count):
+                jobs = self.jobs()
+                shards = runner.plan_shards(jobs, count)
+                self.assertEqual(sorted(id(job) for shard in shards for job in shard), sorted(map(id, jobs)))
+                loads = [sum(job.estimate for job in shard) for shard in shards]
+                # LPT は最適値の 4/3 倍以内
+                lower_bound = max(sum(self.ESTIMATES) / count, max(self.ESTIMATES))
+                self.assertLessEqual(max(loads), lower_bound * (4 / 3 - 1 / (3 * count)))
+
+    def test_plan_shards_is_deterministic(self):
+        first = [[job.name for job in shard] for shard in runner.plan_shards(self.jobs(), 3)]
+        second = [[job.name for job in shard] for shard in runner.plan_shards(self.jobs()[::-1], 3)]
+        self.assertEqual(first, second)
+
+    def test_projected_makespan(self):
+        self.assertEqual(runner.projected_makespan([4, 3, 3, 2], 2), 6)
+        self.assertEqual(runner.projected_makespan([1], 2, busy=[5]), 5)
+        self.assertEqual(runner.projected_makespan([], 0), 0.0)
+
+    def test_parse_shard(self):
+        self.assertEqual(runner.parse_shard('2/4'), (2, 4))
+        for text in ('0/4', '5/4', '1-4'):
+            with self.assertRaises(ValueError):
+                runner.parse_shard(text)
+
+
+class SizeShardTest(unittest.TestCase):
+    """実行記録を共有しない場合のソースサイズによる分割"""
+
+    SIZES = [4000, 3100, 2900, 1700, 1300, 1100, 900, 700, 700, 500, 300, 200, 200, 100, 100]
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        for i, size in enumerate(self.SIZES):
+            sub = os.path.join(self.directory, f'd{i % 3}')
+            os.makedirs(sub, exist_ok=True)
+            # 依存ファイルもサイズに含める
+            with open(os.path.join(sub, f't{i}_tb.v'), 'w') as f:
+                f.write('x' * (size // 2))
+            with open(os.path.join(sub, f't{i}.v'), 'w') as f:
+                f.write('x' * (size - size // 2))
+
+    def jobs(self, estimates=None):
+        jobs = []
+        for i in range(len(self.SIZES)):
+            job = runner.SimulationJob(f't{i}_tb.v', [f't{i}.v'], os.path.join(self.directory, f'd{i % 3}'))
+            # マシンごとに異なる実行記録の見積もりは使わない
+            job.estimate = (estimates or {}).get(i, 1.0)
+            job.priority = (-job.estimate, 0, i)
+            jobs.append(job)
+        return jobs
+
+    def names(self, shards):
+        return [[job.name for job in shard] for shard in shards]
+
+    def test_balance(self):
+        for count in (2, 3, 4):
+            with self.subTest(count=count):
+                shards = runner.size_shards(self.jobs(), count, self.directory)
+                self.assertEqual(sorted(job.name for shard in shards for job in shard),
+                                 sorted(f't{i}' for i in range(len(self.SIZES))))
+                loads = [sum(runner.job_source_size(job) for job in shard) for shard in shards]
+                lower_bound = max(sum(self.SIZES) / count, max(self.SIZES))
+                self.assertLessEqual(max(loads), lower_bound * (4 / 3 - 1 / (3 * count)))
+
+    def test_same_on_every_machine(self):
+        expected = self.names(runner.size_shards(self.jobs(), 3, self.directory))
+        other_machine = self.jobs(estimates={0: 1.0, 5: 300.0, 14: 90.0})[::-1]
+        self.assertEqual(self.names(runner.size_shards(other_machine, 3, self.directory)), expected)
+
+    def test_equal_sizes_are_spread_by_path_hash(self):
+        jobs = [job for job in self.jobs() if job.name in ('t7', 't8', 't11', 't12', 't13', 't14')]
+        shards = runner.size_shards(jobs, 2, self.directory)
+        self.assertEqual(self.names(runner.size_shards(jobs[::-1], 2, self.directory)), self.names(shards))
+        self.assertEqual([len(shard) for shard in shards], [3, 3])
+
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+"""バックグラウンド構文チェックのキャッシュのテスト"""
+
+import os
+import sys
+import shutil
+import subprocess
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import Verilog_HDL_Runner as runner
+
+
+class SyntaxCheckerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        self.checker = runner.SyntaxChecker(max_workers=1, timeout=5)
+        self.addCleanup(self.checker.pool.shutdown)
+        self.tb_path = self.write('add_tb.v', 'module add_tb;\n  add dut (.a(a));\nendmodule\n')
+        self.write('add.v', 'module add(input a);\n  half h (.a(a));\nendmodule\n')
+        self.write('half.v', 'module half(input a);\nendmodule\n')
+        self.write('other.v', 'module other;\nendmodule\n')
+        self.commands = []
+        self.stderr = ''
+
+    def write(self, name, content):
+        path = os.path.join(self.directory, name)
+        with open(path, 'w') as f:
+            f.write(content)
+        return path
+
+    def fake_run(self, cmd, **kwargs):
+        self.commands.append((cmd, kwargs))
+        return subprocess.CompletedProcess(cmd, 1 if self.stderr else 0, '', self.stderr)
+
+    def check(self):
+        with mock.patch.object(runner.subprocess, 'run', side_effect=self.fake_run):
+            return self.checker.check(self.tb_path)
+
+    def test_cache_follows_instantiated_modules(self):
+        self.stderr = 'add_tb.v:2: error: port ``b\'\' is not a port of dut.\n'
+        self.assertEqual(self.check(), [('2', "error: port ``b'' is not a port of dut.")])
+        self.assertEqual(len(self.check()), 1)
+        self.assertEqual(len(self.commands), 1)
+        self.assertEqual(self.commands[0][1]['timeout'], 5)
+
+        # インスタンスしていないモジュールの変更ではチェックし直さない
+        self.write('other.v', 'module other(input b);\nendmodule\n')
+        self.check()
+        self.assertEqual(len(self.commands), 1)
+
+        # インスタンス先（孫を含む）のポートが変わればキャッシュを使わない
+        self.stderr = ''
+        self.write('half.v', 'module half(input a, input b);\nendmodule\n')
+        self.assertEqual(self.check(), [])
+        self.assertEqual(len(self.commands), 2)
+        self.assertEqual(list(self.checker.cache), [self.tb_path])
+
+    def test_ignores_other_files_and_elaboration_only_messages(self):
+        self.stderr = ('add.v:2: error: syntax error\n'
+                       'add_tb.v:2: error: Unknown module type: sub\n'
+                       'add_tb.v:3: syntax error\n')
+        self.assertEqual(self.check(), [('3', 'syntax error')])
+
+    def test_timeout(self):
+        def hang(cmd, **kwargs):
+            raise subprocess.TimeoutExpired(cmd, kwargs['timeout'])
+
+        with mock.patch.object(runner.subprocess, 'run', side_effect=hang):
+            self.assertEqual(self.checker.check(self.tb_path), [])
+        # 打ち切った結果はキャッシュしない
+        self.assertEqual(self.checker.cache, {})
+
+
+if __name__ == '__main__':
+    unittest.main()
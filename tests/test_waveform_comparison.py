@@ -0,0 +1,202 @@
+"""ゴールデン波形との比較のテスト"""
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import Verilog_HDL_Runner as runner
+
+
+def write_vcd(path, signals, changes, timescale='1ns'):
+    """signals: [(識別子, 階層名のリスト（最後が $var の参照名）, ビット幅)]、changes: [(時刻, 識別子, 値)]"""
+    lines = [f'$timescale {timescale} $end']
+    for ident, names, width in signals:
+        for scope in names[:-1]:
+            lines.append(f'$scope module {scope} $end')
+        lines.append(f'$var wire {width} {ident} {names[-1]} $end')
+        lines += ['$upscope $end'] * (len(names) - 1)
+    lines.append('$enddefinitions $end')
+    current = None
+    for time, ident, value in sorted(changes, key=lambda c: c[0]):
+        if time != current:
+            lines.append(f'#{time}')
+            current = time
+        lines.append(f'{value}{ident}' if len(value) == 1 else f'b{value} {ident}')
+    with open(path, 'w') as f:
+        f.write('\n'.join(lines) + '\n')
+
+
+class NumpyModesMixin:
+    """NumPyあり・なしの両方で同じテストを実行する"""
+
+    def modes(self):
+        yield 'python', None
+        if runner.np is not None:
+            yield 'numpy', runner.np
+
+    def for_each_mode(self, check):
+        for label, module in self.modes():
+            with self.subTest(mode=label), mock.patch.object(runner, 'np', module):
+                check()
+
+
+class MismatchRunsTest(NumpyModesMixin, unittest.TestCase):
+
+    def columns(self, pairs):
+        return (runner.array('Q', [t for t, _ in pairs]), runner.array('q', [v for _, v in pairs]))
+
+    def test_runs_between_changes(self):
+        golden = self.columns([(0, 0), (10, 1), (20, 0)])
+        new = self.columns([(0, 0), (12, 1), (20, 0), (30, 1)])
+
+        def check():
+            self.assertEqual(runner._mismatch_runs(golden, new, 0, 40),
+                             [(10, 12, (1, 0)), (30, 40, (0, 1))])
+        self.for_each_mode(check)
+
+    def test_identical_columns(self):
+        golden = self.columns([(0, 3), (5, 7)])
+
+        def check():
+            self.assertEqual(runner._mismatch_runs(golden, golden, 0, 10), [])
+        self.for_each_mode(check)
+
+
+class WaveformComparisonTest(NumpyModesMixin, unittest.TestCase):
+
+    SIGNALS = [('!', ['tb', 'clk'], 1), ('"', ['tb', 'dut', 'y'], 1), ('#', ['tb', 'cnt [3:0]'], 4)]
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.golden = os.path.join(self.directory, 'golden.vcd')
+        self.new = os.path.join(self.directory, 'new.vcd')
+        self.base = [(0, '!', '0'), (0, '"', '0'), (0, '#', '0000')]
+        for time in range(5, 100, 5):
+            self.base.append((time, '!', '1' if time % 10 else '0'))
+        self.base += [(20, '"', '1'), (40, '"', '0'), (60, '#', '0011')]
+        write_vcd(self.golden, self.SIGNALS, self.base)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def compare(self, changes, signals=None, chunk_sizes=(1, 3, None), **options):
+        """区切りの大きさを変えても同じ結果になることを確認して返す"""
+        write_vcd(self.new, signals or self.SIGNALS, changes)
+        reports = []
+        for chunk in chunk_sizes:
+            comparison = runner.WaveformComparison(chunk_changes=chunk, **options)
+            report = comparison.compare(self.golden, self.new)
+            reports.append(report)
+            if chunk == 1:
+                self.assertGreater(report['chunks'], 10)
+        for report in reports[1:]:
+            self.assertEqual(report['mismatches'], reports[0]['mismatches'])
+            self.assertEqual(report['missing'], reports[0]['missing'])
+        return reports[0]
+
+    def test_identical(self):
+        def check():
+            report = self.compare(self.base)
+            self.assertEqual(report['mismatches'], [])
+            self.assertEqual(report['compared'], 3)
+        self.for_each_mode(check)
+
+    def test_first_mismatch_per_signal(self):
+        changes = [c for c in self.base if c[:2] != (40, '"')] + [(45, '"', '0'), (70, '#', 'x011')]
+
+        def check():
+            report = self.compare(changes)
+            self.assertEqual(report['mismatches'], [
+                (40000000, 'tb.dut.y', '0', '1'),
+                (70000000, 'tb.cnt', '0x3', 'x011'),
+            ])
+        self.for_each_mode(check)
+
+    def test_tolerance_across_chunks(self):
+        # 2ns のずれ（区切りをまたぐ）は許容誤差 2ns 以内なら無視、1ns なら不一致
+        changes = [c for c in self.base if c[:2] != (20, '"')] + [(22, '"', '1')]
+
+        def check():
+            self.assertEqual(self.compare(changes, tolerance=2000000)['mismatches'], [])
+            self.assertEqual(self.compare(changes, tolerance=1000000)['mismatches'],
+                             [(20000000, 'tb.dut.y', '1', '0')])
+        self.for_each_mode(check)
+
+    def test_mismatch_until_end_of_file(self):
+        changes = self.base + [(95, '"', '1')]
+
+        def check():
+            report = self.compare(changes, tolerance=1000000)
+            self.assertEqual(report['mismatches'], [(95000000, 'tb.dut.y', '0', '1')])
+        self.for_each_mode(check)
+
+    def test_wide_vectors_with_trimmed_zeros(self):
+        # 62bit超の信号は上位の0を省略した値と省略しない値を同じ値として扱う
+        signals = [('$', ['tb', 'data [63:0]'], 64)]
+        write_vcd(self.golden, signals, [(0, '$', '0' * 61 + '101'), (10, '$', 'x' * 64)])
+
+        def check():
+            comparison = runner.WaveformComparison()
+            write_vcd(self.new, signals, [(0, '$', '101'), (10, '$', 'x')])
+            self.assertEqual(comparison.compare(self.golden, self.new)['mismatches'], [])
+            write_vcd(self.new, signals, [(0, '$', '111'), (10, '$', 'x')])
+            self.assertEqual(comparison.compare(self.golden, self.new)['mismatches'],
+                             [(0, 'tb.data', '0' * 61 + '101', '0' * 61 + '111')])
+        self.for_each_mode(check)
+
+    def test_femtosecond_timescale(self):
+        # 1ns 単位のゴールデンと 100fs 単位の波形を同じ時刻で比べる
+        changes = [(time * 10000, ident, value) for time, ident, value in self.base]
+
+        def check():
+            write_vcd(self.new, self.SIGNALS, changes, timescale='100fs')
+            comparison = runner.WaveformComparison()
+            self.assertEqual(comparison.compare(self.golden, self.new)['mismatches'], [])
+            # 500fs 幅のグリッチ
+            write_vcd(self.new, self.SIGNALS, changes + [(500005, '"', '1'), (500010, '"', '0')], timescale='100fs')
+            self.assertEqual(comparison.compare(self.golden, self.new)['mismatches'],
+                             [(50000500, 'tb.dut.y', '0', '1')])
+            comparison = runner.WaveformComparison.from_options(tolerance='1ps')
+            self.assertEqual(comparison.compare(self.golden, self.new)['mismatches'], [])
+        self.for_each_mode(check)
+
+    def test_mapping_and_ignore(self):
+        signals = [('!', ['tb', 'clk'], 1), ('"', ['tb', 'core', 'y'], 1), ('#', ['tb', 'cnt[3:0]'], 4)]
+        changes = self.base + [(50, '!', '1')]
+
+        def check():
+            report = self.compare(changes, signals)
+            self.assertEqual(report['missing'], ['tb.dut.y'])
+            comparison = runner.WaveformComparison.from_options(
+                mapping=['tb.dut=tb.core'], ignore=['tb.clk, tb.nothing [3:0]'])
+            write_vcd(self.new, signals, changes)
+            report = comparison.compare(self.golden, self.new)
+            self.assertEqual(report['missing'], [])
+            self.assertEqual(report['ignored'], 1)
+            self.assertEqual(report['compared'], 2)
+            self.assertEqual(report['mismatches'], [])
+        self.for_each_mode(check)
+
+
+class ParsingTest(unittest.TestCase):
+
+    def test_sim_time(self):
+        self.assertEqual(runner.parse_sim_time('2.5us'), 2500000)
+        self.assertEqual(runner.parse_sim_time('10'), 10000)
+        self.assertEqual(runner.parse_sim_time('250fs', 'fs'), 250)
+        self.assertEqual(runner.parse_sim_time('1500fs'), 1)
+        for text in ('10 parsecs', '1.2.3ns', ''):
+            with self.assertRaises(ValueError):
+                runner.parse_sim_time(text)
+        self.assertEqual(runner.format_sim_time(3000000), '3us')
+        self.assertEqual(runner.format_sim_time(1500, 'fs'), '1500fs')
+        self.assertEqual(runner.format_sim_time(0), '0ps')
+
+
+if __name__ == '__main__':
+    unittest.main()
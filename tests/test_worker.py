@@ -0,0 +1,177 @@
+"""分散実行（ワーカー・コーディネーター）のテスト"""
+
+import os
+import sys
+import shutil
+import hashlib
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import Verilog_HDL_Runner as runner
+
+TOKEN = 'test-token'
+
+
+def digest(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def finish_immediately(worker, job):
+    job.log_output('done\n')
+    job.status = 'passed'
+
+
+class SafeRelativePathTest(unittest.TestCase):
+
+    def test_paths(self):
+        for path in ('a.v', os.path.join('sub', 'a.v'), os.path.join('sub', '..', 'a.v')):
+            self.assertTrue(runner.is_safe_relative_path(path), path)
+        for path in ('', '.', '..', os.path.join('..', 'a.v'), os.path.abspath('a.v'),
+                     os.path.join('sub', '..', '..', 'a.v')):
+            self.assertFalse(runner.is_safe_relative_path(path), path)
+
+
+class SimulationWorkerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.worker = runner.SimulationWorker(self.directory, 1, TOKEN)
+        self.data = b'module a; endmodule\n'
+        self.worker.store_blob(digest(self.data), self.data)
+        patcher = mock.patch.object(runner.SimulationWorker, '_run_job', lambda worker, job: None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def spec(self, **changes):
+        spec = {'name': 'a', 'tb_file': 'a_tb.v', 'dep_files': [], 'files': {'a_tb.v': digest(self.data)}}
+        spec.update(changes)
+        return spec
+
+    def test_store_blob_checks_hash(self):
+        with self.assertRaises(ValueError):
+            self.worker.store_blob('0' * 64, self.data)
+        self.assertEqual(self.worker.missing_blobs([digest(self.data), '0' * 64, '../a']), ['0' * 64, '../a'])
+
+    def test_submit_validates_spec(self):
+        invalid = [
+            self.spec(files={os.path.join('..', 'a_tb.v'): digest(self.data)}),
+            self.spec(files={'a_tb.v': os.path.join('..', 'a_tb.v')}),
+            self.spec(tb_file='b_tb.v'),
+            self.spec(tb_file=None),
+            self.spec(dep_files=[os.path.join('..', 'a_tb.v')]),
+            self.spec(name=os.path.join('sub', 'a')),
+            self.spec(name='..'),
+            self.spec(files=['a_tb.v']),
+        ]
+        for spec in invalid:
+            with self.subTest(spec=spec), self.assertRaises(ValueError):
+                self.worker.submit(spec)
+        self.assertEqual(self.worker.jobs, {})
+
+    def test_submit_reports_missing_blobs(self):
+        with self.assertRaises(runner.MissingBlobsError) as context:
+            self.worker.submit(self.spec(files={'a_tb.v': digest(self.data), 'b.v': '1' * 64}))
+        self.assertEqual(context.exception.digests, ['1' * 64])
+        job_id = self.worker.submit(self.spec())
+        self.assertIn(job_id, self.worker.jobs)
+
+    def test_blob_cache_keeps_blobs_in_use(self):
+        self.worker.blob_cache = 2 * len(self.data)
+        self.worker.submit(self.spec())
+        blobs = [self.data.replace(b'a', c) for c in (b'b', b'c', b'd')]
+        for blob in blobs:
+            self.worker.store_blob(digest(blob), blob)
+        # 実行待ちのジョブが使うソースは残し、それ以外を古い順に削除する
+        self.assertEqual(self.worker.missing_blobs([digest(self.data)] + [digest(b) for b in blobs]),
+                         [digest(blobs[0]), digest(blobs[1])])
+        self.assertLessEqual(self.worker.blob_bytes, self.worker.blob_cache)
+
+
+class WorkerProtocolTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.source_dir = os.path.join(self.directory, 'src')
+        os.makedirs(self.source_dir)
+        for name in ('a_tb.v', 'b_tb.v'):
+            with open(os.path.join(self.source_dir, name), 'w') as f:
+                f.write(f'module {name[0]}_tb;\nendmodule\n')
+        self.worker = runner.SimulationWorker(os.path.join(self.directory, 'worker'), 2, TOKEN)
+        self.server = self.worker.create_server('127.0.0.1', 0)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.address = f"127.0.0.1:{self.server.server_address[1]}"
+        self.messages = []
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def log_output(self, text, tag=None):
+        self.messages.append((text, tag))
+
+    def coordinator(self, **options):
+        return runner.JobCoordinator([self.address], self.log_output, poll_interval=0.01, token=TOKEN, **options)
+
+    def job(self, tb_file, dep_files=()):
+        return runner.SimulationJob(tb_file, dep_files, self.source_dir)
+
+    def test_rejects_wrong_token(self):
+        with self.assertRaises(runner.WorkerRejectedError) as context:
+            runner.WorkerClient(self.address, 'wrong').info()
+        self.assertEqual(context.exception.status, 401)
+        self.assertEqual(runner.WorkerClient(self.address, TOKEN).info()['slots'], 2)
+
+    def test_upload_only_unknown_blobs(self):
+        client = runner.WorkerClient(self.address, TOKEN)
+        bundle = runner.collect_source_bundle('a_tb.v', [], self.source_dir)
+        files = client.upload_bundle(bundle)
+        self.assertEqual(self.worker.missing_blobs(files.values()), [])
+        with mock.patch.object(client, '_request', wraps=client._request) as request:
+            self.assertEqual(client.upload_bundle(bundle), files)
+        request.assert_not_called()
+
+    def test_reuploads_after_worker_lost_blobs(self):
+        coordinator = self.coordinator()
+        with mock.patch.object(runner.SimulationWorker, '_run_job', finish_immediately):
+            jobs = coordinator.run([self.job('a_tb.v')])
+            self.assertEqual(jobs[0].status, 'passed')
+            # ワーカーの再起動でソースが消えても、送信済みの記録を捨てて送り直す
+            shutil.rmtree(self.worker.blob_dir)
+            os.makedirs(self.worker.blob_dir)
+            jobs = coordinator.run([self.job('a_tb.v')])
+        self.assertEqual(jobs[0].status, 'passed')
+        self.assertFalse(coordinator.clients[0].lost)
+
+    def test_rejected_job_fails_without_losing_worker(self):
+        coordinator = self.coordinator(max_retries=0)
+        with mock.patch.object(runner.SimulationWorker, '_run_job', finish_immediately):
+            jobs = coordinator.run([self.job('a_tb.v', ['missing.v']), self.job('b_tb.v')])
+        self.assertEqual([job.status for job in jobs], ['error', 'passed'])
+        self.assertEqual(jobs[0].attempts, 1)
+        self.assertFalse(coordinator.clients[0].lost)
+
+    def test_job_timeout(self):
+        release = threading.Event()
+        self.addCleanup(release.set)
+
+        def hang(worker, job):
+            job.status = 'running'
+            release.wait(10)
+
+        coordinator = self.coordinator(job_timeout=0.2)
+        with mock.patch.object(runner.SimulationWorker, '_run_job', hang):
+            jobs = coordinator.run([self.job('a_tb.v')])
+        self.assertEqual(jobs[0].status, 'error')
+        self.assertLess(jobs[0].elapsed, 5)
+
+
+if __name__ == '__main__':
+    unittest.main()